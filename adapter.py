@@ -1,12 +1,12 @@
 # ===============================
 # 🔄 Socket Adapter for Main Application
 # ===============================
-import tkinter as tk
+import json
 import random
-import os
-import sys
-import subprocess
+import threading
+import startup_timer
 from client import HoneyTrapClient
+from protocol import MessageType
 
 
 # For multi-PC setup: Change 'localhost' to the server's IP address
@@ -14,12 +14,43 @@ SERVER_HOST = 'localhost'  # localhost / IP address (e.g., 192.168.1.5)
 CONTROL_PORT = 5000
 DATA_PORT = 5001
 
+# Last-known port list, so the login page can draw before the server answers
+PORTS_CACHE = "client_ports_cache.json"
+
+_client_lock = threading.Lock()
+_cached_ports = None
+
 def get_client():
     """Get a singleton client instance"""
-    if not hasattr(get_client, 'instance'):
-        get_client.instance = HoneyTrapClient(SERVER_HOST, CONTROL_PORT, DATA_PORT, use_ssl=False)
-        get_client.instance.connect()
-    return get_client.instance
+    with _client_lock:
+        if not hasattr(get_client, 'instance'):
+            get_client.instance = HoneyTrapClient(SERVER_HOST, CONTROL_PORT, DATA_PORT, use_ssl=False)
+        
+        # Connect lazily, and retry if an earlier attempt failed
+        if not get_client.instance.connected and get_client.instance.connect():
+            startup_timer.mark_once("connect")
+        return get_client.instance
+
+def load_cached_ports():
+    """Return the last-known port list (memory first, then the cache file)"""
+    global _cached_ports
+    if _cached_ports is None:
+        try:
+            with open(PORTS_CACHE, "r") as f:
+                _cached_ports = json.load(f)
+        except (OSError, ValueError):
+            _cached_ports = []
+    return list(_cached_ports)
+
+def save_cached_ports(ports):
+    """Remember a port list fetched from the server"""
+    global _cached_ports
+    _cached_ports = list(ports)
+    try:
+        with open(PORTS_CACHE, "w") as f:
+            json.dump(_cached_ports, f)
+    except OSError:
+        pass
 
 class LoginHandler:
     @staticmethod
@@ -30,25 +61,20 @@ class LoginHandler:
         if len(username) < 3 or len(password) < 3:
             return {"status": "error", "message": "Username and password must be at least 3 characters"}
         
-        # Check if these are admin credentials before applying firewall rules
-        from firewall import ADMIN_USERNAME, ADMIN_PASSWORD
-        admin_login = (username == ADMIN_USERNAME and password == ADMIN_PASSWORD)
-        
-        # For admin login, ensure we use a non-honeypot port
-        if admin_login and port is None:
-            ports = client.get_ports()
-            # Find ports without honeypot
-            safe_ports = [p for p in ports if p["status"] == "active" and not p.get("honeypot", False)]
-            if safe_ports:
-                port = safe_ports[0]["port"]  # Use the first safe port
-        
         # Perform login with port information
+        # (admin credentials are checked by the server before any firewall rule)
         login_status = client.login(username, password, port)
         
         # Get available ports
         ports = client.get_ports()
         active_ports = [p for p in ports if p["status"] == "active"]
         
+        # For an authenticated admin, use a non-honeypot port
+        if login_status == 'admin' and port is None:
+            safe_ports = [p for p in active_ports if not p.get("honeypot", False)]
+            if safe_ports:
+                port = safe_ports[0]["port"]  # Use the first safe port
+        
         if not active_ports and login_status != 'admin':
             return {"status": "error", "message": "No active ports available"}
         
@@ -82,16 +108,32 @@ class LoginHandler:
     
     @staticmethod
     def get_ports():
-        """Get ports from server"""
+        """Get ports from server and refresh the last-known port cache"""
         client = get_client()
-        return client.get_ports()
+        if not client.connected:
+            raise ConnectionError("Could not connect to server")
+        
+        # An empty list from a timeout or error must not replace the last-known ports
+        response = client.send_request(MessageType.GET_PORTS, {})
+        if not response or response.get('status') != 'success':
+            message = response.get('message') if response else "No response from server"
+            raise ConnectionError(f"Could not fetch ports: {message}")
+        
+        ports = response.get('data', [])
+        save_cached_ports(ports)
+        return ports
+    
+    @staticmethod
+    def get_cached_ports():
+        """Get the last-known ports without touching the network"""
+        return load_cached_ports()
 
 class AdminHandler:
     @staticmethod
-    def get_attackers():
-        """Get attackers through socket connection"""
+    def get_attackers(since=None, until=None, limit=None):
+        """Get attacker events through socket connection"""
         client = get_client()
-        return client.get_attackers()
+        return client.get_attackers(since, until, limit)
     
     @staticmethod
     def get_potential_attackers():
@@ -105,6 +147,20 @@ class AdminHandler:
         client = get_client()
         return client.ban_ip(ip_address)
     
+    @staticmethod
+    def import_blocklist(path):
+        """Ban every IP listed in a file (one per line, # comments) over the data channel"""
+        with open(path, "r", encoding="utf-8") as f:
+            ips = [line.split("#", 1)[0].strip() for line in f]
+        client = get_client()
+        return client.ban_ips([ip for ip in ips if ip])
+    
+    @staticmethod
+    def export_attackers(path):
+        """Save the recorded attacker events to a file (JSON lines)"""
+        client = get_client()
+        return client.export_attackers(path)
+    
     @staticmethod
     def unban_ip(ip_address):
         """Unban IP through socket connection"""
@@ -118,10 +174,16 @@ class AdminHandler:
         return client.get_banned_ips()
     
     @staticmethod
-    def get_active_users():
-        """Get active users through socket connection"""
+    def get_active_users(username=None, ip=None, port=None):
+        """Get active sessions through socket connection"""
+        client = get_client()
+        return client.get_active_users(username, ip, port)
+    
+    @staticmethod
+    def get_stats():
+        """Get aggregated server statistics through socket connection"""
         client = get_client()
-        return client.get_active_users()
+        return client.get_stats()
     
     @staticmethod
     def get_ports():
@@ -144,6 +206,12 @@ class UserHandler:
         client.logged_in = True     # Mark as logged in
         return client.update_activity()
     
+    @staticmethod
+    def report_honeypot(port, details):
+        """Report fake portal session details through socket connection"""
+        client = get_client()
+        return client.report_honeypot(port, details)
+    
     @staticmethod
     def start_keep_alive(username):
         """Start keep-alive thread"""
@@ -3,12 +3,24 @@
 # ===============================
 import tkinter as tk
 from tkinter import messagebox
+from tkinter import filedialog
 from tkinter import ttk
-import time
-import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
 # Import socket adapter
 from adapter import AdminHandler
+from treeview_sync import TreeviewSync
+from event_log import EventLog
+
+# Auto-refresh interval and worker pool size for background data fetching
+AUTO_REFRESH_MS = 30000
+FETCH_WORKERS = 4
+RESULT_POLL_MS = 50
+
+# Admin actions are logged by the client process to its own file, so a
+# server running from the same directory keeps sole ownership of events.ndjson
+ADMIN_EVENTS = EventLog("admin_events.ndjson")
 
 # ========================
 # Admin Panel Class
@@ -18,6 +30,16 @@ class AdminPanel(tk.Frame):
         super().__init__(master)
         self.master = master
         self.pack(fill="both", expand=True)
+        
+        # Blocking socket calls run on a worker pool; results come back
+        # through a queue that is drained on the Tk thread
+        self.fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="admin-fetch")
+        self.results = queue.Queue()
+        self.in_flight = set()
+        self.rerun = {}
+        self.closed = False
+        self.after(RESULT_POLL_MS, self.drain_results)
+        
         self.create_widgets()
 
         # Initial data load
@@ -108,12 +130,28 @@ class AdminPanel(tk.Frame):
         scrollbar.pack(side="right", fill="y")
         self.log_table.configure(yscrollcommand=scrollbar.set)
         
+        # Attacker logs can be very large: diff by key and render only visible rows
+        self.log_sync = TreeviewSync(
+            self.log_table,
+            key_func=lambda e: e.get("id", f"{e.get('username')}|{e.get('ip')}"),
+            values_func=lambda e: (
+                e.get("timestamp", "N/A"),
+                e.get("username", "N/A"),
+                e.get("ip", "N/A"),
+                e.get("attempted_port", "N/A"),
+                e.get("reason", "N/A"),
+            ),
+            scrollbar=scrollbar,
+            windowed=True
+        )
+        
         # Button frame for attackers
         button_frame = tk.Frame(attackers_tab)
         button_frame.pack(pady=10)
         
         tk.Button(button_frame, text="Refresh", command=self.view_logs).pack(side="left", padx=5)
         tk.Button(button_frame, text="Ban Selected IP", command=self.ban_selected_attacker).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Export...", command=self.export_attackers).pack(side="left", padx=5)
         
         # Setup Banned IPs sub-tab
         tk.Label(banned_tab, text="Banned IP Addresses", font=("Arial", 16)).pack(pady=10)
@@ -135,6 +173,13 @@ class AdminPanel(tk.Frame):
         scrollbar = ttk.Scrollbar(banned_tab, orient="vertical", command=self.banned_table.yview)
         scrollbar.pack(side="right", fill="y")
         self.banned_table.configure(yscrollcommand=scrollbar.set)
+        self.banned_sync = TreeviewSync(
+            self.banned_table,
+            key_func=lambda ip: ip,
+            values_func=lambda ip: (ip, "Unban"),
+            scrollbar=scrollbar,
+            windowed=True
+        )
         
         # Actions frame for banned IPs
         action_frame = tk.Frame(banned_tab)
@@ -142,6 +187,7 @@ class AdminPanel(tk.Frame):
         
         tk.Button(action_frame, text="Refresh", command=self.view_banned_ips).pack(side="left", padx=5)
         tk.Button(action_frame, text="Unban Selected IP", command=self.unban_selected_ip).pack(side="left", padx=5)
+        tk.Button(action_frame, text="Import Blocklist...", command=self.import_blocklist).pack(side="left", padx=5)
         
         # Load initial data
         self.view_banned_ips()
@@ -172,6 +218,19 @@ class AdminPanel(tk.Frame):
         scrollbar = ttk.Scrollbar(self.users_tab, orient="vertical", command=self.users_table.yview)
         scrollbar.pack(side="right", fill="y")
         self.users_table.configure(yscrollcommand=scrollbar.set)
+        self.users_sync = TreeviewSync(
+            self.users_table,
+            key_func=lambda user: user.get("session_id", f"{user.get('username')}|{user.get('ip')}"),
+            values_func=lambda user: (
+                user.get("username", "N/A"),
+                user.get("ip", "N/A"),
+                user.get("port", "N/A"),
+                user.get("login_time", "N/A"),
+                user.get("last_activity", "N/A"),
+                user.get("session_length", "N/A"),
+                user.get("inactive_for", "N/A")
+            )
+        )
         
         # Actions frame
         action_frame = tk.Frame(self.users_tab)
@@ -219,6 +278,16 @@ class AdminPanel(tk.Frame):
         scrollbar = ttk.Scrollbar(ports_list_frame, orient="vertical", command=self.port_table.yview)
         scrollbar.pack(side="right", fill="y")
         self.port_table.configure(yscrollcommand=scrollbar.set)
+        self.port_sync = TreeviewSync(
+            self.port_table,
+            key_func=lambda port: port.get("port"),
+            values_func=lambda port: (
+                port.get("port", "N/A"),
+                port.get("status", "N/A"),
+                "ON" if port.get("honeypot") else "OFF",
+                port.get("last_triggered", "N/A")
+            )
+        )
         
         # Action buttons for the selected port
         tk.Label(port_actions_frame, text="Port Actions:", font=("Arial", 12)).pack(pady=10)
@@ -253,6 +322,8 @@ class AdminPanel(tk.Frame):
         self.potential_count = tk.StringVar(value="0")
         self.banned_count = tk.StringVar(value="0")
         self.user_count = tk.StringVar(value="0")
+        self.login_rate = tk.StringVar(value="0")
+        self.honeypot_rate = tk.StringVar(value="0")
         
         # Display in a grid
         status_grid = tk.Frame(info_frame)
@@ -286,62 +357,116 @@ class AdminPanel(tk.Frame):
         tk.Label(status_grid, text="Active Users:", font=("Arial", 12)).grid(row=6, column=0, sticky="w", pady=5, padx=10)
         tk.Label(status_grid, textvariable=self.user_count, font=("Arial", 12)).grid(row=6, column=1, sticky="w", pady=5, padx=10)
         
+        # Row 8
+        tk.Label(status_grid, text="Logins/sec:", font=("Arial", 12)).grid(row=7, column=0, sticky="w", pady=5, padx=10)
+        tk.Label(status_grid, textvariable=self.login_rate, font=("Arial", 12)).grid(row=7, column=1, sticky="w", pady=5, padx=10)
+        
+        # Row 9
+        tk.Label(status_grid, text="Honeypot Triggers/min:", font=("Arial", 12)).grid(row=8, column=0, sticky="w", pady=5, padx=10)
+        tk.Label(status_grid, textvariable=self.honeypot_rate, font=("Arial", 12)).grid(row=8, column=1, sticky="w", pady=5, padx=10)
+        
         # Refresh button
         tk.Button(self.status_tab, text="Refresh Status", command=self.update_system_status).pack(pady=20)
 
     # ----------------------
-    # 🔄 Auto-refresh Functionality
+    # 🧵 Background Data Fetching
     # ----------------------
-    def start_auto_refresh(self):
-        """Start auto-refresh thread"""
-        self.auto_refresh_thread = threading.Thread(target=self._auto_refresh_worker, daemon=True)
-        self.auto_refresh_thread.start()
+    def submit(self, key, fetch, apply):
+        """
+        Run fetch() on the worker pool and apply(result, error) on the Tk thread.
+        Requests sharing a key are coalesced: while one is in flight, later ones
+        collapse into a single re-run that starts when it completes.
+        """
+        if self.closed:
+            return
+        
+        if key is not None:
+            if key in self.in_flight:
+                self.rerun[key] = (fetch, apply)
+                return
+            self.in_flight.add(key)
+        
+        def task():
+            try:
+                result, error = fetch(), None
+            except Exception as e:
+                result, error = None, e
+            self.results.put((key, apply, result, error))
+        
+        self.fetch_pool.submit(task)
     
-    def _auto_refresh_worker(self):
-        """Background thread to refresh data periodically"""
+    def drain_results(self):
+        """Apply completed fetches on the Tk thread"""
+        if self.closed:
+            return
+        
         while True:
             try:
-                # Update UI in the main thread
-                self.master.after(0, self.view_logs)  
-                self.master.after(0, self.view_ports, True)
-                self.master.after(0, self.update_system_status)
-                self.master.after(0, self.view_banned_ips)
-                self.master.after(0, self.view_active_users)
+                key, apply, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            
+            if key is not None:
+                self.in_flight.discard(key)
+            try:
+                apply(result, error)
             except Exception:
                 pass
             
-            # Wait for 30 seconds
-            time.sleep(30)
+            if key in self.rerun:
+                self.submit(key, *self.rerun.pop(key))
+        
+        self.after(RESULT_POLL_MS, self.drain_results)
+    
+    def destroy(self):
+        """Stop background work before the frame is destroyed"""
+        self.closed = True
+        self.fetch_pool.shutdown(wait=False)
+        ADMIN_EVENTS.close(timeout=1.0)
+        super().destroy()
+    
+    # ----------------------
+    # 🔄 Auto-refresh Functionality
+    # ----------------------
+    def start_auto_refresh(self):
+        """Schedule the periodic refresh on the Tk event loop"""
+        self.after(AUTO_REFRESH_MS, self.auto_refresh)
+    
+    def auto_refresh(self):
+        """Refresh all views; fetches that are still in flight are not restarted"""
+        if self.closed:
+            return
+        self.view_logs()
+        self.view_ports(True)
+        self.update_system_status()
+        self.view_banned_ips()
+        self.view_active_users()
+        self.after(AUTO_REFRESH_MS, self.auto_refresh)
 
     # ----------------------
     # 👨🏻‍💻 Attacker Management
     # ----------------------
     def view_logs(self):
-        try:
-            # Get attackers and potential attackers via socket
-            attackers = AdminHandler.get_attackers()
-            potential_attackers = AdminHandler.get_potential_attackers()
-            
-            # Combine both lists
-            all_attackers = attackers + potential_attackers
-            
-            # Sort by timestamp descending
-            all_attackers.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-        except Exception:
+        self.submit("logs", self.fetch_logs, self.show_logs)
+    
+    def fetch_logs(self):
+        # Get attackers and potential attackers via socket
+        attackers = AdminHandler.get_attackers()
+        potential_attackers = AdminHandler.get_potential_attackers()
+        
+        # Combine both lists
+        all_attackers = attackers + potential_attackers
+        
+        # Sort by timestamp descending
+        all_attackers.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
+        return all_attackers
+    
+    def show_logs(self, all_attackers, error):
+        if error:
             messagebox.showerror("Error", "Failed to fetch attackers")
             return
 
-        for item in self.log_table.get_children():
-            self.log_table.delete(item)
-
-        for entry in all_attackers:
-            self.log_table.insert("", "end", values=(
-                entry.get("timestamp", "N/A"),
-                entry.get("username", "N/A"),
-                entry.get("ip", "N/A"),
-                entry.get("attempted_port", "N/A"),
-                entry.get("reason", "N/A"),
-            ))
+        self.log_sync.update(all_attackers)
 
     def ban_selected_attacker(self):
         selected_item = self.log_table.selection()
@@ -352,34 +477,43 @@ class AdminPanel(tk.Frame):
         # Get the IP from the selected item
         ip = self.log_table.item(selected_item[0])['values'][2]  # IP is at index 2
         
-        try:
-            result = AdminHandler.ban_ip(ip)
-            if result:
+        def done(result, error):
+            if result and not error:
                 messagebox.showinfo("Success", f"IP {ip} has been banned.")
-                # Print to terminal
-                print(f"[ADMIN] IP {ip} has been banned")
+                ADMIN_EVENTS.emit("ops", "ip_banned", f"[ADMIN] IP {ip} has been banned", ip=ip)
                 self.view_logs()
                 self.view_banned_ips()
             else:
                 messagebox.showerror("Error", "Failed to ban IP")
-        except Exception:
-            messagebox.showerror("Error", "Failed to ban IP")
+        
+        self.submit(None, lambda: AdminHandler.ban_ip(ip), done)
+    
+    def export_attackers(self):
+        path = filedialog.asksaveasfilename(title="Export Attackers", defaultextension=".ndjson",
+                                            filetypes=[("JSON lines", "*.ndjson"), ("All files", "*.*")])
+        if not path:
+            return
+        
+        def done(count, error):
+            if count is not None and not error:
+                messagebox.showinfo("Success", f"{count} attacker events exported to {path}.")
+            else:
+                messagebox.showerror("Error", "Failed to export attackers")
+        
+        self.submit(None, lambda: AdminHandler.export_attackers(path), done)
 
     # ----------------------
     # 🚫 Banned IPs Management
     # ----------------------
     def view_banned_ips(self):
-        try:
-            banned_ips = AdminHandler.get_banned_ips()
-        except Exception:
+        self.submit("banned", AdminHandler.get_banned_ips, self.show_banned_ips)
+    
+    def show_banned_ips(self, banned_ips, error):
+        if error:
             messagebox.showerror("Error", "Failed to fetch banned IPs")
             return
 
-        for item in self.banned_table.get_children():
-            self.banned_table.delete(item)
-
-        for ip in banned_ips:
-            self.banned_table.insert("", "end", values=(ip, "Unban"))
+        self.banned_sync.update(banned_ips)
     
     def unban_selected_ip(self):
         selected_item = self.banned_table.selection()
@@ -390,41 +524,45 @@ class AdminPanel(tk.Frame):
         # Get the IP from the selected item
         ip = self.banned_table.item(selected_item[0])['values'][0]
         
-        try:
-            result = AdminHandler.unban_ip(ip)
-            if result:
+        def done(result, error):
+            if result and not error:
                 messagebox.showinfo("Success", f"IP {ip} has been unbanned.")
-                # Print to terminal
-                print(f"[ADMIN] IP {ip} has been unbanned")
+                ADMIN_EVENTS.emit("ops", "ip_unbanned", f"[ADMIN] IP {ip} has been unbanned", ip=ip)
                 self.view_banned_ips()
             else:
                 messagebox.showerror("Error", "Failed to unban IP")
-        except Exception:
-            messagebox.showerror("Error", "Failed to unban IP")
+        
+        self.submit(None, lambda: AdminHandler.unban_ip(ip), done)
+    
+    def import_blocklist(self):
+        path = filedialog.askopenfilename(title="Import Blocklist",
+                                          filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if not path:
+            return
+        
+        def done(added, error):
+            if added is not None and not error:
+                messagebox.showinfo("Success", f"{added} new IPs have been banned.")
+                ADMIN_EVENTS.emit("ops", "ips_banned", f"[ADMIN] {added} IPs banned from {path}",
+                                  count=added, file=path)
+                self.view_banned_ips()
+            else:
+                messagebox.showerror("Error", "Failed to import blocklist")
+        
+        self.submit(None, lambda: AdminHandler.import_blocklist(path), done)
 
     # ----------------------
     # 👥 Active Users Management
     # ----------------------
     def view_active_users(self):
-        try:
-            active_users = AdminHandler.get_active_users()
-        except Exception:
+        self.submit("users", AdminHandler.get_active_users, self.show_active_users)
+    
+    def show_active_users(self, active_users, error):
+        if error:
             messagebox.showerror("Error", "Failed to fetch active users")
             return
 
-        for item in self.users_table.get_children():
-            self.users_table.delete(item)
-
-        for user in active_users:
-            self.users_table.insert("", "end", values=(
-                user.get("username", "N/A"),
-                user.get("ip", "N/A"),
-                user.get("port", "N/A"),
-                user.get("login_time", "N/A"),
-                user.get("last_activity", "N/A"),
-                user.get("session_length", "N/A"),
-                user.get("inactive_for", "N/A")
-            ))
+        self.users_sync.update(active_users)
 
     def ban_selected_user(self):
         """Ban the IP of the selected user"""
@@ -437,84 +575,44 @@ class AdminPanel(tk.Frame):
         ip = self.users_table.item(selected_item[0])['values'][1]  # IP is at index 1
         
         if messagebox.askyesno("Confirm Ban", f"Are you sure you want to ban IP {ip}?"):
-            try:
-                result = AdminHandler.ban_ip(ip)
-                if result:
+            def done(result, error):
+                if result and not error:
                     messagebox.showinfo("Success", f"IP {ip} has been banned.")
-                    # Print to terminal
-                    print(f"[ADMIN] IP {ip} has been banned")
+                    ADMIN_EVENTS.emit("ops", "ip_banned", f"[ADMIN] IP {ip} has been banned", ip=ip)
                     self.view_active_users()
                     self.view_banned_ips()
                 else:
                     messagebox.showerror("Error", "Failed to ban IP")
-            except Exception:
-                messagebox.showerror("Error", "Failed to ban IP")
+            
+            self.submit(None, lambda: AdminHandler.ban_ip(ip), done)
 
     # ----------------------
     # 🔌 Ports Management
     # ----------------------
     def view_ports(self, latest_only=True):
-        try:
-            ports = AdminHandler.get_ports()
-        except Exception:
-            messagebox.showerror("Error", "Failed to fetch ports")
-            return
-
-        active_ports = [p for p in ports if p["status"] == "active"]
-        if latest_only:
-            active_ports = active_ports[:5]
-
-        for item in self.port_table.get_children():
-            self.port_table.delete(item)
-
-        for port in active_ports:
-            honeypot = "ON" if port.get("honeypot") else "OFF"
-            self.port_table.insert("", "end", values=(
-                port.get("port", "N/A"),
-                port.get("status", "N/A"),
-                honeypot,
-                port.get("last_triggered", "N/A")
-            ))
+        def select(ports):
+            active_ports = [p for p in ports if p["status"] == "active"]
+            if latest_only:
+                active_ports = active_ports[:5]
+            return active_ports
+        
+        self.submit("ports", AdminHandler.get_ports, lambda ports, error: self.show_ports(ports, error, select))
 
     def view_ports_full(self):
-        try:
-            ports = AdminHandler.get_ports()
-        except Exception:
-            messagebox.showerror("Error", "Failed to fetch ports")
-            return
-
-        for item in self.port_table.get_children():
-            self.port_table.delete(item)
-
-        for port in ports:
-            honeypot = "ON" if port.get("honeypot") else "OFF"
-            self.port_table.insert("", "end", values=(
-                port.get("port", "N/A"),
-                port.get("status", "N/A"),
-                honeypot,
-                port.get("last_triggered", "N/A")
-            ))
+        self.submit("ports", AdminHandler.get_ports, lambda ports, error: self.show_ports(ports, error, list))
 
     def view_disabled_ports(self):
-        try:
-            ports = AdminHandler.get_ports()
-        except Exception:
+        def select(ports):
+            return [p for p in ports if p["status"] == "inactive"]
+        
+        self.submit("ports", AdminHandler.get_ports, lambda ports, error: self.show_ports(ports, error, select))
+
+    def show_ports(self, ports, error, select):
+        if error:
             messagebox.showerror("Error", "Failed to fetch ports")
             return
 
-        disabled_ports = [p for p in ports if p["status"] == "inactive"]
-
-        for item in self.port_table.get_children():
-            self.port_table.delete(item)
-
-        for port in disabled_ports:
-            honeypot = "ON" if port.get("honeypot") else "OFF"
-            self.port_table.insert("", "end", values=(
-                port.get("port", "N/A"),
-                port.get("status", "N/A"),
-                honeypot,
-                port.get("last_triggered", "N/A")
-            ))
+        self.port_sync.update(select(ports))
 
     def toggle_port_status(self, status):
         """Toggle port status using table selection"""
@@ -527,18 +625,19 @@ class AdminPanel(tk.Frame):
         # Get the port from the selected item
         port = self.port_table.item(selected_item[0])['values'][0]  # Port is at index 0
         
-        try:
-            result = AdminHandler.update_port(int(port), status=status)
-            if result:
+        def done(result, error):
+            if error:
+                messagebox.showerror("Error", "Failed to update port")
+            elif result:
                 action = "enabled" if status == "active" else "disabled"
                 messagebox.showinfo("Success", f"Port {port} status set to {status}.")
-                # Print to terminal
-                print(f"[ADMIN] Port {port} {action}")
+                ADMIN_EVENTS.emit("ops", "port_status_changed", f"[ADMIN] Port {port} {action}",
+                                  port=port, status=status)
                 self.view_ports_full()  # Refresh to show all ports
             else:
                 messagebox.showerror("Error", "Failed to update port status")
-        except Exception:
-            messagebox.showerror("Error", "Failed to update port")
+        
+        self.submit(None, lambda: AdminHandler.update_port(int(port), status=status), done)
 
     def toggle_honeypot(self, enabled):
         """Toggle honeypot using table selection"""
@@ -551,58 +650,44 @@ class AdminPanel(tk.Frame):
         # Get the port from the selected item
         port = self.port_table.item(selected_item[0])['values'][0]  # Port is at index 0
         
-        try:
-            result = AdminHandler.update_port(int(port), honeypot=enabled)
-            if result:
+        def done(result, error):
+            if error:
+                messagebox.showerror("Error", "Failed to toggle honeypot")
+            elif result:
                 status = "enabled" if enabled else "disabled"
                 messagebox.showinfo("Success", f"Honeypot for Port {port} {status}.")
-                # Print to terminal
-                print(f"[ADMIN] Honeypot {status} for Port {port}")
+                ADMIN_EVENTS.emit("ops", "port_honeypot_changed", f"[ADMIN] Honeypot {status} for Port {port}",
+                                  port=port, honeypot=enabled)
                 self.view_ports_full()  # Refresh to show all ports
             else:
                 messagebox.showerror("Error", "Failed to toggle honeypot")
-        except Exception:
-            messagebox.showerror("Error", "Failed to toggle honeypot")
+        
+        self.submit(None, lambda: AdminHandler.update_port(int(port), honeypot=enabled), done)
 
     # ----------------------
     # 🔍 System Status
     # ----------------------
     def update_system_status(self):
-        """Update the system status indicators"""
-        try:
-            # Check server status
-            try:
-                # Check if we can get ports as a connectivity test
-                ports = AdminHandler.get_ports()
-                self.server_status.set("Online")
-                
-                # Count active and honeypot ports
-                active_count = len([p for p in ports if p["status"] == "active"])
-                honeypot_count = len([p for p in ports if p.get("honeypot", False)])
-                
-                self.active_ports.set(str(active_count))
-                self.honeypot_ports.set(str(honeypot_count))
-            except:
-                self.server_status.set("Offline")
-            
-            # Get attacker count
-            attackers = AdminHandler.get_attackers()
-            self.attacker_count.set(str(len(attackers)))
-            
-            # Get potential attacker count
-            potential_attackers = AdminHandler.get_potential_attackers()
-            self.potential_count.set(str(len(potential_attackers)))
-            
-            # Get banned IP count
-            banned_ips = AdminHandler.get_banned_ips()
-            self.banned_count.set(str(len(banned_ips)))
-            
-            # Get active user count
-            active_users = AdminHandler.get_active_users()
-            self.user_count.set(str(len(active_users)))
-            
-        except Exception:
+        """Update the system status indicators from the server's GET_STATS counters"""
+        self.submit("status", AdminHandler.get_stats, self.show_system_status)
+    
+    def show_system_status(self, stats, error):
+        if error:
             self.server_status.set("Error")
+            return
+        if not stats:
+            self.server_status.set("Offline")
+            return
+        
+        self.server_status.set("Online")
+        self.active_ports.set(str(stats.get("ports_active", 0)))
+        self.honeypot_ports.set(str(stats.get("ports_honeypot", 0)))
+        self.attacker_count.set(str(stats.get("attackers", 0)))
+        self.potential_count.set(str(stats.get("potential_attackers", 0)))
+        self.banned_count.set(str(stats.get("banned_ips", 0)))
+        self.user_count.set(str(stats.get("sessions", 0)))
+        self.login_rate.set(f"{stats.get('logins_per_sec', 0):.2f}")
+        self.honeypot_rate.set(f"{stats.get('honeypot_triggers_per_min', 0):.1f}")
 
     # ----------------------
     # 🚪 Logout Functionality
@@ -0,0 +1,121 @@
+# ===============================
+# 🚪 HoneyTrap Connection Admission
+# ===============================
+# Decides whether an accepted connection gets a handler thread at all. The
+# check runs on the accept thread right after accept(), before any thread,
+# TLS handshake or receive buffer exists for the connection:
+#
+#   - a global cap on open connections (bounds threads and memory)
+#   - a cap on open connections per source IP
+#
+# A refused connection is either reset straight away ("reject") or handed a
+# canned honeypot answer and closed ("honeypot").
+#
+# Also reads accept queue figures for metrics: the current length and limit
+# of a listening socket's queue (Linux TCP_INFO), and the kernel's
+# ListenOverflows/ListenDrops counters (/proc/net/netstat, system-wide).
+
+import json
+import os
+import socket
+import struct
+import threading
+
+BACKLOG = int(os.environ.get("HONEYTRAP_BACKLOG", 1024))
+MAX_CONNECTIONS = int(os.environ.get("HONEYTRAP_MAX_CONNECTIONS", 2000))
+MAX_CONNECTIONS_PER_IP = int(os.environ.get("HONEYTRAP_MAX_CONNECTIONS_PER_IP", 50))
+POLICIES = ("reject", "honeypot")
+POLICY = os.environ.get("HONEYTRAP_ADMISSION_POLICY", "reject")
+
+# Sent to refused connections under the honeypot policy
+HONEYPOT_ANSWER = json.dumps({"status": "fake"}).encode("utf-8")
+
+def configure(backlog=None, max_connections=None, max_per_ip=None, policy=None):
+    """Change the defaults for servers created afterwards (0 means no cap)"""
+    global BACKLOG, MAX_CONNECTIONS, MAX_CONNECTIONS_PER_IP, POLICY
+    if policy is not None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown admission policy: {policy}")
+        POLICY = policy
+    if backlog is not None:
+        BACKLOG = backlog
+    if max_connections is not None:
+        MAX_CONNECTIONS = max_connections
+    if max_per_ip is not None:
+        MAX_CONNECTIONS_PER_IP = max_per_ip
+
+class AdmissionControl:
+    """Open connection counts, globally and per source IP"""
+    def __init__(self, max_connections=None, max_per_ip=None, policy=None):
+        self.max_connections = MAX_CONNECTIONS if max_connections is None else max_connections
+        self.max_per_ip = MAX_CONNECTIONS_PER_IP if max_per_ip is None else max_per_ip
+        self.policy = policy or POLICY
+        self.lock = threading.Lock()
+        self.open = 0
+        self.per_ip = {}
+
+    def admit(self, ip):
+        """Count a new connection; returns None, or why it was refused"""
+        with self.lock:
+            if self.max_connections and self.open >= self.max_connections:
+                return "global_cap"
+            count = self.per_ip.get(ip, 0)
+            if self.max_per_ip and count >= self.max_per_ip:
+                return "ip_cap"
+            self.open += 1
+            self.per_ip[ip] = count + 1
+            return None
+
+    def release(self, ip):
+        with self.lock:
+            self.open -= 1
+            count = self.per_ip.get(ip, 0) - 1
+            if count > 0:
+                self.per_ip[ip] = count
+            else:
+                self.per_ip.pop(ip, None)
+
+    def refuse(self, client_socket):
+        """Close a refused connection without reading from it"""
+        try:
+            if self.policy == "honeypot":
+                client_socket.setblocking(False)
+                try:
+                    client_socket.send(HONEYPOT_ANSWER)
+                except OSError:
+                    pass
+            else:
+                # RST instead of FIN: no TIME_WAIT state left behind
+                client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
+
+# ----------------------
+# 📈 Accept Queue
+# ----------------------
+def accept_queue(listen_socket):
+    """(queued, limit) of a listening socket's accept queue, or None where unsupported"""
+    tcp_info = getattr(socket, "TCP_INFO", None)
+    if tcp_info is None or listen_socket is None:
+        return None
+    try:
+        info = listen_socket.getsockopt(socket.IPPROTO_TCP, tcp_info, 104)
+        # For a listener, tcpi_unacked and tcpi_sacked hold the queue length and limit
+        return struct.unpack_from("=II", info, 24)
+    except (OSError, struct.error):
+        return None
+
+def listen_overflows():
+    """System-wide TcpExt ListenOverflows and ListenDrops counters (Linux), or {}"""
+    try:
+        with open("/proc/net/netstat") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return {}
+    for names, values in zip(lines[::2], lines[1::2]):
+        if names.startswith("TcpExt:"):
+            stats = dict(zip(names.split()[1:], values.split()[1:]))
+            return {k: int(stats[k]) for k in ("ListenOverflows", "ListenDrops") if k in stats}
+    return {}
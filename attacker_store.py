@@ -0,0 +1,310 @@
+# ===============================
+# 🗃️ HoneyTrap Attacker Event Store
+# ===============================
+# Append-only, time-partitioned store for confirmed honeypot interactions
+# (fake-portal logins, data reported by the fake portal). Events are
+# newline-delimited JSON in one segment file per UTC hour:
+#
+#   attacker_events/20261019-14.ndjson
+#
+# Each line starts with its "ts", and timestamps never go backwards, so a
+# segment is sorted and a time range is found by binary search over the
+# memory-mapped file. The most recent events are also kept in memory, so the
+# admin panel's "latest N" query never touches disk.
+#
+# With shared storage (multi-process servers) every process appends to the
+# same segments, each append under an flock() of the segment, and queries
+# read the segments since no process's tail holds every event.
+
+import calendar
+import json
+import mmap
+import os
+import threading
+import time
+from collections import deque
+
+import storage
+
+ATTACKER_DIR = "attacker_events"
+SEGMENT_SUFFIX = ".ndjson"
+SEGMENT_SECONDS = 3600
+TAIL_SIZE = 2000
+DEFAULT_LIMIT = 1000
+MAX_DETAIL_LENGTH = 256
+
+# ----------------------
+# 🔎 Segment Search
+# ----------------------
+def _segment_key(ts):
+    return time.strftime("%Y%m%d-%H", time.gmtime(ts))
+
+def _segment_start(key):
+    return calendar.timegm(time.strptime(key, "%Y%m%d-%H"))
+
+def _parse_line(line):
+    """One segment line as a record, or None for a corrupt line (torn by a crash)"""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) and "ts" in record else None
+
+def _bisect(mm, size, ts):
+    """Offset of the first line in mm[:size] whose ts is >= ts (corrupt lines are skipped)"""
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start = mm.rfind(b"\n", 0, mid) + 1
+        probe, record = start, None
+        while probe < size:
+            end = mm.find(b"\n", probe, size)
+            if end < 0:
+                end = size
+            record = _parse_line(mm[probe:end])
+            if record is not None:
+                break
+            probe = end + 1
+        if record is not None and record["ts"] < ts:
+            lo = end + 1
+        else:
+            hi = start
+    return min(lo, size)
+
+def read_segment(path, since=None, until=None):
+    """Records of one segment with since <= ts <= until, oldest first"""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Ignore a line that is still being appended
+                size = mm.rfind(b"\n") + 1
+                start = _bisect(mm, size, since) if since is not None else 0
+                end = _bisect(mm, size, until + 1e-6) if until is not None else size
+                if start >= end:
+                    return []
+                chunk = mm[start:end]
+    except (OSError, ValueError):
+        return []
+    records = (_parse_line(line) for line in chunk.splitlines() if line)
+    return [record for record in records if record is not None]
+
+# ----------------------
+# 🗃️ Store
+# ----------------------
+class AttackerStore:
+    """One store directory: hourly segments plus an in-memory tail"""
+    def __init__(self, directory, tail_size=TAIL_SIZE):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.tail = deque(maxlen=tail_size)
+        self.total = 0
+        self.last_ts = 0.0
+        self.file = None
+        self.file_key = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def segments(self):
+        """Segment keys, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(n[:-len(SEGMENT_SUFFIX)] for n in names if n.endswith(SEGMENT_SUFFIX))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SEGMENT_SUFFIX)
+
+    def _load(self):
+        """Count stored events and warm the tail from the newest segments"""
+        keys = self.segments()
+        for key in keys:
+            with open(self._path(key), "rb") as f:
+                while True:
+                    block = f.read(1 << 20)
+                    if not block:
+                        break
+                    self.total += block.count(b"\n")
+
+        recent = []
+        for key in reversed(keys):
+            recent = read_segment(self._path(key)) + recent
+            if len(recent) >= self.tail.maxlen:
+                break
+        self.tail.extend(recent[-self.tail.maxlen:])
+        if self.tail:
+            self.last_ts = self.tail[-1]["ts"]
+
+    def append(self, record, clamp=True):
+        """
+        Append one event; assigns ts, timestamp and a stable id. A given ts
+        older than the last event's is raised to it, so segments stay sorted,
+        unless clamp is False (migration, which appends in ts order itself).
+        """
+        given = record.get("ts")
+        with self.lock:
+            ts = given if given is not None else time.time()
+            if clamp:
+                # Keep every segment sorted even if the wall clock steps back
+                ts = max(ts, self.last_ts)
+            key = _segment_key(ts)
+            if key != self.file_key:
+                if self.file:
+                    self.file.close()
+                self.file = open(self._path(key), "ab")
+                self.file_key = key
+                self._start_line()
+
+            shared = storage.SHARED and storage.fcntl is not None
+            if shared:
+                storage.fcntl.flock(self.file, storage.fcntl.LOCK_EX)
+            try:
+                if shared:
+                    # Other processes append too: take the time and offset under the lock
+                    if given is None:
+                        now = time.time()
+                        if _segment_key(now) == key:
+                            ts = max(ts, now)
+                    self._start_line()
+                self.last_ts = max(ts, self.last_ts)
+                entry = {"ts": ts, "id": f"{key}:{self.file.tell()}"}
+                entry.update((k, v) for k, v in record.items() if k not in ("ts", "id"))
+                entry.setdefault("timestamp", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)))
+                self.file.write(json.dumps(entry).encode("utf-8") + b"\n")
+                self.file.flush()
+            finally:
+                if shared:
+                    storage.fcntl.flock(self.file, storage.fcntl.LOCK_UN)
+
+            self.tail.append(entry)
+            self.total += 1
+            return entry
+
+    def _start_line(self):
+        """Terminate a torn last line, so the next event starts a line of its own"""
+        end = self.file.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        with open(self.file.name, "rb") as f:
+            f.seek(end - 1)
+            if f.read(1) == b"\n":
+                return
+        self.file.write(b"\n")
+
+    def query(self, since=None, until=None, limit=DEFAULT_LIMIT):
+        """Events with since <= ts <= until, newest first, at most `limit`"""
+        return list(self.iterate(since, until, limit))
+
+    def iterate(self, since=None, until=None, limit=DEFAULT_LIMIT):
+        """query() as a generator, holding one segment's records at a time"""
+        with self.lock:
+            tail = list(self.tail)
+            complete = self.total == len(tail)
+
+        # The tail holds every event newer than its first entry
+        matches = [e for e in reversed(tail)
+                   if (since is None or e["ts"] >= since) and (until is None or e["ts"] <= until)]
+        covered = complete or (tail and since is not None and since >= tail[0]["ts"])
+        if not storage.SHARED and (covered or (limit and len(matches) >= limit)):
+            yield from (matches[:limit] if limit else matches)
+            return
+
+        count = 0
+        for key in reversed(self.segments()):
+            start = _segment_start(key)
+            if until is not None and start > until:
+                continue
+            if since is not None and start + SEGMENT_SECONDS <= since:
+                break
+            for record in reversed(read_segment(self._path(key), since, until)):
+                yield record
+                count += 1
+                if limit and count >= limit:
+                    return
+
+    def count(self):
+        return self.total
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+                self.file_key = None
+
+# ----------------------
+# 🌍 Module API
+# ----------------------
+# One store per absolute directory, so callers that change the working
+# directory (benchmarks, replay) get the store for their data directory
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+def get_store():
+    directory = os.path.abspath(ATTACKER_DIR)
+    with _STORES_LOCK:
+        store = _STORES.get(directory)
+        if store is None:
+            store = _STORES[directory] = AttackerStore(directory)
+        return store
+
+def _clean_details(details):
+    """Keep reported details small and flat"""
+    clean = {}
+    for key, value in list((details or {}).items())[:20]:
+        clean[str(key)[:64]] = str(value)[:MAX_DETAIL_LENGTH]
+    return clean
+
+def record(event, username, ip, port, reason, details=None):
+    """Store one confirmed honeypot interaction"""
+    entry = {
+        "event": event,
+        "username": username,
+        "ip": ip,
+        "attempted_port": port,
+        "reason": reason
+    }
+    if details:
+        entry["details"] = _clean_details(details)
+    return get_store().append(entry)
+
+def query(since=None, until=None, limit=DEFAULT_LIMIT):
+    return get_store().query(since, until, limit)
+
+def iterate(since=None, until=None, limit=DEFAULT_LIMIT):
+    return get_store().iterate(since, until, limit)
+
+def count():
+    return get_store().count()
+
+def migrate_legacy(legacy_file):
+    """Move entries from the old attackers.json list into the store (once)"""
+    try:
+        with open(legacy_file, "r") as f:
+            legacy = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if not isinstance(legacy, list) or not legacy:
+        return 0
+
+    # Entries without a readable timestamp are dated by the legacy file's modification time
+    fallback = os.path.getmtime(legacy_file)
+
+    def legacy_ts(entry):
+        try:
+            return time.mktime(time.strptime(entry.get("timestamp", ""), "%Y-%m-%d %H:%M:%S"))
+        except (AttributeError, TypeError, ValueError, OverflowError):
+            return fallback
+
+    store = get_store()
+    migrated = 0
+    for entry in sorted(legacy, key=legacy_ts):
+        if isinstance(entry, dict):
+            entry = dict(entry, ts=legacy_ts(entry))
+            entry.setdefault("event", "legacy")
+            store.append(entry, clamp=False)
+            migrated += 1
+    os.replace(legacy_file, legacy_file + ".migrated")
+    return migrated
@@ -3,11 +3,15 @@
 # ===============================
 import socket
 import json
+import queue
 import threading
 import time
 import select
 import ssl
-from protocol import MessageType
+from protocol import MessageType, encode_message, STATUS_PARTIAL, STREAM_WINDOW, BULK_BATCH
+
+# Drop a partial response that grows beyond this without ever decoding
+MAX_BUFFERED_RESPONSE = 64 * 1024 * 1024
 
 class HoneyTrapClient:
     """Client for connecting to the HoneyTrap server"""
@@ -25,13 +29,29 @@ class HoneyTrapClient:
         
         # User information
         self.username = None
+        self.session_token = None
         self.logged_in = False
         
         # Response handling
         self.last_response = None
         self.response_event = threading.Event()
         self.response_lock = threading.Lock()
+        self.response_ready = threading.Condition(self.response_lock)
+        # Request id -> its response (None until it arrives); records of a
+        # response streamed in partial frames are collected in partial_data
         self.response_queue = {}
+        self.partial_data = {}
+        # Request id awaited on each channel, for responses without an id
+        self.waiting = {}
+        # Request id -> queue of the frames of a response being iterated over
+        self.streams = {}
+        
+        # Serializes request/response pairs per channel, so concurrent callers
+        # (keep-alive, admin fetch workers) take turns on a channel while a bulk
+        # transfer on the data channel never holds up the control channel
+        self.request_locks = {'control': threading.Lock(), 'data': threading.Lock()}
+        # Streamed responses send credits while other requests are in flight
+        self.send_locks = {'control': threading.Lock(), 'data': threading.Lock()}
         
         # Listener thread
         self.listener_thread = None
@@ -112,6 +132,12 @@ class HoneyTrapClient:
             except:
                 pass
             self.data_socket = None
+        
+        # Wake requests waiting for a response that will not come
+        with self.response_lock:
+            self.response_ready.notify_all()
+            for frames in self.streams.values():
+                frames.put(None)
     
     def register_handler(self, command, handler_function):
         """Register a function to handle specific incoming messages"""
@@ -121,11 +147,22 @@ class HoneyTrapClient:
         """Handle response messages from the server"""
         message_id = message.get('id')
         
-        if message_id:
-            with self.response_lock:
-                if message_id in self.response_queue:
+        with self.response_lock:
+            if message_id in self.streams:
+                self.streams[message_id].put(message)
+                return
+            if message_id is None:
+                message_id = self.waiting.get(channel_type)
+            if message_id in self.response_queue:
+                if message.get('status') == STATUS_PARTIAL:
+                    self.partial_data.setdefault(message_id, []).extend(message.get('data') or [])
+                elif message_id in self.partial_data:
+                    records = self.partial_data.pop(message_id)
+                    self.response_queue[message_id] = dict(message, data=records + (message.get('data') or []))
+                else:
                     self.response_queue[message_id] = message
-                    return
+                self.response_ready.notify_all()
+                return
         
         # If no message ID, treat as general response
         self.last_response = message
@@ -137,8 +174,9 @@ class HoneyTrapClient:
             return False
         
         try:
-            message_data = json.dumps(message).encode('utf-8')
-            self.control_socket.sendall(message_data)
+            message_data = encode_message(message)
+            with self.send_locks['control']:
+                self.control_socket.sendall(message_data)
             return True
         except Exception:
             self.disconnect()
@@ -150,8 +188,9 @@ class HoneyTrapClient:
             return False
         
         try:
-            message_data = json.dumps(message).encode('utf-8')
-            self.data_socket.sendall(message_data)
+            message_data = encode_message(message)
+            with self.send_locks['data']:
+                self.data_socket.sendall(message_data)
             return True
         except Exception:
             self.disconnect()
@@ -159,6 +198,11 @@ class HoneyTrapClient:
     
     def listen_for_messages(self):
         """Listen for incoming messages on both channels"""
+        # Responses can span several reads (and one read can hold several
+        # responses), so each channel keeps a buffer of undecoded bytes
+        buffers = {}
+        decoder = json.JSONDecoder()
+        
         while self.active and self.connected:
             try:
                 # Check both sockets with timeout
@@ -168,20 +212,40 @@ class HoneyTrapClient:
                 
                 for sock in readable:
                     try:
-                        data = sock.recv(4096)
+                        data = sock.recv(65536)
                         
                         if not data:
                             # Server disconnected
                             self.disconnect()
                             return
                         
-                        # Process the message
-                        message = json.loads(data.decode('utf-8'))
+                        buffer = buffers.get(sock, b"") + data
+                        # Every message is a JSON object: only try to decode once one may be complete
+                        if not buffer.rstrip().endswith(b"}"):
+                            buffers[sock] = buffer if len(buffer) < MAX_BUFFERED_RESPONSE else b""
+                            continue
+                        
+                        text = buffer.decode('utf-8')
                         channel_type = "control" if sock == self.control_socket else "data"
-                        self.process_message(message, channel_type)
+                        position = 0
+                        while True:
+                            while position < len(text) and text[position].isspace():
+                                position += 1
+                            if position >= len(text):
+                                break
+                            try:
+                                message, position = decoder.raw_decode(text, position)
+                            except json.JSONDecodeError:
+                                break
+                            # Process the message
+                            self.process_message(message, channel_type)
                         
-                    except json.JSONDecodeError:
-                        pass
+                        rest = text[position:].encode('utf-8')
+                        buffers[sock] = rest if len(rest) < MAX_BUFFERED_RESPONSE else b""
+                    
+                    except UnicodeDecodeError:
+                        # A read can end inside a multi-byte character: wait for the rest
+                        buffers[sock] = buffer
                     except Exception:
                         pass
             
@@ -195,8 +259,9 @@ class HoneyTrapClient:
         # Check for response messages (status field indicates a response)
         if message.get('status') is not None:
             # Set the last_response regardless of whether it has an ID
-            self.last_response = message
-            self.response_event.set()
+            if message.get('status') != STATUS_PARTIAL:
+                self.last_response = message
+                self.response_event.set()
             
             # Also call the response handler for any processing
             self.handle_response(message, channel_type)
@@ -209,27 +274,48 @@ class HoneyTrapClient:
             self.message_handlers[command](message, channel_type)
     
     def send_and_wait(self, message, timeout=5.0, use_control_channel=True):
-        """Send a message and wait for a response"""
-        self.response_event.clear()
-        self.last_response = None
-        
-        # Generate a unique message ID
-        message_id = str(time.time()) + str(threading.get_ident())
-        message['id'] = message_id
-        
-        # Send the message
-        if use_control_channel:
-            if not self.send_control_message(message):
-                return None
-        else:
-            if not self.send_data_message(message):
-                return None
-        
-        # Wait for the response event to be set
-        if self.response_event.wait(timeout):
-            return self.last_response
-        
-        return None
+        """
+        Send a message and wait for a response.
+        The timeout runs from the request, and again from each partial frame
+        of a streamed response.
+        """
+        channel = 'control' if use_control_channel else 'data'
+        with self.request_locks[channel]:
+            # Generate a unique message ID
+            message_id = str(time.time()) + str(threading.get_ident())
+            message['id'] = message_id
+            with self.response_lock:
+                self.response_queue[message_id] = None
+                self.waiting[channel] = message_id
+            
+            try:
+                # Send the message
+                if use_control_channel:
+                    if not self.send_control_message(message):
+                        return None
+                else:
+                    if not self.send_data_message(message):
+                        return None
+                
+                # Wait for the response to this request; the server echoes the id,
+                # so a late answer to an earlier timed-out request is skipped
+                deadline = time.time() + timeout
+                received = 0
+                with self.response_lock:
+                    while self.response_queue[message_id] is None:
+                        if len(self.partial_data.get(message_id, ())) != received:
+                            received = len(self.partial_data[message_id])
+                            deadline = time.time() + timeout
+                        remaining = deadline - time.time()
+                        if remaining <= 0 or not self.connected:
+                            return None
+                        self.response_ready.wait(remaining)
+                    return self.response_queue[message_id]
+            finally:
+                with self.response_lock:
+                    self.response_queue.pop(message_id, None)
+                    self.partial_data.pop(message_id, None)
+                    self.waiting.pop(channel, None)
     
     def send_request(self, command, params=None, use_control_channel=True, timeout=5.0):
         """Send a request with command and params, wait for response"""
@@ -245,6 +331,64 @@ class HoneyTrapClient:
         
         return self.send_and_wait(message, timeout, use_control_channel)
     
+    def stream_request(self, command, params=None, window=STREAM_WINDOW, timeout=5.0):
+        """
+        Send a list request on the data channel and yield its records as their
+        frames arrive. The server stays at most `window` frames ahead and is
+        credited every window/2 frames; closing the generator early tells it to
+        stop. An error response yields nothing; an error after some records, a lost
+        connection or a frame later than `timeout` raises ConnectionError.
+        """
+        message_id = f"{time.time()}-{threading.get_ident()}-stream"
+        frames = queue.Queue()
+        with self.response_lock:
+            self.streams[message_id] = frames
+        finished = False
+        credit_batch = max(1, window // 2)
+        consumed = received = 0
+        try:
+            message = {
+                'command': command,
+                'params': params or {},
+                'timestamp': time.time(),
+                'id': message_id,
+                'window': window
+            }
+            if not self.send_data_message(message):
+                raise ConnectionError("Not connected to the server")
+            
+            while True:
+                try:
+                    frame = frames.get(timeout=timeout)
+                except queue.Empty:
+                    raise ConnectionError(f"No response to {command} within {timeout}s")
+                if frame is None:
+                    raise ConnectionError("Disconnected from the server")
+                
+                status = frame.get('status')
+                if status not in (STATUS_PARTIAL, 'success'):
+                    finished = True
+                    if received:
+                        # The records so far are not the whole list
+                        raise ConnectionError(f"{command} failed part-way: {frame.get('message')}")
+                    return
+                received += 1
+                yield from frame.get('data') or []
+                if status != STATUS_PARTIAL:
+                    finished = True
+                    return
+                consumed += 1
+                if consumed >= credit_batch:
+                    self.send_data_message({'command': MessageType.STREAM_CREDIT,
+                                            'params': {'stream': message_id, 'frames': consumed}})
+                    consumed = 0
+        finally:
+            with self.response_lock:
+                self.streams.pop(message_id, None)
+            if not finished and self.connected:
+                self.send_data_message({'command': MessageType.STREAM_CREDIT,
+                                        'params': {'stream': message_id, 'cancel': True}})
+    
     # ============== Authentication Methods ==============
     
     def login(self, username, password, port=None):
@@ -261,6 +405,7 @@ class HoneyTrapClient:
         
         if response and response.get('status') in ('admin', 'valid'):
             self.username = username
+            self.session_token = response.get('token')
             self.logged_in = True
             return response.get('status')
         
@@ -288,31 +433,44 @@ class HoneyTrapClient:
         if not self.logged_in:
             return True
         
-        params = {
-            'username': self.username
-        }
+        params = self.session_params()
         
         response = self.send_request(MessageType.LOGOUT, params)
         if response and response.get('status') == 'success':
             self.logged_in = False
             self.username = None
+            self.session_token = None
             return True
         return False
     
     # ============== User Activity Methods ==============
     
+    def session_params(self):
+        """Identify the session: signed token when the server issued one"""
+        if self.session_token:
+            return {'token': self.session_token}
+        return {'username': self.username}
+    
     def update_activity(self):
         """Update user activity on the server"""
         if not self.logged_in:
             return False
         
-        params = {
-            'username': self.username
-        }
+        params = self.session_params()
         
         response = self.send_request(MessageType.UPDATE_ACTIVITY, params)
         return response and response.get('status') == 'updated'
     
+    def report_honeypot(self, port, details):
+        """Report what a fake portal session collected"""
+        params = {
+            'port': port,
+            'details': details
+        }
+        
+        response = self.send_request(MessageType.REPORT_HONEYPOT, params)
+        return response and response.get('status') == 'success'
+    
     def start_keep_alive(self, interval=60):
         """Start a thread to periodically send keep-alive messages"""
         def keep_alive_worker():
@@ -346,27 +504,73 @@ class HoneyTrapClient:
     
     # ============== Security Management Methods ==============
     
-    def get_attackers(self):
-        """Get list of attackers"""
-        response = self.send_request(MessageType.GET_ATTACKERS, {})
+    def get_attackers(self, since=None, until=None, limit=None):
+        """Get recorded attacker events, newest first (optionally a time range)"""
+        params = {}
+        if since is not None:
+            params['since'] = since
+        if until is not None:
+            params['until'] = until
+        if limit is not None:
+            params['limit'] = limit
+        
+        response = self.send_request(MessageType.GET_ATTACKERS, params, use_control_channel=False)
         if response and response.get('status') == 'success':
             return response.get('data', [])
         return []
     
+    def iter_attackers(self, since=None, until=None, limit=None):
+        """Yield recorded attacker events, newest first, as they arrive (see stream_request)"""
+        params = {k: v for k, v in (('since', since), ('until', until), ('limit', limit)) if v is not None}
+        return self.stream_request(MessageType.GET_ATTACKERS, params)
+    
+    def export_attackers(self, path, since=None, until=None, limit=None):
+        """Write recorded attacker events to a file, one JSON object per line; returns the count or None"""
+        count = 0
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                # Written as they arrive: the whole export is never held in memory
+                for event in self.iter_attackers(since, until, limit):
+                    f.write(json.dumps(event) + "\n")
+                    count += 1
+        except ConnectionError:
+            return None
+        return count
+    
     def get_potential_attackers(self):
         """Get list of potential attackers"""
-        response = self.send_request(MessageType.GET_POTENTIAL_ATTACKERS, {})
+        response = self.send_request(MessageType.GET_POTENTIAL_ATTACKERS, {}, use_control_channel=False)
         if response and response.get('status') == 'success':
             return response.get('data', [])
         return []
     
+    def iter_potential_attackers(self):
+        """Yield potential attackers as they arrive (see stream_request)"""
+        return self.stream_request(MessageType.GET_POTENTIAL_ATTACKERS)
+    
     def get_banned_ips(self):
         """Get list of banned IPs"""
-        response = self.send_request(MessageType.GET_BANNED_IPS, {})
+        response = self.send_request(MessageType.GET_BANNED_IPS, {}, use_control_channel=False)
         if response and response.get('status') == 'success':
             return response.get('data', [])
         return []
     
+    def iter_banned_ips(self):
+        """Yield banned IPs as they arrive (see stream_request)"""
+        return self.stream_request(MessageType.GET_BANNED_IPS)
+    
+    def ban_ips(self, ip_addresses):
+        """Ban many IPs (an imported blocklist) in batches; returns how many were new, or None"""
+        ip_addresses = list(ip_addresses)
+        added = 0
+        for start in range(0, len(ip_addresses), BULK_BATCH):
+            params = {'ips': ip_addresses[start:start + BULK_BATCH]}
+            response = self.send_request(MessageType.BAN_IPS, params, use_control_channel=False)
+            if not response or response.get('status') != 'success':
+                return None
+            added += response.get('added', 0)
+        return added
+    
     def ban_ip(self, ip_address):
         """Ban an IP address"""
         params = {
@@ -385,9 +589,35 @@ class HoneyTrapClient:
         response = self.send_request(MessageType.UNBAN_IP, params)
         return response and response.get('status') == 'success'
     
-    def get_active_users(self):
-        """Get list of active users"""
-        response = self.send_request(MessageType.GET_ACTIVE_USERS, {})
+    def get_active_users(self, username=None, ip=None, port=None):
+        """Get active sessions, optionally only for a user, IP and/or port"""
+        params = {k: v for k, v in (('username', username), ('ip', ip), ('port', port)) if v is not None}
+        response = self.send_request(MessageType.GET_ACTIVE_USERS, params, use_control_channel=False)
         if response and response.get('status') == 'success':
             return response.get('data', [])
-        return []
\ No newline at end of file
+        return []
+    
+    def get_metrics(self):
+        """Get server metrics (per-command histograms, counters, gauges)"""
+        response = self.send_request(MessageType.GET_METRICS, {})
+        if response and response.get('status') == 'success':
+            return response.get('data', {})
+        return {}
+    
+    def start_profiling(self, mode='sample', seconds=10, target=None):
+        """Start server-side profiling; returns the output file name or None"""
+        params = {'mode': mode, 'seconds': seconds}
+        if target is not None:
+            params['target'] = target
+        
+        response = self.send_request(MessageType.START_PROFILING, params)
+        if response and response.get('status') == 'success':
+            return response.get('file')
+        return None
+    
+    def get_stats(self):
+        """Get aggregated server statistics (empty dict if unavailable)"""
+        response = self.send_request(MessageType.GET_STATS, {})
+        if response and response.get('status') == 'success':
+            return response.get('data', {})
+        return {}
\ No newline at end of file
@@ -0,0 +1,260 @@
+# ===============================
+# 🧩 HoneyTrap Worker Cluster
+# ===============================
+# Multi-process mode (server.py --workers N). One Python process is limited
+# to one core by the GIL, so the supervisor starts N worker processes, each
+# running a complete HoneyTrapServer on the same control and data ports with
+# SO_REUSEPORT; the kernel spreads new connections across them.
+#
+# Shared between the workers:
+#   - the data files, through storage's shared mode (table locks are file
+#     locks and writes reach disk before the lock is released)
+#   - the session table, reloaded by a worker when another one changed it
+#   - failed-login counts, kept in login_attempts.json, so the "2 failed
+#     attempts" rule holds however the attempts are spread over workers
+#   - GET_STATS counters and rates: each worker sends its counter changes to
+#     the supervisor a few times a second, which relays them to the others
+#
+# The supervisor owns port stealth (workers send it port status changes) and
+# restarts workers that die. Per worker: rate limits and connection caps
+# (each gets an equal share, so one IP whose connections all land on one
+# worker gets only that share, never more than the whole limit), the event
+# log file (events-<n>.ndjson) and the Prometheus endpoint (--metrics-port + n).
+
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from multiprocessing.connection import wait
+
+import event_log
+
+# Seconds between a worker's batches of counter changes
+COUNT_INTERVAL = 0.25
+# A worker that dies sooner than this after starting is not restarted
+MIN_UPTIME = 5.0
+READY_TIMEOUT = 60
+
+def _share(cap, workers):
+    """One worker's part of a cap (0 stays "no cap")"""
+    return math.ceil(cap / workers) if cap else cap
+
+# ----------------------
+# 👷 Worker Process
+# ----------------------
+class WorkerLink:
+    """A worker's end of its pipe to the supervisor"""
+    def __init__(self, conn, server):
+        self.conn = conn
+        self.server = server
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def send(self, message):
+        with self.lock:
+            try:
+                self.conn.send(message)
+            except (OSError, ValueError):
+                pass
+
+    def count(self, name, amount):
+        """firewall counter listener: batched until the next send"""
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def port_visibility(self, port, active):
+        """Port stealth runs in the supervisor"""
+        self.send(("port", port, active))
+        return True
+
+    def run(self):
+        """Send batched counts; apply what the supervisor relays; stop when told to (or orphaned)"""
+        import firewall
+        while self.server.running():
+            try:
+                if self.conn.poll(COUNT_INTERVAL):
+                    message = self.conn.recv()
+                    if message[0] == "counts":
+                        firewall.apply_counts(message[1])
+                    elif message[0] == "stop":
+                        break
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                counts, self.counts = self.counts, {}
+            if counts:
+                self.send(("counts", counts))
+        self.server.socket_server.stop()
+
+def run_worker(index, workers, host, control_port, data_port, argv, conn):
+    """Worker process: a HoneyTrapServer sharing its ports and data directory"""
+    # Spawned: modules start from their defaults, so apply the options again
+    import admission
+    import firewall
+    import passwords
+    import rate_limit
+    import storage
+    from server import HoneyTrapServer, parse_args, apply_settings
+
+    args = parse_args(argv)
+    apply_settings(args)
+    storage.configure(shared=True)
+    admission.configure(max_connections=_share(admission.MAX_CONNECTIONS, workers),
+                        max_per_ip=_share(admission.MAX_CONNECTIONS_PER_IP, workers))
+    rate_limit.configure(share=workers)
+    if "HONEYTRAP_HASH_WORKERS" not in os.environ:
+        passwords.configure(workers=max(1, (os.cpu_count() or 2) // workers))
+    if event_log.EVENTS.path:
+        base, ext = os.path.splitext(event_log.EVENTS.path)
+        event_log.configure(path=f"{base}-{index}{ext}")
+
+    firewall.refresh_stats()
+    server = HoneyTrapServer(host=host, control_port=control_port, data_port=data_port,
+                             rate_limiting=not args.no_rate_limit, reuse_port=True)
+    # The supervisor stops workers; Ctrl+C in a terminal reaches them too
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    link = WorkerLink(conn, server)
+    server.port_visibility = link.port_visibility
+    firewall.COUNT_LISTENERS.append(link.count)
+
+    if not server.start():
+        return
+    if args.metrics_port:
+        from metrics import start_prometheus_endpoint
+        start_prometheus_endpoint(server.socket_server.metrics, args.metrics_port + index)
+    link.send(("ready", index))
+    try:
+        link.run()
+    finally:
+        server.stop()
+
+# ----------------------
+# 🧑‍✈️ Supervisor
+# ----------------------
+class Supervisor:
+    """Starts the worker processes, relays their changes and restarts them if they die"""
+    def __init__(self, workers, host='0.0.0.0', control_port=5000, data_port=5001, argv=()):
+        self.workers = workers
+        self.host = host
+        self.control_port = control_port
+        self.data_port = data_port
+        self.argv = list(argv)
+        self.context = multiprocessing.get_context("spawn")
+        # index -> (process, connection, started)
+        self.processes = {}
+        self.ready = set()
+        self.ready_event = threading.Event()
+        self.active = False
+        self.thread = None
+
+    def running(self):
+        return self.active
+
+    def spawn(self, index):
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=run_worker, name=f"honeytrap-worker-{index}",
+            args=(index, self.workers, self.host, self.control_port, self.data_port, self.argv, child_conn)
+        )  # not a daemon: workers start their own password hashing processes
+        process.start()
+        child_conn.close()
+        self.processes[index] = (process, conn, time.monotonic())
+
+    def start(self):
+        """Start every worker; True once all of them are listening"""
+        import session_tokens
+        import storage
+        # Create the token key now, or each worker would make its own
+        session_tokens.load_secret()
+        storage.flush()
+        self.active = True
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, lambda sig, frame: self.stop_soon())
+        for index in range(self.workers):
+            self.spawn(index)
+        self.thread = threading.Thread(target=self.relay, name="cluster-relay", daemon=True)
+        self.thread.start()
+        self.ready_event.wait(READY_TIMEOUT)
+        if len(self.ready) < self.workers:
+            self.stop()
+            return False
+        return True
+
+    def stop_soon(self):
+        self.active = False
+
+    def relay(self):
+        """Pass messages between workers and handle the ones meant for the supervisor"""
+        while self.active:
+            connections = {conn: index for index, (_, conn, _) in self.processes.items()}
+            for conn in wait(list(connections), timeout=1.0):
+                index = connections[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    self.worker_exited(index)
+                    continue
+                self.handle(index, message)
+
+    def handle(self, index, message):
+        kind = message[0]
+        if kind == "counts":
+            for other, (_, conn, _) in list(self.processes.items()):
+                if other != index:
+                    try:
+                        conn.send(message)
+                    except (OSError, ValueError):
+                        pass
+        elif kind == "port":
+            import port_stealth
+            _, port, active = message
+            try:
+                port_stealth.update_port_visibility(port, active)
+            except Exception as e:
+                event_log.emit("ops", "port_visibility_error", f"[-] Error updating port visibility: {e}",
+                               level="error", port=port, error=str(e))
+        elif kind == "ready":
+            self.ready.add(index)
+            if len(self.ready) == self.workers:
+                self.ready_event.set()
+
+    def worker_exited(self, index):
+        process, conn, started = self.processes.pop(index)
+        conn.close()
+        process.join(1)
+        if not self.active:
+            return
+        uptime = time.monotonic() - started
+        event_log.emit("ops", "worker_exited", f"[-] Worker {index} exited (code {process.exitcode})",
+                       level="error", worker=index, exitcode=process.exitcode)
+        if uptime >= MIN_UPTIME:
+            self.spawn(index)
+        elif index not in self.ready:
+            # Failed on startup (ports taken, bad options): restarting would fail too
+            self.ready_event.set()
+
+    def stop(self):
+        """Ask every worker to stop, then wait for them"""
+        self.active = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(2)
+        processes = list(self.processes.values())
+        self.processes = {}
+        for _, conn, _ in processes:
+            try:
+                conn.send(("stop",))
+            except (OSError, ValueError):
+                pass
+        for process, conn, _ in processes:
+            process.join(10)
+            if process.is_alive():
+                process.terminate()
+                process.join(1)
+            conn.close()
+        # Startup may have hashed migrated passwords here
+        import passwords
+        import storage
+        passwords.shutdown_pool()
+        storage.flush()
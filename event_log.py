@@ -0,0 +1,225 @@
+# ===============================
+# 📜 HoneyTrap Event Log
+# ===============================
+# Structured, non-blocking event logging. Request threads only put an event
+# on a bounded queue; a background writer appends newline-delimited JSON to
+# a size-rotated file, echoes operator messages to the console and feeds
+# subscribers. When the queue is full, events are dropped and counted rather
+# than stalling the caller.
+#
+# Categories:
+#   ops      - operational telemetry (connections, admin actions, errors)
+#   attacker - detection decisions (honeypot logins, flagged attackers)
+
+import json
+import os
+import queue
+import threading
+import time
+
+DEFAULT_PATH = os.environ.get("HONEYTRAP_EVENT_LOG", "events.ndjson")
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 5
+QUEUE_SIZE = 10000
+BATCH_SIZE = 256
+
+_STOP = object()
+
+class EventLog:
+    """Bounded queue plus background writer for one NDJSON event file"""
+    def __init__(self, path=DEFAULT_PATH, max_bytes=MAX_BYTES, backups=BACKUPS,
+                 queue_size=QUEUE_SIZE, echo=True):
+        # An empty path keeps events in memory only (console and subscribers)
+        self.path = os.path.abspath(path) if path else None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.echo = echo
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.file = None
+        self.subscribers = []
+        self.written = 0
+        self.dropped = 0
+        self.dropped_by_category = {}
+        self.write_errors = 0
+        self.reopen = False
+
+    # ----------------------
+    # ✏️ Producers
+    # ----------------------
+    def emit(self, category, event, message=None, level="info", **fields):
+        """Queue an event without blocking; returns False if it was dropped"""
+        if self.thread is None:
+            self.start()
+        record = {"ts": time.time(), "category": category, "event": event, "level": level}
+        if message is not None:
+            record["message"] = message
+        record.update(fields)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+                self.dropped_by_category[category] = self.dropped_by_category.get(category, 0) + 1
+            return False
+        return True
+
+    def configure(self, path=None, echo=None):
+        """Point the log at another file (None: memory only); takes effect on the next write"""
+        with self.lock:
+            self.path = os.path.abspath(path) if path else None
+            if echo is not None:
+                self.echo = echo
+            # The writer reopens the file lazily
+            self.reopen = True
+
+    def subscribe(self, callback, category=None):
+        """Call callback(record) from the writer thread for every event (or one category)"""
+        with self.lock:
+            self.subscribers.append((category, callback))
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.subscribers = [(c, cb) for c, cb in self.subscribers if cb is not callback]
+
+    def stats(self):
+        """Queue depth and counters, for metrics gauges"""
+        with self.lock:
+            return {
+                "queued": self.queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "dropped_by_category": dict(self.dropped_by_category),
+                "write_errors": self.write_errors
+            }
+
+    # ----------------------
+    # 🧵 Writer
+    # ----------------------
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+            self.thread.start()
+
+    def close(self, timeout=5.0):
+        """Flush queued events and stop the writer"""
+        thread = self.thread
+        if thread is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        with self.lock:
+            self.thread = None
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = False
+            records = []
+            for record in batch:
+                if record is _STOP:
+                    stopping = True
+                else:
+                    records.append(record)
+
+            if records:
+                self._write(records)
+                self._notify(records)
+
+            if stopping:
+                self._close_file()
+                return
+
+    def _write(self, records):
+        if self.echo:
+            for record in records:
+                if "message" in record:
+                    print(record["message"])
+
+        if not self.path:
+            self._close_file()
+            with self.lock:
+                self.written += len(records)
+            return
+
+        try:
+            if self.reopen:
+                self.reopen = False
+                self._close_file()
+            if self.file is None:
+                self.file = open(self.path, "a")
+            lines = []
+            for record in records:
+                record["time"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record["ts"]))
+                lines.append(json.dumps(record, default=str))
+            self.file.write("\n".join(lines) + "\n")
+            self.file.flush()
+            with self.lock:
+                self.written += len(records)
+            if self.file.tell() >= self.max_bytes:
+                self._rotate()
+        except OSError:
+            with self.lock:
+                self.write_errors += len(records)
+            self._close_file()
+
+    def _rotate(self):
+        """Shift events.ndjson -> .1 -> .2 ... keeping `backups` old files"""
+        self._close_file()
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _close_file(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = None
+
+    def _notify(self, records):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for category, callback in subscribers:
+            for record in records:
+                if category is None or record["category"] == category:
+                    try:
+                        callback(record)
+                    except Exception:
+                        pass
+
+# ----------------------
+# 🌍 Process-wide Log
+# ----------------------
+EVENTS = EventLog()
+
+def emit(category, event, message=None, level="info", **fields):
+    """Queue an event on the process-wide log"""
+    return EVENTS.emit(category, event, message, level, **fields)
+
+def configure(path=None, echo=None):
+    EVENTS.configure(path, echo)
+
+def subscribe(callback, category=None):
+    EVENTS.subscribe(callback, category)
+
+def unsubscribe(callback):
+    EVENTS.unsubscribe(callback)
@@ -2,75 +2,350 @@
 # 🔥 HoneyTrap Firewall - Core Rules Engine
 # ===========================================
 import json
+import os
+import threading
 import time
 
-# ----------------------
-# 📁 JSON Utility Functions
-# ----------------------
-def load_json(file):
-    try:
-        with open(file, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {} if "users" in file or "sessions" in file else []
-
-def save_json(file, data):
-    with open(file, "w") as f:
-        json.dump(data, f, indent=4)
+import attacker_store
+import event_log
+import passwords
+# JSON tables: atomic write-rename with group commit; see storage.py for durability levels
+import storage
+from storage import load_json, save_json
+from session_table import SessionTable
+from protocol import ADMIN_USERNAME
 
 # ----------------------
 # 🔧 Constants
 # ----------------------
 USER_DB = "users.json"
-ATTACKER_LOG = "attackers.json"
+ATTACKER_LOG = "attackers.json"  # legacy list, migrated into attacker_store
 POTENTIAL_ATTACKERS = "potential_attackers.json"
 SESSIONS_DB = "sessions.json"
 PORTS_DB = "ports.json"
 BANNED_IPS = "banned_ips.json"
+LOGIN_ATTEMPTS_DB = "login_attempts.json"  # shared storage only
 
-ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "admin123"
 INACTIVITY_LIMIT = 300  # 5 minutes for inactivity timeout
 
-# Track login attempts
+# Track login attempts (in this process; in LOGIN_ATTEMPTS_DB with shared storage)
 LOGIN_ATTEMPTS = {}
+# Keys kept in LOGIN_ATTEMPTS_DB, which is rewritten on every failed login;
+# the least recently failed are dropped first
+MAX_SHARED_ATTEMPTS = 2000
+
+# ----------------------
+# 🔒 Table Locks
+# ----------------------
+# Every read-modify-write of a JSON table holds that table's lock, and reads
+# take it too so they never see a half-written file. Functions that need
+# several tables acquire them through _locked(), which always takes them in
+# LOCK_ORDER, so two writers can never deadlock on each other. With shared
+# storage (multi-process servers) the same locks also exclude other processes.
+LOCK_ORDER = [USER_DB, BANNED_IPS, POTENTIAL_ATTACKERS, SESSIONS_DB, PORTS_DB, LOGIN_ATTEMPTS_DB]
+TABLE_LOCKS = {table: storage.TableLock(table) for table in LOCK_ORDER}
+
+# LOGIN_ATTEMPTS is striped by key so unrelated logins don't contend. With
+# shared storage every worker must see the same counts, or the failed-login
+# rule would need up to 2 attempts per worker: they live in LOGIN_ATTEMPTS_DB
+# under its table lock instead.
+ATTEMPT_STRIPES = 64
+ATTEMPT_LOCKS = [threading.Lock() for _ in range(ATTEMPT_STRIPES)]
+
+class _locked:
+    """Hold the locks of several tables, acquired in LOCK_ORDER"""
+    def __init__(self, *tables):
+        self.locks = [TABLE_LOCKS[t] for t in sorted(set(tables), key=LOCK_ORDER.index)]
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+
+    def __exit__(self, *exc):
+        for lock in reversed(self.locks):
+            lock.release()
+
+def _read(table):
+    """Load a table under its lock"""
+    with TABLE_LOCKS[table]:
+        return load_json(table)
+
+def _attempt_lock(key):
+    return ATTEMPT_LOCKS[hash(key) % ATTEMPT_STRIPES]
+
+def _add_login_attempt(key):
+    """Increment and return the failed attempt count for username:ip"""
+    if storage.SHARED:
+        with _locked(LOGIN_ATTEMPTS_DB):
+            counts = load_json(LOGIN_ATTEMPTS_DB)
+            # Re-inserted last, so the oldest failures are dropped first
+            attempts = counts.pop(key, 0) + 1
+            counts[key] = attempts
+            for stale in list(counts)[:max(0, len(counts) - MAX_SHARED_ATTEMPTS)]:
+                del counts[stale]
+            save_json(LOGIN_ATTEMPTS_DB, counts)
+        return attempts
+    with _attempt_lock(key):
+        attempts = LOGIN_ATTEMPTS[key] = LOGIN_ATTEMPTS.get(key, 0) + 1
+        return attempts
+
+def _reset_login_attempts(key):
+    if storage.SHARED:
+        with _locked(LOGIN_ATTEMPTS_DB):
+            counts = load_json(LOGIN_ATTEMPTS_DB)
+            if counts.pop(key, None) is not None:
+                save_json(LOGIN_ATTEMPTS_DB, counts)
+        return
+    with _attempt_lock(key):
+        LOGIN_ATTEMPTS.pop(key, None)
+
+# ----------------------
+# 👣 Sessions
+# ----------------------
+# The session table lives in memory (see session_table.py); sessions.json is
+# its checkpoint. Logins and logouts save it straight away, under the
+# SESSIONS_DB lock. Keep-alives only touch memory; checkpoint_sessions()
+# writes them in one batch, which the server does every
+# SESSION_CHECKPOINT_INTERVAL seconds and on shutdown.
+#
+# With shared storage, other processes change sessions.json too: before using
+# the table under the lock, _sync_sessions() reloads it if the file is no
+# longer the one this process last read or wrote.
+SESSIONS = SessionTable()
+SESSION_CHECKPOINT_INTERVAL = 10
+_sessions_file_version = None
+
+def _file_version(file):
+    """Changes whenever the file is replaced (every save renames a new file over it)"""
+    try:
+        st = os.stat(file)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _save_sessions():
+    """Write the session table (caller holds the SESSIONS_DB lock)"""
+    global _sessions_file_version
+    save_json(SESSIONS_DB, SESSIONS.to_json())
+    if storage.SHARED:
+        _sessions_file_version = _file_version(SESSIONS_DB)
+
+def _sync_sessions():
+    """Shared storage: pick up sessions.json if another process changed it (caller holds the lock)"""
+    global _sessions_file_version
+    if not storage.SHARED:
+        return
+    version = _file_version(SESSIONS_DB)
+    if version != _sessions_file_version:
+        SESSIONS.merge(load_json(SESSIONS_DB))
+        _sessions_file_version = version
+
+def _refresh_sessions():
+    if storage.SHARED:
+        with _locked(SESSIONS_DB):
+            _sync_sessions()
+
+# ----------------------
+# 📊 Incremental Statistics
+# ----------------------
+class RateCounter:
+    """Counts events over a sliding window of one-second buckets"""
+    def __init__(self, window=60):
+        self.window = window
+        self.counts = [0] * window
+        self.seconds = [0] * window
+        self.lock = threading.Lock()
+
+    def add(self, amount=1):
+        now = int(time.time())
+        slot = now % self.window
+        with self.lock:
+            if self.seconds[slot] != now:
+                self.seconds[slot] = now
+                self.counts[slot] = 0
+            self.counts[slot] += amount
+
+    def total(self):
+        """Events in the last `window` seconds (fixed cost, independent of volume)"""
+        oldest = int(time.time()) - self.window
+        with self.lock:
+            return sum(c for c, sec in zip(self.counts, self.seconds) if sec > oldest)
+
+# Counts maintained on every mutation, so GET_STATS never loads the tables
+STATS = {
+    "users": 0,
+    "sessions": 0,
+    "banned_ips": 0,
+    "potential_attackers": 0,
+    "attackers": 0,
+    "ports_total": 0,
+    "ports_active": 0,
+    "ports_honeypot": 0,
+    "login_attempts": 0,
+    "logins": 0,
+    "failed_logins": 0,
+    "honeypot_triggers": 0
+}
+STATS_LOCK = threading.Lock()
+STATS_STARTED = time.time()
+
+LOGIN_RATE = RateCounter()
+FAILED_LOGIN_RATE = RateCounter()
+HONEYPOT_RATE = RateCounter()
+# Counters whose changes are also rate samples
+RATES = {
+    "logins": LOGIN_RATE,
+    "failed_logins": FAILED_LOGIN_RATE,
+    "honeypot_triggers": HONEYPOT_RATE,
+}
+
+# Called with (name, amount) for every local counter change; multi-process
+# servers pass them on to the other processes, which apply_counts() them
+COUNT_LISTENERS = []
+
+def _count(name, amount=1):
+    """Adjust a statistics counter"""
+    with STATS_LOCK:
+        STATS[name] += amount
+    for listener in COUNT_LISTENERS:
+        listener(name, amount)
+
+def apply_counts(counts):
+    """Add counter changes made by another process"""
+    with STATS_LOCK:
+        for name, amount in counts.items():
+            if name in STATS:
+                STATS[name] += amount
+    # Their logins and honeypot triggers count towards the rates here too
+    for name, rate in RATES.items():
+        if counts.get(name, 0) > 0:
+            rate.add(counts[name])
+
+def _count_port_change(before, after):
+    """Adjust port counters for a port entry changing from before to after"""
+    if before.get("status") != after.get("status"):
+        _count("ports_active", 1 if after.get("status") == "active" else -1)
+    if bool(before.get("honeypot")) != bool(after.get("honeypot")):
+        _count("ports_honeypot", 1 if after.get("honeypot") else -1)
+
+def _enable_port_honeypot(ports, port):
+    """Turn on the honeypot for a port entry, keeping the counters in step"""
+    for p in ports:
+        if str(p["port"]) == str(port):
+            if not p.get("honeypot", False):
+                _count("ports_honeypot")
+            p["honeypot"] = True
+            p["last_triggered"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            break
+
+def _record_fake_login(event, username, ip_address, port, reason, **fields):
+    """A login sent to the fake portal: attacker event plus a stored record"""
+    _count("honeypot_triggers")
+    HONEYPOT_RATE.add()
+    event_log.emit("attacker", event, username=username, ip=ip_address, port=port, reason=reason, **fields)
+    attacker_store.record(event, username, ip_address, port, reason)
+    _count("attackers")
+
+def refresh_stats():
+    """Recompute the table counts from disk (startup, or after external edits)"""
+    ports = load_json(PORTS_DB)
+    global _sessions_file_version
+    with _locked(SESSIONS_DB):
+        # Also (re)loads the in-memory session table, converting old files
+        _sessions_file_version = _file_version(SESSIONS_DB)
+        if SESSIONS.load(load_json(SESSIONS_DB)):
+            _save_sessions()
+    counts = {
+        "users": len(load_json(USER_DB)),
+        "sessions": len(SESSIONS),
+        "banned_ips": len(load_json(BANNED_IPS)),
+        "potential_attackers": len(load_json(POTENTIAL_ATTACKERS)),
+        "attackers": attacker_store.count(),
+        "ports_total": len(ports),
+        "ports_active": len([p for p in ports if p["status"] == "active"]),
+        "ports_honeypot": len([p for p in ports if p.get("honeypot", False)])
+    }
+    with STATS_LOCK:
+        STATS.update(counts)
+
+def get_stats():
+    """Return all counts plus recent rates in O(1)"""
+    with STATS_LOCK:
+        stats = dict(STATS)
+    stats["logins_per_sec"] = round(LOGIN_RATE.total() / LOGIN_RATE.window, 3)
+    stats["failed_logins_per_min"] = FAILED_LOGIN_RATE.total() * 60 / FAILED_LOGIN_RATE.window
+    stats["honeypot_triggers_per_min"] = HONEYPOT_RATE.total() * 60 / HONEYPOT_RATE.window
+    stats["uptime"] = int(time.time() - STATS_STARTED)
+    return stats
 
 # ----------------------
 # 🛡️ Firewall Rules
 # ----------------------
 def create_user(username, password):
     """Create a new user if username doesn't exist"""
-    users = load_json(USER_DB)
-    
-    # Check if username already exists
-    if username in users:
+    if username in _read(USER_DB):
         return False, "Username already exists"
     
-    # Create new user
-    users[username] = password
-    save_json(USER_DB, users)
+    # Hash outside the table lock: it is by far the slowest step
+    hashed = passwords.hash_password(password)
+    with _locked(USER_DB):
+        users = load_json(USER_DB)
+        
+        # Check again: another signup may have taken the name meanwhile
+        if username in users:
+            return False, "Username already exists"
+        
+        # Create new user
+        users[username] = hashed
+        save_json(USER_DB, users)
+    _count("users")
     return True, "User created successfully"
 
+def _rehash_password(username, password, stored):
+    """Upgrade a plaintext or outdated hash after a successful login"""
+    hashed = passwords.hash_password(password)
+    with _locked(USER_DB):
+        users = load_json(USER_DB)
+        # Skip if the password changed while we were hashing
+        if users.get(username) == stored:
+            users[username] = hashed
+            save_json(USER_DB, users)
+
+def migrate_passwords():
+    """Hash plaintext passwords left in users.json by older versions"""
+    with _locked(USER_DB):
+        users = load_json(USER_DB)
+        legacy = [u for u, p in users.items() if passwords.parse(p) is None]
+        if not legacy:
+            return 0
+        users.update(zip(legacy, passwords.hash_many(users[u] for u in legacy)))
+        save_json(USER_DB, users)
+    return len(legacy)
+
 def check_login(username, password, ip_address, port):
     """
     Validates login and applies firewall rules.
-    Returns: 
+    Returns (status, message):
         - "admin" if admin credentials
-        - "valid" if valid user
+        - "valid" if valid user (message is then the new session id)
         - "fake" if user should be directed to fake page
         - "error" if login failed
     """
-    users = load_json(USER_DB)
-    banned_ips = load_json(BANNED_IPS)
-    ports = load_json(PORTS_DB)
-    potential_attackers = load_json(POTENTIAL_ATTACKERS)
+    users = _read(USER_DB)
+    banned_ips = _read(BANNED_IPS)
+    ports = _read(PORTS_DB)
+    _count("login_attempts")
     
     # Admin login check - must be first to bypass all other checks
     if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
+        _count("logins")
+        LOGIN_RATE.add()
         return "admin", None
     
     # Check if IP is banned
     if ip_address in banned_ips:
+        _record_fake_login("banned_ip_login", username, ip_address, port, "Login from banned IP")
         return "fake", "IP address banned"
     
     # Basic validation
@@ -86,95 +361,122 @@ def check_login(username, password, ip_address, port):
     
     # If honeypot is active, always send to fake page
     if port_honeypot_enabled:
+        _record_fake_login("honeypot_login", username, ip_address, port, "Login on honeypot port")
         return "fake", None
     
-    # Regular user login
-    if username in users and users[username] == password:
+    # Regular user login (unknown users cost as much as wrong passwords)
+    stored = users.get(username)
+    if passwords.verify_password(username, password, stored):
+        if passwords.needs_rehash(stored):
+            _rehash_password(username, password, stored)
+        
         # Reset login attempts for this user+IP if successful
-        key = f"{username}:{ip_address}"
-        if key in LOGIN_ATTEMPTS:
-            del LOGIN_ATTEMPTS[key]
-            
-        sessions = load_json(SESSIONS_DB)
-        sessions[username] = {
-            "login_time": time.time(),
-            "last_activity_time": time.time(),
-            "ip": ip_address,
-            "port": port
-        }
-        save_json(SESSIONS_DB, sessions)
-        return "valid", None
+        _reset_login_attempts(f"{username}:{ip_address}")
+        
+        with _locked(SESSIONS_DB):
+            _sync_sessions()
+            # A new login from the same host and port replaces that session;
+            # logins from elsewhere get sessions of their own
+            for old in SESSIONS.for_user(username):
+                if old.ip == ip_address and str(old.port) == str(port):
+                    SESSIONS.remove(old.sid)
+                    _count("sessions", -1)
+            session = SESSIONS.add(username, ip_address, port)
+            _count("sessions")
+            _save_sessions()
+        _count("logins")
+        LOGIN_RATE.add()
+        return "valid", session.sid
 
     # Failed attempt handling
-    key = f"{username}:{ip_address}"
-    LOGIN_ATTEMPTS[key] = LOGIN_ATTEMPTS.get(key, 0) + 1
+    _count("failed_logins")
+    FAILED_LOGIN_RATE.add()
+    attempts = _add_login_attempt(f"{username}:{ip_address}")
     
     # Check number of failed attempts - Allow 2 incorrect attempts
-    if LOGIN_ATTEMPTS[key] >= 2:
+    if attempts >= 2:
         # Two or more failed attempts - flag as a potential attacker
         potential_attacker_entry = {
             "username": username,
             "ip": ip_address,
             "attempted_port": port,
-            "attempts": LOGIN_ATTEMPTS[key],
+            "attempts": attempts,
             "reason": "2 or more failed login attempts",
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        # Check if this IP+username already exists in potential_attackers
-        existing = False
-        for i, entry in enumerate(potential_attackers):
-            if entry["username"] == username and entry["ip"] == ip_address:
-                potential_attackers[i] = potential_attacker_entry
-                existing = True
-                break
-        
-        if not existing:
-            potential_attackers.append(potential_attacker_entry)
-        
-        save_json(POTENTIAL_ATTACKERS, potential_attackers)
-        
-        # Enable honeypot on this port
-        for p in ports:
-            if str(p["port"]) == str(port):
-                p["honeypot"] = True
-                p["last_triggered"] = time.strftime("%Y-%m-%d %H:%M:%S")
-                break
-        save_json(PORTS_DB, ports)
+        # Reload both tables under their locks: the copies read above may be stale
+        with _locked(POTENTIAL_ATTACKERS, PORTS_DB):
+            potential_attackers = load_json(POTENTIAL_ATTACKERS)
+            
+            # Check if this IP+username already exists in potential_attackers
+            existing = False
+            for i, entry in enumerate(potential_attackers):
+                if entry["username"] == username and entry["ip"] == ip_address:
+                    potential_attackers[i] = potential_attacker_entry
+                    existing = True
+                    break
+            
+            if not existing:
+                potential_attackers.append(potential_attacker_entry)
+                _count("potential_attackers")
+            
+            save_json(POTENTIAL_ATTACKERS, potential_attackers)
+            
+            # Enable honeypot on this port
+            ports = load_json(PORTS_DB)
+            _enable_port_honeypot(ports, port)
+            save_json(PORTS_DB, ports)
         
+        _record_fake_login("potential_attacker", username, ip_address, port,
+                           potential_attacker_entry["reason"], attempts=attempts)
         return "fake", None
     
     return "error", "Incorrect username/password"
 
 def logout_user(username):
-    """Remove a user's session when they log out properly"""
-    sessions = load_json(SESSIONS_DB)
-    if username in sessions:
-        # Remove the session entry
-        del sessions[username]
-        save_json(SESSIONS_DB, sessions)
-        return True
-    return False
+    """Remove every session of a user (clients without a session id)"""
+    with _locked(SESSIONS_DB):
+        _sync_sessions()
+        sessions = SESSIONS.for_user(username)
+        for session in sessions:
+            SESSIONS.remove(session.sid)
+        if sessions:
+            _save_sessions()
+            _count("sessions", -len(sessions))
+    return bool(sessions)
+
+def end_session(session_id):
+    """Remove one session when its client logs out properly"""
+    with _locked(SESSIONS_DB):
+        _sync_sessions()
+        if SESSIONS.remove(session_id) is None:
+            return False
+        _save_sessions()
+    _count("sessions", -1)
+    return True
 
 def check_inactivity():
     """Check for inactive users and flag them as potential attackers if inactive beyond limit"""
-    sessions = load_json(SESSIONS_DB)
-    potential_attackers = load_json(POTENTIAL_ATTACKERS)
-    current_time = time.time()
-    
-    for username, session in list(sessions.items()):
-        if username == ADMIN_USERNAME:
-            continue
-
-        port = session.get("port", "unknown")
-        inactive_time = current_time - session["last_activity_time"]
+    with _locked(POTENTIAL_ATTACKERS, SESSIONS_DB, PORTS_DB):
+        _sync_sessions()
+        current_time = time.time()
+        expired = [s for s in SESSIONS.all()
+                   if s.username != ADMIN_USERNAME and current_time - s.last_seen > INACTIVITY_LIMIT]
+        if not expired:
+            return
         
-        # Only mark as potential attackers if they've been inactive beyond limit
-        if inactive_time > INACTIVITY_LIMIT:
+        potential_attackers = load_json(POTENTIAL_ATTACKERS)
+        ports = load_json(PORTS_DB)
+        for session in expired:
+            username = session.username
+            port = session.port
+            inactive_time = current_time - session.last_seen
+            
             # Add to potential attackers
             potential_attacker_entry = {
                 "username": username,
-                "ip": session["ip"],
+                "ip": session.ip,
                 "attempted_port": port,
                 "reason": "Inactive for 5+ minutes",
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
@@ -183,42 +485,59 @@ def check_inactivity():
             # Check if already in potential attackers
             existing = False
             for i, entry in enumerate(potential_attackers):
-                if entry["username"] == username and entry["ip"] == session["ip"]:
+                if entry["username"] == username and entry["ip"] == session.ip:
                     potential_attackers[i] = potential_attacker_entry
                     existing = True
                     break
             
             if not existing:
                 potential_attackers.append(potential_attacker_entry)
+                _count("potential_attackers")
             
-            save_json(POTENTIAL_ATTACKERS, potential_attackers)
+            event_log.emit("attacker", "potential_attacker", username=username, ip=session.ip, port=port,
+                           reason=potential_attacker_entry["reason"], inactive_seconds=int(inactive_time))
             
             # Enable honeypot for this session's port
-            ports = load_json(PORTS_DB)
-            for p in ports:
-                if str(p["port"]) == str(port):
-                    p["honeypot"] = True
-                    p["last_triggered"] = time.strftime("%Y-%m-%d %H:%M:%S")
-                    break
-            save_json(PORTS_DB, ports)
+            _enable_port_honeypot(ports, port)
             
             # Remove the session
-            del sessions[username]
-            save_json(SESSIONS_DB, sessions)
-
-    save_json(SESSIONS_DB, sessions)
+            SESSIONS.remove(session.sid)
+            _count("sessions", -1)
+        
+        save_json(POTENTIAL_ATTACKERS, potential_attackers)
+        save_json(PORTS_DB, ports)
+        _save_sessions()
 
 def update_activity(username):
-    """Update user activity timestamp"""
-    sessions = load_json(SESSIONS_DB)
-    if username in sessions:
-        sessions[username]["last_activity_time"] = time.time()
-        save_json(SESSIONS_DB, sessions)
+    """Keep-alive for every session of a user (clients without a session id)"""
+    _refresh_sessions()
+    sessions = SESSIONS.for_user(username)
+    for session in sessions:
+        SESSIONS.touch(session.sid)
+    return bool(sessions)
+
+def touch_session(session_id):
+    """Keep-alive for one session: memory only, O(1)"""
+    if SESSIONS.touch(session_id):
+        return True
+    if storage.SHARED:
+        # The session may have been opened by another process since our last sync
+        _refresh_sessions()
+        return SESSIONS.touch(session_id)
+    return False
+
+def checkpoint_sessions():
+    """Write keep-alive times to sessions.json in one batch; True if anything was written"""
+    if not SESSIONS.activity_dirty:
+        return False
+    with _locked(SESSIONS_DB):
+        _sync_sessions()
+        _save_sessions()
     return True
 
 def get_port_status(port):
     """Check if port is active and if honeypot is enabled"""
-    ports = load_json(PORTS_DB)
+    ports = _read(PORTS_DB)
     for p in ports:
         if str(p["port"]) == str(port):
             return {
@@ -229,111 +548,168 @@ def get_port_status(port):
 
 def toggle_port_status(port, status=None, honeypot=None):
     """Update port status or honeypot setting"""
-    ports = load_json(PORTS_DB)
-    for p in ports:
-        if str(p["port"]) == str(port):
-            if status is not None:
-                p["status"] = status
-            if honeypot is not None:
-                p["honeypot"] = honeypot
-            save_json(PORTS_DB, ports)
-            return True
+    with _locked(PORTS_DB):
+        ports = load_json(PORTS_DB)
+        for p in ports:
+            if str(p["port"]) == str(port):
+                before = dict(p)
+                if status is not None:
+                    p["status"] = status
+                if honeypot is not None:
+                    p["honeypot"] = honeypot
+                save_json(PORTS_DB, ports)
+                _count_port_change(before, p)
+                return True
     return False
 
-def get_attackers():
-    """Return the list of attackers"""
-    return load_json(ATTACKER_LOG)
+def get_attackers(since=None, until=None, limit=attacker_store.DEFAULT_LIMIT):
+    """Return recorded honeypot interactions in a time range, newest first"""
+    return attacker_store.query(since, until, limit)
+
+def iter_attackers(since=None, until=None, limit=attacker_store.DEFAULT_LIMIT):
+    """get_attackers() one event at a time, for streamed responses"""
+    return attacker_store.iterate(since, until, limit)
+
+def record_honeypot_report(ip_address, port, details):
+    """Store information reported by a fake portal session"""
+    entry = attacker_store.record("fake_portal_report", "attacker", ip_address, port,
+                                  "Fake portal session", details)
+    _count("attackers")
+    event_log.emit("attacker", "fake_portal_report", ip=ip_address, port=port, id=entry["id"])
+    return entry
 
 def get_ports():
     """Return the list of ports"""
-    return load_json(PORTS_DB)
+    return _read(PORTS_DB)
 
 def get_potential_attackers():
     """Return the list of potential attackers"""
-    return load_json(POTENTIAL_ATTACKERS)
+    return _read(POTENTIAL_ATTACKERS)
+
+def iter_potential_attackers():
+    """Potential attackers one at a time, for streamed responses"""
+    with TABLE_LOCKS[POTENTIAL_ATTACKERS]:
+        return storage.iter_json(POTENTIAL_ATTACKERS)
 
 def ban_ip(ip_address):
     """Add an IP to the banned list"""
-    banned_ips = load_json(BANNED_IPS)
-    if ip_address not in banned_ips:
-        banned_ips.append(ip_address)
-        save_json(BANNED_IPS, banned_ips)
+    with _locked(BANNED_IPS):
+        banned_ips = load_json(BANNED_IPS)
+        if ip_address not in banned_ips:
+            banned_ips.append(ip_address)
+            save_json(BANNED_IPS, banned_ips)
+            _count("banned_ips")
     return True
 
+def ban_ips(ip_addresses):
+    """Add many IPs to the banned list in one write; returns how many were new"""
+    with _locked(BANNED_IPS):
+        banned_ips = load_json(BANNED_IPS)
+        known = set(banned_ips)
+        added = [ip for ip in dict.fromkeys(ip_addresses) if ip not in known]
+        if added:
+            banned_ips.extend(added)
+            save_json(BANNED_IPS, banned_ips)
+            _count("banned_ips", len(added))
+    return len(added)
+
 def unban_ip(ip_address):
     """Remove an IP from the banned list"""
-    banned_ips = load_json(BANNED_IPS)
-    if ip_address in banned_ips:
-        banned_ips.remove(ip_address)
-        save_json(BANNED_IPS, banned_ips)
+    with _locked(BANNED_IPS):
+        banned_ips = load_json(BANNED_IPS)
+        if ip_address in banned_ips:
+            banned_ips.remove(ip_address)
+            save_json(BANNED_IPS, banned_ips)
+            _count("banned_ips", -1)
     return True
 
 def get_banned_ips():
     """Get the list of banned IPs"""
-    return load_json(BANNED_IPS)
+    return _read(BANNED_IPS)
 
-def get_active_users():
-    """Get the list of currently active users with their session details"""
-    sessions = load_json(SESSIONS_DB)
-    active_users = []
+def iter_banned_ips():
+    """Banned IPs one at a time, for streamed responses"""
+    with TABLE_LOCKS[BANNED_IPS]:
+        return storage.iter_json(BANNED_IPS)
+
+def get_active_users(username=None, ip=None, port=None):
+    """Active sessions with their details, optionally only for a user, IP and/or port"""
+    _refresh_sessions()
+    # Start from the narrowest index given; cost is O(result), never a full scan
+    if username is not None:
+        sessions = SESSIONS.for_user(username)
+    elif ip is not None:
+        sessions = SESSIONS.for_ip(ip)
+    elif port is not None:
+        sessions = SESSIONS.for_port(port)
+    else:
+        sessions = SESSIONS.all()
     
+    active_users = []
     current_time = time.time()
-    for username, session in sessions.items():
+    for session in sessions:
+        if (ip is not None and session.ip != ip) or (port is not None and str(session.port) != str(port)):
+            continue
+        
         # Calculate how long they've been active and inactive
-        session_length = current_time - session["login_time"]
-        last_activity = current_time - session["last_activity_time"]
+        session_length = current_time - session.login_time
+        last_activity = current_time - session.last_seen
         
         # Add formatted details
         active_users.append({
-            "username": username,
-            "ip": session["ip"],
-            "port": session.get("port", "unknown"),
-            "login_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session["login_time"])),
-            "last_activity": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session["last_activity_time"])),
+            "session_id": session.sid,
+            "username": session.username,
+            "ip": session.ip,
+            "port": session.port,
+            "login_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session.login_time)),
+            "last_activity": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session.last_seen)),
             "session_length": f"{int(session_length / 60)} mins",
             "inactive_for": f"{int(last_activity / 60)} mins"
         })
     
     return active_users
 
-# Initialize JSON files on import
+# ----------------------
+# 🚀 Initialization
+# ----------------------
+def _ensure_file(file, default):
+    """Write default content only if the file is missing, unreadable or empty"""
+    if os.path.exists(file):
+        try:
+            with open(file, "r") as f:
+                if json.load(f) or not default:
+                    return False
+        except (OSError, json.JSONDecodeError):
+            pass
+    save_json(file, default)
+    return True
+
 def initialize_files():
-    """Initialize necessary JSON files with default values if they don't exist"""
+    """
+    Create the JSON data files with default values if they don't exist.
+    Called explicitly by the server at startup; importing this module has
+    no side effects. Existing files are left untouched.
+    """
     try:
-        # Initialize ports
-        ports = load_json(PORTS_DB)
-        if not ports:
-            # Create default ports
-            default_ports = [
-                {"port": 8001, "status": "active", "honeypot": False, "last_triggered": "Never"},
-                {"port": 8002, "status": "active", "honeypot": False, "last_triggered": "Never"},
-                {"port": 8003, "status": "active", "honeypot": False, "last_triggered": "Never"},
-                {"port": 8004, "status": "inactive", "honeypot": False, "last_triggered": "Never"},
-                {"port": 8005, "status": "inactive", "honeypot": False, "last_triggered": "Never"}
-            ]
-            save_json(PORTS_DB, default_ports)
-        
-        # Initialize other JSON files if they don't exist
-        potential_attackers = load_json(POTENTIAL_ATTACKERS)
-        save_json(POTENTIAL_ATTACKERS, potential_attackers)
-        
-        banned_ips = load_json(BANNED_IPS)
-        save_json(BANNED_IPS, banned_ips)
-        
-        sessions = load_json(SESSIONS_DB)
-        save_json(SESSIONS_DB, sessions)
-        
-        attackers = load_json(ATTACKER_LOG)
-        save_json(ATTACKER_LOG, attackers)
-        
-        users = load_json(USER_DB)
-        if not users:
-            # Create a default test user if none exist
-            users = {"user": "password"}
-            save_json(USER_DB, users)
-            
+        # Check what is on disk, including writes still queued for commit
+        storage.flush()
+        _ensure_file(PORTS_DB, [
+            {"port": 8001, "status": "active", "honeypot": False, "last_triggered": "Never"},
+            {"port": 8002, "status": "active", "honeypot": False, "last_triggered": "Never"},
+            {"port": 8003, "status": "active", "honeypot": False, "last_triggered": "Never"},
+            {"port": 8004, "status": "inactive", "honeypot": False, "last_triggered": "Never"},
+            {"port": 8005, "status": "inactive", "honeypot": False, "last_triggered": "Never"}
+        ])
+        _ensure_file(POTENTIAL_ATTACKERS, [])
+        _ensure_file(BANNED_IPS, [])
+        _ensure_file(SESSIONS_DB, {})
+        attacker_store.migrate_legacy(ATTACKER_LOG)
+        # Create a default test user if none exist
+        _ensure_file(USER_DB, {"user": "password"})
+        migrated = migrate_passwords()
+        if migrated:
+            event_log.emit("ops", "passwords_migrated", f"[+] Hashed {migrated} plaintext password(s) in {USER_DB}",
+                           count=migrated, file=USER_DB)
+        refresh_stats()
     except Exception as e:
         print(f"Error initializing files: {e}")
-
-# Initialize on import
-initialize_files()
\ No newline at end of file
@@ -0,0 +1,471 @@
+# ===============================
+# ⏱️ Firewall Rule Microbenchmarks
+# ===============================
+# Times the firewall rule functions against synthetic datasets of increasing
+# size, each in its own temporary data directory. Results are saved as JSON
+# so runs from different versions can be compared.
+#
+#   python firewall_benchmark.py --sizes 10,1000,100000 --output new.json
+#   python firewall_benchmark.py --sizes 10,1000,100000 --compare old.json
+#   python firewall_benchmark.py --contention --threads 1,2,4,8
+#   python firewall_benchmark.py --hash-costs scrypt:4096,scrypt:16384,pbkdf2:200000
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import event_log
+import firewall
+import passwords
+import storage
+
+DEFAULT_SIZES = "10,1000,10000,100000"
+DEFAULT_THREADS = "1,2,4,8"
+CONTENTION_OPS = ["login", "failed", "activity", "ban", "signup"]
+# Not in the ports table, so flagged logins never switch the workload to the honeypot path
+CONTENTION_PORT = 9999
+BENCH_PASSWORD = "benchpass"
+# Rule timings hash with this (on the calling thread), so check_login measures the
+# rules rather than scrypt or the verification cache; --hash-costs times hashing
+RULE_HASH = ("pbkdf2", 1)
+FUNCTIONS = ["check_login", "check_inactivity", "ban_ip", "get_active_users", "update_activity",
+             "touch_session", "sessions_for_ip"]
+
+# ----------------------
+# 🧪 Synthetic Datasets
+# ----------------------
+def synthetic_ip(i):
+    return f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+
+def build_dataset(data_dir, size, seed):
+    """Write users, sessions, banned IPs and potential attackers of the given size"""
+    rng = random.Random(seed)
+    now = time.time()
+    ports = [8001, 8002, 8003, 8004, 8005]
+
+    # One hash shared by every user: hashing 100000 passwords would take minutes
+    hashed = passwords.hash_password(BENCH_PASSWORD)
+    users = {f"user{i}": hashed for i in range(size)}
+    sessions = {
+        f"sid{i}": {
+            "username": f"user{i}",
+            "login_time": now - rng.randint(0, 3600),
+            # Recent activity, so check_inactivity scans without expiring anyone
+            "last_activity_time": now - rng.randint(0, 60),
+            "ip": synthetic_ip(i),
+            "port": rng.choice(ports)
+        }
+        for i in range(size)
+    }
+    banned_ips = [synthetic_ip(size + i) for i in range(size)]
+    potential_attackers = [
+        {
+            "username": f"intruder{i}",
+            "ip": synthetic_ip(2 * size + i),
+            "attempted_port": rng.choice(ports),
+            "attempts": 2,
+            "reason": "2 or more failed login attempts",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        for i in range(size)
+    ]
+
+    cwd = os.getcwd()
+    os.chdir(data_dir)
+    try:
+        firewall.save_json(firewall.USER_DB, users)
+        firewall.save_json(firewall.SESSIONS_DB, sessions)
+        firewall.save_json(firewall.BANNED_IPS, banned_ips)
+        firewall.save_json(firewall.POTENTIAL_ATTACKERS, potential_attackers)
+        firewall.save_json(firewall.ATTACKER_LOG, [])
+        firewall.save_json(firewall.PORTS_DB, [
+            {"port": p, "status": "active", "honeypot": False, "last_triggered": "Never"} for p in ports
+        ])
+        firewall.refresh_stats()
+    finally:
+        os.chdir(cwd)
+
+# ----------------------
+# 🏃 Benchmark Cases
+# ----------------------
+def make_case(name, size, rng):
+    """Return a zero-argument callable exercising one function"""
+    counter = [0]
+
+    def pick_user():
+        return rng.randrange(size)
+
+    if name == "check_login":
+        def case():
+            i = pick_user()
+            firewall.check_login(f"user{i}", BENCH_PASSWORD, synthetic_ip(i), 8001)
+    elif name == "check_inactivity":
+        def case():
+            firewall.check_inactivity()
+    elif name == "ban_ip":
+        def case():
+            counter[0] += 1
+            firewall.ban_ip(f"172.16.{counter[0] >> 8 & 255}.{counter[0] & 255}")
+    elif name == "get_active_users":
+        def case():
+            firewall.get_active_users()
+    elif name == "update_activity":
+        def case():
+            firewall.update_activity(f"user{pick_user()}")
+    elif name == "touch_session":
+        def case():
+            firewall.touch_session(f"sid{pick_user()}")
+    elif name == "sessions_for_ip":
+        def case():
+            firewall.get_active_users(ip=synthetic_ip(pick_user()))
+    else:
+        raise ValueError(f"Unknown benchmark function: {name}")
+    return case
+
+def time_case(case, min_time, min_repeats, max_repeats):
+    """Run a case until min_time has passed (within the repeat bounds)"""
+    case()  # warm-up
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_repeats and (len(samples) < min_repeats or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        case()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "repeats": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 4),
+        "median_ms": round(samples[len(samples) // 2] * 1000, 4),
+        "min_ms": round(samples[0] * 1000, 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 4),
+        "ops_per_sec": round(len(samples) / sum(samples), 1)
+    }
+
+def run_suite(sizes, functions, args):
+    results = []
+    for size in sizes:
+        for name in functions:
+            # Fresh data directory per case so mutations don't leak between cases
+            data_dir = tempfile.mkdtemp(prefix=f"honeytrap-fw-{size}-")
+            cwd = os.getcwd()
+            try:
+                build_dataset(data_dir, size, args.seed)
+                os.chdir(data_dir)
+                firewall.LOGIN_ATTEMPTS.clear()
+                passwords.clear_cache()
+                case = make_case(name, size, random.Random(args.seed))
+                stats = time_case(case, args.min_time, args.min_repeats, args.max_repeats)
+            finally:
+                os.chdir(cwd)
+                storage.flush()
+                shutil.rmtree(data_dir, ignore_errors=True)
+            row = {"function": name, "size": size, **stats}
+            results.append(row)
+            print(f"{name:<18}{size:>10}{row['repeats']:>8}{row['median_ms']:>12.3f}{row['p95_ms']:>12.3f}{row['ops_per_sec']:>12.1f}")
+    return results
+
+# ----------------------
+# 🧵 Contention
+# ----------------------
+class ContentionWorker(threading.Thread):
+    """Mixed firewall calls from one thread, remembering what it wrote"""
+    def __init__(self, index, size, seed, stop):
+        super().__init__(daemon=True)
+        self.index = index
+        self.size = size
+        self.rng = random.Random(seed + index)
+        self.stop = stop
+        self.ops = 0
+        self.fail_key = f"ctn{index}:{synthetic_ip(3 * size + index)}"
+        self.failed = 0
+        self.banned = []
+        self.created = []
+        self.error = None
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                op = self.rng.choice(CONTENTION_OPS)
+                if op == "login":
+                    i = self.rng.randrange(self.size)
+                    firewall.check_login(f"user{i}", BENCH_PASSWORD, synthetic_ip(i), CONTENTION_PORT)
+                elif op == "failed":
+                    username, ip = self.fail_key.split(":")
+                    firewall.check_login(username, "wrong-password", ip, CONTENTION_PORT)
+                    self.failed += 1
+                elif op == "activity":
+                    firewall.update_activity(f"user{self.rng.randrange(self.size)}")
+                elif op == "ban":
+                    n = len(self.banned)
+                    ip = f"172.{16 + self.index % 16}.{n >> 8 & 255}.{n & 255}"
+                    firewall.ban_ip(ip)
+                    self.banned.append(ip)
+                else:
+                    username = f"t{self.index}u{len(self.created)}"
+                    firewall.create_user(username, "password")
+                    self.created.append(username)
+                self.ops += 1
+        except Exception as e:
+            self.error = repr(e)
+
+def lost_updates(workers):
+    """Writes acknowledged by a worker that are missing from the final state"""
+    banned = set(firewall.load_json(firewall.BANNED_IPS))
+    users = firewall.load_json(firewall.USER_DB)
+    lost = 0
+    for w in workers:
+        lost += abs(firewall.LOGIN_ATTEMPTS.get(w.fail_key, 0) - w.failed)
+        lost += sum(1 for ip in w.banned if ip not in banned)
+        lost += sum(1 for username in w.created if username not in users)
+    return lost
+
+def run_contention(thread_counts, args):
+    """Run the same mixed workload with increasing thread counts"""
+    results = []
+    baseline = None
+    for threads in thread_counts:
+        data_dir = tempfile.mkdtemp(prefix=f"honeytrap-ctn-{threads}-")
+        cwd = os.getcwd()
+        try:
+            build_dataset(data_dir, args.contention_size, args.seed)
+            os.chdir(data_dir)
+            firewall.LOGIN_ATTEMPTS.clear()
+            stop = threading.Event()
+            workers = [ContentionWorker(i, args.contention_size, args.seed, stop) for i in range(threads)]
+            started = time.perf_counter()
+            for w in workers:
+                w.start()
+            time.sleep(args.duration)
+            stop.set()
+            for w in workers:
+                w.join()
+            elapsed = time.perf_counter() - started
+            lost = lost_updates(workers)
+        finally:
+            os.chdir(cwd)
+            storage.flush()
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        ops = sum(w.ops for w in workers)
+        throughput = ops / elapsed
+        baseline = baseline or throughput
+        row = {
+            "threads": threads,
+            "ops": ops,
+            "ops_per_sec": round(throughput, 1),
+            "speedup": round(throughput / baseline, 2),
+            "lost_updates": lost,
+            "errors": [w.error for w in workers if w.error]
+        }
+        results.append(row)
+        print(f"{threads:>8}{ops:>10}{row['ops_per_sec']:>12.1f}{row['speedup']:>10.2f}{lost:>8}{len(row['errors']):>8}")
+    return results
+
+# ----------------------
+# 🔑 Password Hash Cost
+# ----------------------
+def login_throughput(threads, duration, size, seed):
+    """Successful logins per second and median latency from `threads` threads"""
+    stop = threading.Event()
+    latencies = [[] for _ in range(threads)]
+    failures = [0] * threads
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        while not stop.is_set():
+            i = rng.randrange(size)
+            t0 = time.perf_counter()
+            result, _ = firewall.check_login(f"user{i}", BENCH_PASSWORD, synthetic_ip(i), CONTENTION_PORT)
+            latencies[index].append(time.perf_counter() - t0)
+            if result != "valid":
+                failures[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    time.sleep(duration)
+    stop.set()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+
+    samples = sorted(t for per_thread in latencies for t in per_thread)
+    median = samples[len(samples) // 2] * 1000 if samples else 0.0
+    return round(len(samples) / elapsed, 1), round(median, 3), sum(failures)
+
+def run_hash_costs(settings, args):
+    """Login throughput at each algorithm:cost, without and with the verification cache"""
+    results = []
+    cache_size = passwords.CACHE_SIZE
+    for setting in settings:
+        algorithm, _, cost = setting.partition(":")
+        passwords.configure(algorithm=algorithm, cost=int(cost) if cost else None)
+        passwords.start_pool()
+
+        samples = []
+        for _ in range(5):
+            t0 = time.perf_counter()
+            passwords.hash_password(BENCH_PASSWORD)
+            samples.append(time.perf_counter() - t0)
+        row = {"setting": f"{passwords.ALGORITHM}:{passwords.COST}",
+               "hash_ms": round(sorted(samples)[2] * 1000, 3)}
+
+        for label, size in (("uncached", 0), ("cached", cache_size)):
+            data_dir = tempfile.mkdtemp(prefix="honeytrap-hash-")
+            cwd = os.getcwd()
+            try:
+                build_dataset(data_dir, args.login_users, args.seed)
+                os.chdir(data_dir)
+                firewall.LOGIN_ATTEMPTS.clear()
+                passwords.clear_cache()
+                passwords.CACHE_SIZE = size
+                if size:
+                    # Steady state: every user has logged in once already
+                    for i in range(args.login_users):
+                        firewall.check_login(f"user{i}", BENCH_PASSWORD, synthetic_ip(i), CONTENTION_PORT)
+                throughput, median, failures = login_throughput(args.login_threads, args.duration,
+                                                                 args.login_users, args.seed)
+            finally:
+                passwords.CACHE_SIZE = cache_size
+                os.chdir(cwd)
+                storage.flush()
+                shutil.rmtree(data_dir, ignore_errors=True)
+            row[f"{label}_logins_per_sec"] = throughput
+            row[f"{label}_median_ms"] = median
+            row.setdefault("failures", 0)
+            row["failures"] += failures
+
+        results.append(row)
+        print(f"{row['setting']:<22}{row['hash_ms']:>10.2f}{row['uncached_logins_per_sec']:>14.1f}"
+              f"{row['uncached_median_ms']:>12.2f}{row['cached_logins_per_sec']:>14.1f}{row['cached_median_ms']:>12.2f}")
+    return results
+
+# ----------------------
+# 📄 Results
+# ----------------------
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results, baseline_file, threshold):
+    """Print median ratios against a saved run; returns the number of regressions"""
+    with open(baseline_file, "r") as f:
+        baseline = json.load(f)
+    previous = {(r["function"], r["size"]): r for r in baseline["results"]}
+
+    print("-" * 70)
+    print(f"Comparison with {baseline_file} (revision {baseline['meta'].get('revision')})")
+    print(f"{'function':<18}{'size':>10}{'old ms':>12}{'new ms':>12}{'ratio':>10}")
+    regressions = 0
+    for row in results:
+        old = previous.get((row["function"], row["size"]))
+        if not old or not old["median_ms"]:
+            continue
+        ratio = row["median_ms"] / old["median_ms"]
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{row['function']:<18}{row['size']:>10}{old['median_ms']:>12.3f}{row['median_ms']:>12.3f}{ratio:>10.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for firewall rule evaluation")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated dataset sizes (up to 1000000)")
+    parser.add_argument("--functions", default=",".join(FUNCTIONS), help="comma-separated functions to time")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to spend per case")
+    parser.add_argument("--min-repeats", type=int, default=3)
+    parser.add_argument("--max-repeats", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="firewall_benchmark.json", help="where to save the results")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="ratio above which a case is a regression")
+    parser.add_argument("--contention", action="store_true",
+                        help="run the multi-threaded contention benchmark instead of the microbenchmarks")
+    parser.add_argument("--threads", default=DEFAULT_THREADS, help="comma-separated thread counts (contention)")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per thread count (contention)")
+    parser.add_argument("--contention-size", type=int, default=1000, help="dataset size (contention)")
+    parser.add_argument("--durability", choices=storage.DURABILITY_LEVELS, help="storage durability level to time")
+    parser.add_argument("--hash-costs",
+                        help="comma-separated algorithm:cost settings to compare login throughput for")
+    parser.add_argument("--login-threads", type=int, default=4, help="concurrent logins (hash costs)")
+    parser.add_argument("--login-users", type=int, default=20, help="dataset size (hash costs)")
+    args = parser.parse_args()
+
+    # Keep attacker events in memory; cases run in throwaway data directories
+    event_log.configure(None, echo=False)
+    if args.durability:
+        storage.configure(durability=args.durability)
+
+    if args.hash_costs:
+        print(f"{'setting':<22}{'hash ms':>10}{'logins/s':>14}{'median ms':>12}{'cached/s':>14}{'median ms':>12}")
+        results = run_hash_costs(args.hash_costs.split(","), args)
+        with open(args.output, "w") as f:
+            json.dump({"meta": {"revision": git_revision(), "python": sys.version.split()[0],
+                                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "mode": "hash_costs",
+                                "threads": args.login_threads, "cpus": os.cpu_count()},
+                       "hash_costs": results}, f, indent=4)
+        print(f"[+] Results written to {args.output}")
+        passwords.shutdown_pool()
+        if any(r["failures"] for r in results):
+            sys.exit(1)
+        return
+
+    algorithm, cost = RULE_HASH
+    passwords.configure(algorithm=algorithm, cost=cost, workers=0)
+
+    if args.contention:
+        print(f"{'threads':>8}{'ops':>10}{'ops/s':>12}{'speedup':>10}{'lost':>8}{'errors':>8}")
+        results = run_contention([int(t) for t in args.threads.split(",")], args)
+        with open(args.output, "w") as f:
+            json.dump({"meta": {"revision": git_revision(), "python": sys.version.split()[0],
+                                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "mode": "contention",
+                                "durability": storage.DURABILITY},
+                       "contention": results}, f, indent=4)
+        print(f"[+] Results written to {args.output}")
+        if any(r["lost_updates"] or r["errors"] for r in results):
+            sys.exit(1)
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    functions = [f.strip() for f in args.functions.split(",")]
+
+    print(f"{'function':<18}{'size':>10}{'reps':>8}{'median ms':>12}{'p95 ms':>12}{'ops/s':>12}")
+    results = run_suite(sizes, functions, args)
+
+    output = {
+        "meta": {
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "seed": args.seed,
+            "durability": storage.DURABILITY
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=4)
+    print(f"[+] Results written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
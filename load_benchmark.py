@@ -0,0 +1,383 @@
+# ===============================
+# 📈 HoneyTrap Load Benchmark
+# ===============================
+# Starts a HoneyTrapServer on loopback (in its own process, with a temporary
+# data directory) and drives it from many concurrent clients with a
+# configurable mix of operations. Reports throughput, p50/p95/p99 latency and
+# resource usage. Headless: no tkinter imports.
+#
+#   python load_benchmark.py --clients 50 --duration 15 \
+#       --mix login=30,failed=10,signup=5,keepalive=45,admin=10 --json results.json
+#
+# --workers N runs the server as N worker processes (server.py --workers);
+# compare the throughput of runs with 1, 2, 4... workers to see the scaling.
+# Server CPU and memory cover every process of the server.
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from client import HoneyTrapClient
+from protocol import MessageType
+
+DEFAULT_MIX = "login=30,failed=10,signup=5,keepalive=45,admin=10"
+BENCH_PASSWORD = "benchpass"
+
+# Admin list fetches rotate through these commands
+ADMIN_COMMANDS = [
+    MessageType.GET_POTENTIAL_ATTACKERS,
+    MessageType.GET_ACTIVE_USERS,
+    MessageType.GET_BANNED_IPS,
+    MessageType.GET_PORTS,
+    MessageType.GET_ATTACKERS
+]
+# List fetches HoneyTrapClient sends over the data channel
+DATA_CHANNEL_COMMANDS = {
+    MessageType.GET_POTENTIAL_ATTACKERS,
+    MessageType.GET_ACTIVE_USERS,
+    MessageType.GET_BANNED_IPS,
+    MessageType.GET_ATTACKERS
+}
+
+# ----------------------
+# 🖥️ Server Process
+# ----------------------
+def free_port():
+    """Ask the OS for an unused loopback port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run_server(data_dir, control_port, data_port, users, rate_limiting, workers, ready, stop):
+    """Server process: seed a data directory and serve until told to stop"""
+    os.chdir(data_dir)
+    sys.stdout = open(os.devnull, "w")
+    # Worker processes write to the inherited descriptor
+    os.dup2(sys.stdout.fileno(), 1)
+
+    import admission
+    import cluster
+    import firewall
+    import passwords
+    from server import HoneyTrapServer
+
+    firewall.initialize_files()
+    # One shared hash keeps seeding fast; logins still pay for verification
+    hashed = passwords.hash_password(BENCH_PASSWORD)
+    firewall.save_json(firewall.USER_DB, {f"bench{i}": hashed for i in range(users)})
+    firewall.refresh_stats()
+
+    # Every simulated client shares 127.0.0.1, so per-IP limits are off unless asked for
+    if not rate_limiting:
+        admission.configure(max_per_ip=0)
+    if workers > 1:
+        passwords.shutdown_pool()
+        argv = [] if rate_limiting else ["--no-rate-limit", "--max-connections-per-ip", "0"]
+        server = cluster.Supervisor(workers, host="127.0.0.1", control_port=control_port,
+                                    data_port=data_port, argv=argv)
+    else:
+        server = HoneyTrapServer(host="127.0.0.1", control_port=control_port, data_port=data_port,
+                                 rate_limiting=rate_limiting)
+    if not server.start():
+        return
+    ready.set()
+    stop.wait()
+    server.stop()
+
+# ----------------------
+# 📊 Resource Usage
+# ----------------------
+def process_usage(pid):
+    """CPU seconds, RSS and thread count of a process (Linux /proc, best effort)"""
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        usage["cpu_user_s"] = int(fields[11]) / ticks
+        usage["cpu_system_s"] = int(fields[12]) / ticks
+        usage["threads"] = int(fields[17])
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    usage["rss_kb"] = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    usage["peak_rss_kb"] = int(line.split()[1])
+        usage["open_fds"] = len(os.listdir(f"/proc/{pid}/fd"))
+    except (OSError, IndexError, ValueError):
+        pass
+    return usage
+
+def process_tree(pid):
+    """pid and all its descendants (Linux /proc)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, ()))
+    return tree
+
+def tree_usage(pid):
+    """process_usage() summed over a process and its descendants"""
+    total = {}
+    for member in process_tree(pid):
+        for key, value in process_usage(member).items():
+            total[key] = total.get(key, 0) + value
+    return total
+
+class UsageSampler(threading.Thread):
+    """Samples a process tree periodically and keeps the peaks"""
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peaks = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for key in ("threads", "rss_kb", "open_fds"):
+                value = tree_usage(self.pid).get(key)
+                if value is not None:
+                    self.peaks[key] = max(self.peaks.get(key, 0), value)
+
+# ----------------------
+# 🏋️ Load Generation
+# ----------------------
+def parse_mix(mix):
+    """Parse 'op=weight,...' into (ops, weights)"""
+    ops, weights = [], []
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("login", "failed", "signup", "keepalive", "admin"):
+            raise ValueError(f"Unknown operation in mix: {name}")
+        ops.append(name)
+        weights.append(float(weight or 1))
+    return ops, weights
+
+class LoadClient(threading.Thread):
+    """One simulated client issuing requests over its own connection"""
+    def __init__(self, index, args, ops, weights, deadline, start_gate):
+        super().__init__(daemon=True)
+        self.index = index
+        self.args = args
+        self.ops = ops
+        self.weights = weights
+        self.deadline = deadline
+        self.start_gate = start_gate
+        self.username = f"bench{index % args.users}"
+        self.rng = random.Random(args.seed + index)
+        self.latencies = {op: [] for op in ops}
+        self.errors = {op: 0 for op in ops}
+        self.signups = 0
+        self.token = None
+        self.connect_failed = False
+
+    def request(self, client, op):
+        """Issue one operation; returns the raw response (None on failure)"""
+        if op == "login":
+            response = client.send_request(MessageType.LOGIN, {"username": self.username, "password": BENCH_PASSWORD})
+            self.token = (response or {}).get("token", self.token)
+            return response
+        if op == "failed":
+            return client.send_request(MessageType.LOGIN, {"username": self.username, "password": "wrong-password"})
+        if op == "signup":
+            self.signups += 1
+            return client.send_request(MessageType.SIGNUP, {"username": f"new{self.index}-{self.signups}", "password": BENCH_PASSWORD})
+        if op == "keepalive":
+            session = {"token": self.token} if self.token else {"username": self.username}
+            return client.send_request(MessageType.UPDATE_ACTIVITY, session)
+        command = self.rng.choice(ADMIN_COMMANDS)
+        return client.send_request(command, {}, use_control_channel=command not in DATA_CHANNEL_COMMANDS)
+
+    def run(self):
+        client = HoneyTrapClient("127.0.0.1", self.args.control_port, self.args.data_port)
+        if not client.connect():
+            self.connect_failed = True
+            return
+
+        self.start_gate.wait()
+        try:
+            while time.time() < self.deadline:
+                op = self.rng.choices(self.ops, self.weights)[0]
+                started = time.perf_counter()
+                response = self.request(client, op)
+                elapsed = time.perf_counter() - started
+                if response is None:
+                    self.errors[op] += 1
+                    if not client.connected:
+                        break
+                else:
+                    self.latencies[op].append(elapsed)
+                if self.args.think_time:
+                    time.sleep(self.args.think_time)
+        finally:
+            client.disconnect()
+
+# ----------------------
+# 🧮 Reporting
+# ----------------------
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "throughput": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0
+    }
+
+def print_report(results):
+    print("=" * 78)
+    print(f"HoneyTrap load benchmark: {results['clients']} clients, {results['workers']} server worker(s), "
+          f"{results['elapsed_s']:.1f}s, mix {results['mix']}")
+    print("=" * 78)
+    print(f"{'operation':<12}{'count':>9}{'errors':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in list(results["operations"].items()) + [("TOTAL", results["total"])]:
+        print(f"{name:<12}{row['count']:>9}{row['errors']:>8}{row['throughput']:>10.1f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}")
+    print("-" * 78)
+    for side in ("server", "load_generator"):
+        usage = results["resources"][side]
+        print(f"{side:<15} " + ", ".join(f"{k}={v}" for k, v in usage.items()))
+    print("=" * 78)
+
+# ----------------------
+# 🚀 Main
+# ----------------------
+def run_benchmark(args):
+    ops, weights = parse_mix(args.mix)
+    args.control_port = args.control_port or free_port()
+    args.data_port = args.data_port or free_port()
+
+    data_dir = tempfile.mkdtemp(prefix="honeytrap-bench-")
+    ready = multiprocessing.Event()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=run_server,
+        args=(data_dir, args.control_port, args.data_port, args.users, args.rate_limit, args.workers, ready, stop)
+    )  # not a daemon: the server starts its own password hashing processes
+    server.start()
+
+    try:
+        if not ready.wait(60):
+            raise RuntimeError("Server did not start")
+
+        sampler = UsageSampler(server.pid)
+        sampler.start()
+        server_before = tree_usage(server.pid)
+        client_before = resource.getrusage(resource.RUSAGE_SELF)
+
+        start_gate = threading.Event()
+        deadline = time.time() + args.duration + 1  # connections are set up first
+        clients = [LoadClient(i, args, ops, weights, deadline, start_gate) for i in range(args.clients)]
+        for c in clients:
+            c.start()
+        time.sleep(1)
+        started = time.perf_counter()
+        start_gate.set()
+        for c in clients:
+            c.join()
+        elapsed = time.perf_counter() - started
+
+        server_after = tree_usage(server.pid)
+        client_after = resource.getrusage(resource.RUSAGE_SELF)
+        sampler.stopped.set()
+    finally:
+        stop.set()
+        server.join(20)
+        if server.is_alive():
+            server.terminate()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    operations = {}
+    all_latencies = []
+    all_errors = 0
+    for op in ops:
+        latencies = [v for c in clients for v in c.latencies[op]]
+        errors = sum(c.errors[op] for c in clients)
+        operations[op] = summarize(latencies, errors, elapsed)
+        all_latencies.extend(latencies)
+        all_errors += errors
+
+    server_usage = {
+        "cpu_user_s": round(server_after.get("cpu_user_s", 0) - server_before.get("cpu_user_s", 0), 2),
+        "cpu_system_s": round(server_after.get("cpu_system_s", 0) - server_before.get("cpu_system_s", 0), 2),
+        "peak_rss_kb": server_after.get("peak_rss_kb", 0),
+        "peak_threads": sampler.peaks.get("threads", server_after.get("threads", 0)),
+        "peak_open_fds": sampler.peaks.get("open_fds", server_after.get("open_fds", 0))
+    }
+    client_usage = {
+        "cpu_user_s": round(client_after.ru_utime - client_before.ru_utime, 2),
+        "cpu_system_s": round(client_after.ru_stime - client_before.ru_stime, 2),
+        "peak_rss_kb": client_after.ru_maxrss,
+        "connect_failures": sum(1 for c in clients if c.connect_failed)
+    }
+
+    return {
+        "clients": args.clients,
+        "workers": args.workers,
+        "duration_s": args.duration,
+        "rate_limiting": args.rate_limit,
+        "elapsed_s": round(elapsed, 3),
+        "mix": args.mix,
+        "operations": operations,
+        "total": summarize(all_latencies, all_errors, elapsed),
+        "resources": {"server": server_usage, "load_generator": client_usage}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for the HoneyTrap server")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--users", type=int, default=100, help="number of seeded user accounts")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between requests per client")
+    parser.add_argument("--control-port", type=int, default=0, help="server control port (default: free port)")
+    parser.add_argument("--data-port", type=int, default=0, help="server data port (default: free port)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the operation mix")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="keep the server's rate limits and per-IP connection cap (all clients share one IP)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="server worker processes, as server.py --workers (default: 1)")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"[+] Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,18 @@
 # ===============================
 # 🛡️ HoneyTrap Firewall Main Application
 # ===============================
+import startup_timer
 import tkinter as tk
 from tkinter import messagebox
 import random
+import threading
+import queue
 
-# Import for user portal
-from user_portal import open_user_portal, open_fake_portal
-
-# Import socket adapter
+# Import socket adapter (user portals are imported lazily on login)
 from adapter import LoginHandler, open_socket_user_portal, open_socket_fake_portal
 
+startup_timer.mark("imports")
+
 # ========================
 # Main Application
 # ========================
@@ -20,7 +22,19 @@ class App(tk.Tk):
         self.title("HoneyTrap Firewall")
         self.geometry("500x350")
         self.frames = {}
+        self.startup_reported = False
         self.show_frame("LoginPage")
+        
+        # Runs once the event loop has drawn the first frame
+        self.after_idle(self.record_startup_phase, "first paint")
+
+    def record_startup_phase(self, phase):
+        """Record a startup phase and print the report once all phases are in"""
+        startup_timer.mark_once(phase)
+        recorded = {name for name, _ in startup_timer.PHASES}
+        if not self.startup_reported and {"first paint", "ports loaded"} <= recorded:
+            self.startup_reported = True
+            startup_timer.report("Client startup")
 
     def show_frame(self, cont):
         # Close existing frame if it exists
@@ -63,8 +77,10 @@ class LoginPage(tk.Frame):
 
         self.login_attempts = 0
         
-        # Get available ports from server
-        self.ports = self.get_active_ports()
+        # Start from the last-known ports; the live list is fetched in the background
+        self.ports = self.filter_active(LoginHandler.get_cached_ports())
+        self.ports_loaded = False
+        self.ports_queue = queue.Queue()
 
         # Button frame for login and signup
         button_frame = tk.Frame(self)
@@ -72,17 +88,47 @@ class LoginPage(tk.Frame):
         
         tk.Button(button_frame, text="Login", command=self.login, width=10).pack(side="left", padx=10)
         tk.Button(button_frame, text="Signup", command=self.goto_signup, width=10).pack(side="left", padx=10)
+        
+        # Connection status
+        self.status_label = tk.Label(self, text="Connecting to server...", fg="blue")
+        self.status_label.pack()
+        
+        threading.Thread(target=self.fetch_ports_worker, daemon=True).start()
+        self.after(50, self.poll_ports)
     
     def goto_signup(self):
         self.master.show_frame("SignupPage")
     
-    def get_active_ports(self):
+    @staticmethod
+    def filter_active(ports):
+        return [p for p in ports if p["status"] == "active"]
+    
+    def fetch_ports_worker(self):
+        """Background thread: fetch the live port list from the server"""
         try:
-            ports = LoginHandler.get_ports()
-            return [p for p in ports if p["status"] == "active"]
-        except Exception:
-            messagebox.showerror("Error", "Could not connect to server")
-            return []
+            self.ports_queue.put((LoginHandler.get_ports(), None))
+        except Exception as e:
+            self.ports_queue.put((None, e))
+    
+    def poll_ports(self):
+        """Apply the background port fetch result on the UI thread"""
+        if not self.winfo_exists():
+            return
+        try:
+            ports, error = self.ports_queue.get_nowait()
+        except queue.Empty:
+            self.after(50, self.poll_ports)
+            return
+        
+        self.ports_loaded = True
+        if error is None:
+            self.ports = self.filter_active(ports)
+            self.status_label.config(text="Connected", fg="green")
+        elif self.ports:
+            self.status_label.config(text="Server unreachable, using last known ports", fg="orange")
+        else:
+            self.status_label.config(text="Could not connect to server", fg="red")
+        self.master.record_startup_phase("ports loaded")
 
     def login(self):
         username = self.username_entry.get()
@@ -95,7 +141,10 @@ class LoginPage(tk.Frame):
         
         # Assign a random port if available
         if not self.ports:
-            messagebox.showerror("Error", "No active ports available")
+            if not self.ports_loaded:
+                messagebox.showinfo("Please wait", "Still connecting to server...")
+            else:
+                messagebox.showerror("Error", "No active ports available")
             return
         
         selected_port = random.choice(self.ports)
@@ -0,0 +1,166 @@
+# ===============================
+# 📏 HoneyTrap Server Metrics
+# ===============================
+# Per-command histograms (count, errors, latency buckets, bytes in/out),
+# counters and gauges for the socket server. Exposed through the GET_METRICS
+# command and, optionally, a Prometheus text endpoint bound to localhost.
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency bucket upper bounds in seconds (Prometheus-style, cumulative)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class CommandStats:
+    """Histogram and byte counters for one command"""
+    __slots__ = ("count", "errors", "bytes_in", "bytes_out", "latency_sum", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency_sum = 0.0
+        # One slot per bucket plus +Inf (non-cumulative while recording)
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, latency, bytes_in, bytes_out, error):
+        self.count += 1
+        self.errors += 1 if error else 0
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.latency_sum += latency
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def cumulative_buckets(self):
+        total = 0
+        result = []
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), self.buckets):
+            total += count
+            result.append((bound, total))
+        return result
+
+class ServerMetrics:
+    """Thread-safe registry of command histograms, counters and gauges"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+
+    def observe(self, command, latency, bytes_in=0, bytes_out=0, error=False):
+        """Record one handled command"""
+        with self.lock:
+            stats = self.commands.get(command)
+            if stats is None:
+                stats = self.commands[command] = CommandStats()
+            stats.observe(latency, bytes_in, bytes_out, error)
+
+    def increment(self, name, amount=1):
+        """Increase a monotonically growing counter"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def register_gauge(self, name, func):
+        """Register a callable returning the current value of a gauge"""
+        self.gauges[name] = func
+
+    def read_gauges(self):
+        values = {}
+        for name, func in list(self.gauges.items()):
+            try:
+                values[name] = func()
+            except Exception:
+                values[name] = None
+        return values
+
+    def snapshot(self):
+        """Return all metrics as plain JSON-serializable data"""
+        with self.lock:
+            commands = {
+                command: {
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "bytes_in": stats.bytes_in,
+                    "bytes_out": stats.bytes_out,
+                    "latency_sum_ms": round(stats.latency_sum * 1000, 3),
+                    "latency_avg_ms": round(stats.latency_sum * 1000 / stats.count, 3) if stats.count else 0.0,
+                    "latency_buckets": {
+                        ("+Inf" if bound == float("inf") else str(bound)): count
+                        for bound, count in stats.cumulative_buckets()
+                    }
+                }
+                for command, stats in self.commands.items()
+            }
+            counters = dict(self.counters)
+        return {
+            "uptime": int(time.time() - self.started),
+            "commands": commands,
+            "counters": counters,
+            "gauges": self.read_gauges()
+        }
+
+    def prometheus_text(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            items = [(c, s.count, s.errors, s.bytes_in, s.bytes_out, s.latency_sum, s.cumulative_buckets())
+                     for c, s in self.commands.items()]
+            counters = dict(self.counters)
+
+        lines.append("# TYPE honeytrap_command_latency_seconds histogram")
+        for command, count, _, _, _, latency_sum, buckets in items:
+            for bound, total in buckets:
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'honeytrap_command_latency_seconds_bucket{{command="{command}",le="{le}"}} {total}')
+            lines.append(f'honeytrap_command_latency_seconds_sum{{command="{command}"}} {latency_sum}')
+            lines.append(f'honeytrap_command_latency_seconds_count{{command="{command}"}} {count}')
+
+        for metric, index in (("errors", 2), ("bytes_in", 3), ("bytes_out", 4)):
+            lines.append(f"# TYPE honeytrap_command_{metric}_total counter")
+            for item in items:
+                lines.append(f'honeytrap_command_{metric}_total{{command="{item[0]}"}} {item[index]}')
+
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE honeytrap_{name} counter")
+            lines.append(f"honeytrap_{name} {value}")
+
+        for name, value in sorted(self.read_gauges().items()):
+            if value is None:
+                continue
+            lines.append(f"# TYPE honeytrap_{name} gauge")
+            lines.append(f"honeytrap_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+# ----------------------
+# 🌐 Prometheus Endpoint
+# ----------------------
+def start_prometheus_endpoint(metrics, port, host="127.0.0.1"):
+    """Serve GET /metrics on localhost from a daemon thread; returns the HTTP server"""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+    http_server.daemon_threads = True
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    return http_server
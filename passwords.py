@@ -0,0 +1,239 @@
+# ===============================
+# 🔑 HoneyTrap Password Hashing
+# ===============================
+# Salted password hashes for users.json, with stdlib hashlib only:
+#
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>          (memory-hard, default)
+#   pbkdf2_sha256$<iterations>$<salt>$<hash>
+#
+# Hashing runs on a process pool so a login doesn't hold the server's GIL
+# for tens of milliseconds. Successful verifications are remembered for a
+# short time in a bounded cache keyed on an HMAC of the credentials and the
+# stored (salted) hash, so repeated logins from the same client stay cheap.
+# Entries without a known prefix are legacy plaintext passwords: they still
+# verify, and are flagged for rehashing.
+#
+# Configuration (environment or configure()):
+#   HONEYTRAP_HASH          scrypt | pbkdf2
+#   HONEYTRAP_HASH_COST     scrypt N (power of two) or PBKDF2 iterations
+#   HONEYTRAP_HASH_WORKERS  process pool size (0 hashes on the calling thread)
+
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+ALGORITHMS = ("scrypt", "pbkdf2")
+DEFAULT_COSTS = {"scrypt": 2 ** 14, "pbkdf2": 200000}
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+ALGORITHM = os.environ.get("HONEYTRAP_HASH", "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2")
+if ALGORITHM not in ALGORITHMS:
+    raise ValueError(f"Unknown hash algorithm in HONEYTRAP_HASH: {ALGORITHM} "
+                     f"(expected one of {', '.join(ALGORITHMS)})")
+COST = int(os.environ.get("HONEYTRAP_HASH_COST", 0)) or DEFAULT_COSTS[ALGORITHM]
+WORKERS = int(os.environ.get("HONEYTRAP_HASH_WORKERS", os.cpu_count() or 2))
+
+CACHE_TTL = 300
+CACHE_SIZE = 10000
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+def _unb64(text):
+    return base64.b64decode(text.encode("ascii"))
+
+# ----------------------
+# 🧮 Hash Functions (run in pool processes)
+# ----------------------
+def _derive(algorithm, cost, password, salt):
+    if algorithm == "scrypt":
+        return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=cost, r=SCRYPT_R, p=SCRYPT_P,
+                              maxmem=256 * cost * SCRYPT_R + 1024 * 1024, dklen=HASH_BYTES)
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, cost, dklen=HASH_BYTES)
+
+def _hash(algorithm, cost, password):
+    salt = os.urandom(SALT_BYTES)
+    derived = _derive(algorithm, cost, password, salt)
+    if algorithm == "scrypt":
+        return f"scrypt${cost}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(derived)}"
+    return f"pbkdf2_sha256${cost}${_b64(salt)}${_b64(derived)}"
+
+def parse(stored):
+    """Split a stored hash into (algorithm, cost, salt, digest); None for plaintext"""
+    parts = stored.split("$") if isinstance(stored, str) else []
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            return "scrypt", int(parts[1]), _unb64(parts[4]), _unb64(parts[5])
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            return "pbkdf2", int(parts[1]), _unb64(parts[2]), _unb64(parts[3])
+    except (IndexError, ValueError):
+        pass
+    return None
+
+def _verify(password, stored):
+    parsed = parse(stored)
+    if parsed is None:
+        return hmac.compare_digest(str(stored).encode("utf-8"), password.encode("utf-8"))
+    algorithm, cost, salt, digest = parsed
+    return hmac.compare_digest(_derive(algorithm, cost, password, salt), digest)
+
+# ----------------------
+# 🏊 Offload Pool
+# ----------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+def _init_worker():
+    # Ctrl+C reaches the whole process group; the server shuts the pool down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _get_pool():
+    global _pool
+    if WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the server already runs threads, which fork would copy mid-lock
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker)
+        return _pool
+
+def _run(func, *args):
+    pool = _get_pool()
+    if pool is None:
+        return func(*args)
+    return pool.submit(func, *args).result()
+
+def start_pool():
+    """Start the worker processes now instead of on the first login"""
+    pool = _get_pool()
+    if pool is not None:
+        for future in [pool.submit(int) for _ in range(WORKERS)]:
+            future.result()
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            # Waiting: an abandoned pool process can keep a worker process from exiting
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+# ----------------------
+# 🧠 Verification Cache
+# ----------------------
+# Process-local key: cache keys are useless outside this process
+_CACHE_KEY = os.urandom(32)
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_counters = {"hashes": 0, "verifications": 0, "cache_hits": 0, "cache_misses": 0}
+
+def _count(name):
+    with _cache_lock:
+        _counters[name] += 1
+
+def _cache_key(username, password, stored):
+    message = "\0".join((username, password, str(stored))).encode("utf-8")
+    return hmac.new(_CACHE_KEY, message, hashlib.sha256).digest()
+
+def _cache_hit(key):
+    with _cache_lock:
+        expires = _cache.get(key)
+        if expires is not None and expires < time.monotonic():
+            del _cache[key]
+            expires = None
+        if expires is None:
+            _counters["cache_misses"] += 1
+            return False
+        _cache.move_to_end(key)
+        _counters["cache_hits"] += 1
+        return True
+
+def _cache_add(key):
+    with _cache_lock:
+        _cache[key] = time.monotonic() + CACHE_TTL
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def stats():
+    with _cache_lock:
+        return dict(_counters, cache_entries=len(_cache), algorithm=ALGORITHM, cost=COST)
+
+# ----------------------
+# 🔐 Public API
+# ----------------------
+def configure(algorithm=None, cost=None, workers=None):
+    """Change the hashing algorithm, cost or pool size (new hashes only)"""
+    global ALGORITHM, COST, WORKERS
+    if algorithm is not None:
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown hash algorithm: {algorithm}")
+        if algorithm != ALGORITHM and cost is None:
+            cost = DEFAULT_COSTS[algorithm]
+        ALGORITHM = algorithm
+    if cost is not None:
+        COST = int(cost)
+    if workers is not None and workers != WORKERS:
+        shutdown_pool()
+        WORKERS = workers
+
+def hash_password(password):
+    """Salted hash of a password at the configured algorithm and cost"""
+    _count("hashes")
+    return _run(_hash, ALGORITHM, COST, password)
+
+def hash_many(plaintexts):
+    """Hash a list of passwords, spread over the pool (bulk migration)"""
+    plaintexts = list(plaintexts)
+    with _cache_lock:
+        _counters["hashes"] += len(plaintexts)
+    pool = _get_pool()
+    if pool is None:
+        return [_hash(ALGORITHM, COST, p) for p in plaintexts]
+    return list(pool.map(_hash, repeat(ALGORITHM), repeat(COST), plaintexts, chunksize=16))
+
+def needs_rehash(stored):
+    """True for plaintext entries and hashes made with other settings"""
+    parsed = parse(stored)
+    return parsed is None or parsed[0] != ALGORITHM or parsed[1] != COST
+
+_dummy = {}
+
+def _dummy_hash():
+    """Hash of a random password at the current settings, for unknown users"""
+    settings = (ALGORITHM, COST)
+    if settings not in _dummy:
+        _dummy[settings] = _hash(ALGORITHM, COST, _b64(os.urandom(16)))
+    return _dummy[settings]
+
+def verify_password(username, password, stored):
+    """Check a password against a stored hash (or legacy plaintext)"""
+    _count("verifications")
+    if stored is None:
+        # Unknown user: spend the same time as a real check
+        _run(_verify, password, _dummy_hash())
+        return False
+
+    key = _cache_key(username, password, stored)
+    if _cache_hit(key):
+        return True
+    if _run(_verify, password, stored):
+        _cache_add(key)
+        return True
+    return False
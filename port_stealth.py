@@ -6,9 +6,10 @@
 import socket
 import threading
 import time
-import json
 import struct
 
+import storage
+
 # Constants
 PORTS_DB = "ports.json"
 # Track active stealth sockets
@@ -16,16 +17,11 @@ STEALTH_SOCKETS = {}
 
 def load_ports():
     """Load port configuration from JSON file"""
-    try:
-        with open(PORTS_DB, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    return storage.load_json(PORTS_DB)
 
 def save_ports(ports):
     """Save port configuration to JSON file"""
-    with open(PORTS_DB, "w") as f:
-        json.dump(ports, f, indent=4)
+    storage.save_json(PORTS_DB, ports)
 
 def setup_socket_listen(port, active):
     """Platform-independent method using raw sockets to handle port visibility"""
@@ -101,16 +97,9 @@ def update_port_visibility(port, active):
     return result
 
 def sync_all_ports():
-    """Sync stealth settings for all ports"""
+    """Sync stealth settings for all ports (called explicitly at server startup)"""
     ports = load_ports()
     for port_config in ports:
         port = port_config["port"]
         active = port_config["status"] == "active"
         update_port_visibility(port, active)
-
-# Run synchronization on import
-if __name__ != "__main__":
-    try:
-        sync_all_ports()
-    except Exception as e:
-        print(f"Error syncing port visibility: {e}")
\ No newline at end of file
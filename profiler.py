@@ -0,0 +1,176 @@
+# ===============================
+# 🔬 HoneyTrap Runtime Profiler
+# ===============================
+# Opt-in profiling for a running server, without restarting it:
+#   - stack sampling across all threads for N seconds, written as a
+#     flamegraph-compatible collapsed-stack file (flamegraph.pl, speedscope)
+#   - cProfile around one command handler for N seconds, written as pstats
+# Triggered by the start_profiling admin command or SIGUSR1 (sampling).
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+
+import event_log
+
+PROFILE_DIR = "profiles"
+DEFAULT_SECONDS = 10
+MAX_SECONDS = 300
+SAMPLE_INTERVAL = 0.005
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample_stacks(seconds, output, interval=SAMPLE_INTERVAL):
+    """Sample every thread's stack for `seconds` and write collapsed stacks"""
+    own_id = threading.get_ident()
+    counts = {}
+    samples = 0
+    deadline = time.perf_counter() + seconds
+
+    while time.perf_counter() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            key = ";".join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+        samples += 1
+        time.sleep(interval)
+
+    with open(output, "w") as f:
+        for stack, count in sorted(counts.items()):
+            f.write(f"{stack} {count}\n")
+    return samples
+
+class ProfilingController:
+    """Starts sampling and handler-profiling sessions, one of each at a time"""
+    def __init__(self, socket_server, output_dir=PROFILE_DIR):
+        self.socket_server = socket_server
+        self.output_dir = output_dir
+        self.lock = threading.Lock()
+        self.sampling = False
+        self.profiled_commands = set()
+
+    def _output_path(self, kind, extension):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.output_dir, f"{kind}-{stamp}-{os.getpid()}.{extension}")
+
+    @staticmethod
+    def _clamp(seconds):
+        try:
+            seconds = float(seconds)
+        except (TypeError, ValueError):
+            seconds = DEFAULT_SECONDS
+        return max(0.1, min(seconds, MAX_SECONDS))
+
+    def start_sampling(self, seconds=DEFAULT_SECONDS):
+        """Sample all threads in the background; returns the output path or None if busy"""
+        seconds = self._clamp(seconds)
+        with self.lock:
+            if self.sampling:
+                return None
+            self.sampling = True
+        output = self._output_path("stacks", "collapsed")
+
+        def worker():
+            try:
+                samples = sample_stacks(seconds, output)
+                event_log.emit("ops", "profiling_finished", f"[PROFILE] Wrote {samples} stack samples to {output}",
+                               mode="sample", file=output, samples=samples)
+            except Exception as e:
+                event_log.emit("ops", "profiling_error", f"[-] Stack sampling failed: {e}",
+                               level="error", mode="sample", error=str(e))
+            finally:
+                with self.lock:
+                    self.sampling = False
+
+        threading.Thread(target=worker, name="stack-sampler", daemon=True).start()
+        return output
+
+    def profile_handler(self, command, seconds=DEFAULT_SECONDS):
+        """Wrap a handler with cProfile for `seconds`; returns the output path or None if busy"""
+        handlers = self.socket_server.message_handlers
+        if command not in handlers:
+            raise KeyError(f"No handler registered for {command}")
+        if self.socket_server.handler_execution.get(command) == "process":
+            raise ValueError(f"{command} runs in the process pool and cannot be profiled in place")
+        seconds = self._clamp(seconds)
+
+        with self.lock:
+            if command in self.profiled_commands:
+                return None
+            self.profiled_commands.add(command)
+
+        output = self._output_path(f"handler-{command}", "pstats")
+        original = handlers[command]
+        profiles = []
+        profiles_lock = threading.Lock()
+        # Python 3.12+ allows one active cProfile per process (enable() raises
+        # ValueError otherwise): profile one call at a time, run the others as usual
+        active = threading.Lock()
+        calls = [0]
+
+        def run_profiled(message, connection_info):
+            """(True, response) of the handler under a new Profile; (False, None) if another profiler is active"""
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # e.g. another command is being profiled
+                return False, None
+            try:
+                return True, original(message, connection_info)
+            finally:
+                profile.disable()
+                with profiles_lock:
+                    profiles.append(profile)
+
+        def profiled(message, connection_info):
+            with profiles_lock:
+                calls[0] += 1
+            if active.acquire(blocking=False):
+                try:
+                    ran, response = run_profiled(message, connection_info)
+                finally:
+                    active.release()
+                if ran:
+                    return response
+            return original(message, connection_info)
+
+        def finish():
+            handlers[command] = original
+            try:
+                with profiles_lock:
+                    collected = list(profiles)
+                if collected:
+                    stats = pstats.Stats(collected[0])
+                    for profile in collected[1:]:
+                        stats.add(profile)
+                    stats.dump_stats(output)
+                event_log.emit("ops", "profiling_finished",
+                               f"[PROFILE] Profiled {len(collected)} of {calls[0]} {command} calls to {output}",
+                               mode="handler", target=command, file=output, calls=calls[0],
+                               profiled=len(collected))
+            except Exception as e:
+                event_log.emit("ops", "profiling_error", f"[-] Handler profiling failed: {e}",
+                               level="error", mode="handler", target=command, error=str(e))
+            finally:
+                with self.lock:
+                    self.profiled_commands.discard(command)
+
+        handlers[command] = profiled
+        timer = threading.Timer(seconds, finish)
+        timer.daemon = True
+        timer.start()
+        return output
@@ -5,6 +5,7 @@
 
 import json
 import time
+from itertools import chain, islice
 
 # ----------------------
 # 🔤 Message Types
@@ -17,23 +18,36 @@ class MessageType:
     
     # Activity
     UPDATE_ACTIVITY = "update_activity"
+    REPORT_HONEYPOT = "report_honeypot"
     
     # Admin operations
     GET_ATTACKERS = "get_attackers"
     GET_POTENTIAL_ATTACKERS = "get_potential_attackers"
     BAN_IP = "ban_ip"
+    BAN_IPS = "ban_ips"
     UNBAN_IP = "unban_ip"
     GET_BANNED_IPS = "get_banned_ips"
     GET_ACTIVE_USERS = "get_active_users"
+    GET_STATS = "get_stats"
+    
+    # Server diagnostics
+    GET_METRICS = "get_metrics"
+    START_PROFILING = "start_profiling"
     
     # Port management
     GET_PORTS = "get_ports"
     UPDATE_PORT = "update_port"
+    
+    # Flow control of streamed responses
+    STREAM_CREDIT = "stream_credit"
 
 
 # Protocol version
 PROTOCOL_VERSION = "1.0"
 
+# Reserved administrator account name (shared by server and client)
+ADMIN_USERNAME = "admin"
+
 # ----------------------
 # 📝 Message Creation Helpers
 # ----------------------
@@ -116,6 +130,16 @@ def create_ban_ip_message(ip_address):
         'timestamp': time.time()
     }
 
+def create_ban_ips_message(ip_addresses):
+    """Create a properly formatted bulk ban message"""
+    return {
+        'command': MessageType.BAN_IPS,
+        'params': {
+            'ips': list(ip_addresses)
+        },
+        'timestamp': time.time()
+    }
+
 def create_unban_ip_message(ip_address):
     """Create a properly formatted unban IP message"""
     return {
@@ -124,4 +148,172 @@ def create_unban_ip_message(ip_address):
             'ip': ip_address
         },
         'timestamp': time.time()
-    }
\ No newline at end of file
+    }
+
+# ----------------------
+# 📦 Framing
+# ----------------------
+# Every message is one JSON object followed by a newline. Older clients sent
+# bare objects with no delimiter, one per write; a buffer holding complete
+# JSON with no newline is still accepted as such messages.
+MESSAGE_DELIMITER = b"\n"
+MAX_MESSAGE_SIZE = 1024 * 1024
+# Initial size of a connection's receive buffer (it grows for larger
+# messages), and the least free space worth a recv_into()
+RECV_BUFFER_SIZE = 16 * 1024
+MIN_READ = 4096
+
+def encode_message(message):
+    """Serialize a message for the wire"""
+    return json.dumps(message).encode('utf-8') + MESSAGE_DELIMITER
+
+class ReceiveBuffer:
+    """
+    A connection's reusable receive buffer. recv_into() reads into its free
+    space and messages() slices the complete messages out in place: a read
+    allocates no bytes objects, and only the bytes of a message left
+    incomplete at the end of the buffer are ever moved.
+    """
+    def __init__(self, size=RECV_BUFFER_SIZE):
+        self.size = size
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        # Unconsumed bytes are buffer[start:end]; the delimiter search resumes at scanned
+        self.start = self.end = self.scanned = 0
+
+    def __len__(self):
+        """Bytes received of a message not yet complete"""
+        return self.end - self.start
+
+    def recv_into(self, sock):
+        """Read from sock into the buffer; returns the number of bytes (0 at EOF)"""
+        if len(self.buffer) - self.end < MIN_READ:
+            self._make_room()
+        received = sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def messages(self):
+        """
+        Iterator over the complete messages received so far, each a memoryview
+        of the buffer: parse them before the next recv_into() reuses it.
+        """
+        first, last = self.start, self.buffer.rfind(MESSAGE_DELIMITER, self.scanned, self.end)
+        if last >= 0:
+            self.start = last + 1
+        self.scanned = self.end
+        messages = self._framed(self.buffer, self.view, first, last)
+
+        if self._unframed_end():
+            unframed = _split_unframed(self.view[self.start:self.end].tobytes())
+            if unframed is not None:
+                messages = chain(messages, unframed)
+                self.start = self.end
+
+        if self.start == self.end:
+            # Empty again: start over at the front (and give back a grown buffer)
+            self.start = self.end = self.scanned = 0
+            if len(self.buffer) > self.size:
+                self.buffer = bytearray(self.size)
+                self.view = memoryview(self.buffer)
+        return messages
+
+    @staticmethod
+    def _framed(buffer, view, start, last):
+        """The lines in buffer[start:last], skipping blank ones"""
+        while start < last:
+            end = buffer.find(MESSAGE_DELIMITER, start, last + 1)
+            # Messages are JSON objects: only check lines not starting with "{"
+            if buffer[start] == 123 or buffer[start:end].strip():
+                yield view[start:end]
+            start = end + 1
+
+    def _unframed_end(self):
+        """True if the pending bytes end like a complete bare JSON object"""
+        end = self.end
+        while end > self.start and self.buffer[end - 1] in b" \t\r\n":
+            end -= 1
+        return end > self.start and self.buffer[end - 1] == ord("}")
+
+    def _make_room(self):
+        pending = self.end - self.start
+        if self.start and pending + MIN_READ <= len(self.buffer):
+            # Move the incomplete message to the front
+            self.view[:pending] = self.view[self.start:self.end]
+        else:
+            buffer = bytearray(max(2 * len(self.buffer), pending + MIN_READ))
+            buffer[:pending] = self.view[self.start:self.end]
+            # Views handed out by messages() keep the old buffer alive
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+        self.scanned -= self.start
+        self.start, self.end = 0, pending
+
+def _split_unframed(data):
+    """Bare JSON objects back to back, or None while the last one is incomplete"""
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    decoder = json.JSONDecoder()
+    messages, position = [], 0
+    while True:
+        while position < len(text) and text[position].isspace():
+            position += 1
+        if position >= len(text):
+            return messages
+        try:
+            _, end = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            return None
+        messages.append(text[position:end].encode('utf-8'))
+        position = end
+
+# ----------------------
+# 🚚 Bulk Transfers
+# ----------------------
+# Large list fetches, exports and bulk imports use the data channel, so they
+# never delay keep-alives and logins on the control channel. On the data
+# channel a long 'data' list is sent as several frames: 'partial' frames with
+# a slice of the records each, then the usual final response with the rest.
+#
+# Flow control: a request carrying 'window': N gets at most N frames ahead of
+# the client, which sends a stream_credit message ({'stream': <request id>,
+# 'frames': n}) each time it has consumed N/2 of them, or {'stream': ...,
+# 'cancel': true} to stop early. Credits are exempt from rate limits and get
+# no response. Requests without a window are sent as fast as TCP allows.
+STATUS_PARTIAL = "partial"
+STREAM_CHUNK = 500
+STREAM_WINDOW = 8
+# IPs sent per ban_ips request
+BULK_BATCH = 5000
+
+def stream_frames(response, chunk=STREAM_CHUNK):
+    """Split a response's 'data' (a list or any iterator) into partial frames and a final frame"""
+    records = iter(response['data'])
+    batch = list(islice(records, chunk))
+    while True:
+        # One chunk of lookahead: the final frame is never empty unless the data is
+        following = list(islice(records, chunk))
+        if not following:
+            yield dict(response, data=batch)
+            return
+        yield {'status': STATUS_PARTIAL, 'id': response.get('id'), 'data': batch}
+        batch = following
+
+def encode_chunks(message, size=65536):
+    """encode_message() in pieces of about `size` bytes, for a message whose 'data' is an iterator"""
+    head = dict(message)
+    records = head.pop('data')
+    text = json.dumps(head)
+    pieces = [text[:-1] + (', ' if head else '') + '"data": [']
+    length = len(pieces[0])
+    for index, record in enumerate(records):
+        piece = (', ' if index else '') + json.dumps(record)
+        pieces.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(pieces).encode('utf-8')
+            pieces, length = [], 0
+    pieces.append(']}')
+    yield ''.join(pieces).encode('utf-8') + MESSAGE_DELIMITER
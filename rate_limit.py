@@ -0,0 +1,96 @@
+# ===============================
+# 🚦 HoneyTrap Rate Limiting
+# ===============================
+# Token buckets: each key earns `rate` tokens per second up to `burst`, and
+# every message spends one. Checks are O(1) - a refill computed from the
+# time since the last check, no timers or background threads.
+#
+# The server keeps one bucket per connection (in the connection's state,
+# touched only by its reader thread), one per source IP, and one per source
+# IP for each command registered with its own limit. A multi-process server
+# gives each process an equal share of the per-IP and per-command budgets,
+# since one client's connections are spread over all of them.
+
+import threading
+import time
+from collections import OrderedDict
+
+# Messages per second and burst size
+IP_RATE = 100.0
+IP_BURST = 200
+CONNECTION_RATE = 50.0
+CONNECTION_BURST = 100
+MAX_TRACKED_KEYS = 100000
+# Processes sharing the per-key budgets
+SHARE = 1
+
+def configure(share=None):
+    """Split the budgets of RateLimiters created afterwards between `share` processes"""
+    global SHARE
+    if share is not None:
+        SHARE = max(1, int(share))
+
+class TokenBucket:
+    """One key's allowance"""
+    __slots__ = ("rate", "burst", "tokens", "updated", "limited")
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic() if now is None else now
+        # Set on a denial, cleared once the bucket refills: one report per flood
+        self.limited = False
+
+    def take(self, now=None, cost=1.0):
+        """Spend `cost` tokens if available; False when over the limit"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            if self.tokens >= self.burst:
+                self.limited = False
+            self.tokens -= cost
+            return True
+        return False
+
+class RateLimiter:
+    """Token buckets by key (IP, or IP and command), least recently used evicted first"""
+    def __init__(self, rate, burst, max_keys=MAX_TRACKED_KEYS):
+        self.rate = rate / SHARE
+        self.burst = max(1.0, burst / SHARE)
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def check(self, key, now=None):
+        """
+        Spend one token for key.
+        Returns "ok", "limited" (first denial since the key's bucket was last
+        full) or "still_limited".
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+            return _result(bucket, now)
+
+    def __len__(self):
+        return len(self.buckets)
+
+def _result(bucket, now):
+    if bucket.take(now):
+        return "ok"
+    if bucket.limited:
+        return "still_limited"
+    bucket.limited = True
+    return "limited"
+
+def check_bucket(bucket, now=None):
+    """Same as RateLimiter.check for a bucket owned by one thread (no lock)"""
+    return _result(bucket, time.monotonic() if now is None else now)
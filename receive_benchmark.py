@@ -0,0 +1,161 @@
+# ===============================
+# 📥 Socket Receive Benchmark
+# ===============================
+# Feeds a high rate of small framed messages (keep-alive sized) over loopback
+# TCP to two receive loops and compares their cost per message:
+#
+#   split     the previous loop: recv() into a new bytes object, joined to
+#             the pending bytes, split into new bytes per line
+#   recv_into protocol.ReceiveBuffer: one reusable buffer per connection,
+#             messages sliced out in place
+#
+# Both hand each message's text to json.loads, as the server's dispatch()
+# does. Allocations are measured with tracemalloc on the reading process only
+# (the sender is a separate process), in a second run that leaves json.loads
+# out (it allocates the same for both loops): "alloc B/msg" is the memory
+# allocated on top of what was live while handling each read, summed over
+# reads, per message.
+#
+#   python receive_benchmark.py --messages 200000 --write-size 1460 --json receive.json
+
+import argparse
+import json
+import multiprocessing
+import socket
+import time
+import tracemalloc
+
+from protocol import MESSAGE_DELIMITER, ReceiveBuffer, encode_message
+
+PREVIOUS_RECV_SIZE = 65536
+
+def build_stream(count):
+    """count keep-alive messages, framed as clients send them"""
+    template = {'command': 'update_activity', 'params': {'token': 'x' * 120}, 'timestamp': 0.0}
+    return b"".join(encode_message(dict(template, id=str(i))) for i in range(count))
+
+def send_stream(port, stream, write_size):
+    """Sender process: write the stream in fixed-size writes (split mid-message)"""
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        view = memoryview(stream)
+        for start in range(0, len(view), write_size):
+            sock.sendall(view[start:start + write_size])
+
+# ----------------------
+# 📥 Receive Loops
+# ----------------------
+def read_split(sock, on_read, parse):
+    """The previous loop"""
+    buffer = b""
+    count = 0
+    while True:
+        data = sock.recv(PREVIOUS_RECV_SIZE)
+        if not data:
+            return count
+        *lines, buffer = (buffer + data).split(MESSAGE_DELIMITER)
+        for line in lines:
+            if line.strip():
+                parse(line.decode('utf-8'))
+                count += 1
+        on_read()
+
+def read_recv_into(sock, on_read, parse):
+    """protocol.ReceiveBuffer"""
+    receive = ReceiveBuffer()
+    count = 0
+    while True:
+        if not receive.recv_into(sock):
+            return count
+        for message in receive.messages():
+            parse(str(message, 'utf-8'))
+            count += 1
+        on_read()
+
+LOOPS = {"split": read_split, "recv_into": read_recv_into}
+
+# ----------------------
+# 🧮 Measurement
+# ----------------------
+class ReadAllocations:
+    """on_read callback: memory allocated (beyond what was live) during each read"""
+    def __init__(self):
+        self.total = 0
+        self.reads = 0
+        self.baseline = 0
+
+    def start(self):
+        tracemalloc.reset_peak()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+
+    def __call__(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.total += peak - self.baseline
+        self.reads += 1
+        tracemalloc.reset_peak()
+        self.baseline = current
+
+def run_loop(name, stream, write_size, trace):
+    """Receive the stream once with one loop; returns its measurements"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        sender = multiprocessing.get_context("spawn").Process(
+            target=send_stream, args=(listener.getsockname()[1], stream, write_size))
+        sender.start()
+        sock, _ = listener.accept()
+
+    allocations = ReadAllocations()
+    with sock:
+        if trace:
+            tracemalloc.start()
+            allocations.start()
+        started = time.perf_counter()
+        if trace:
+            count = LOOPS[name](sock, allocations, lambda text: None)
+        else:
+            count = LOOPS[name](sock, lambda: None, json.loads)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace else 0
+        if trace:
+            tracemalloc.stop()
+    sender.join()
+    return count, elapsed, allocations, peak
+
+def benchmark(args):
+    stream = build_stream(args.messages)
+    results = {}
+    for name in LOOPS:
+        # Timed without tracing (tracemalloc slows every allocation down)
+        count, elapsed, _, _ = run_loop(name, stream, args.write_size, trace=False)
+        _, _, allocations, peak = run_loop(name, stream, args.write_size, trace=True)
+        results[name] = {
+            "messages": count,
+            "reads": allocations.reads,
+            "messages_per_s": round(count / elapsed),
+            "us_per_message": round(elapsed / count * 1e6, 3),
+            "alloc_bytes_per_message": round(allocations.total / count, 1),
+            "peak_traced_kb": round(peak / 1024, 1)
+        }
+    return {"messages": args.messages, "bytes": len(stream), "write_size": args.write_size, "loops": results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare socket receive loops under a high message rate")
+    parser.add_argument("--messages", type=int, default=200000, help="messages per run")
+    parser.add_argument("--write-size", type=int, default=1460, help="bytes per sender write")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = benchmark(args)
+    print(f"{results['messages']} messages, {results['bytes'] / 1e6:.1f} MB, {results['write_size']}-byte writes")
+    print(f"{'loop':<12}{'reads':>9}{'msg/s':>12}{'us/msg':>10}{'alloc B/msg':>14}{'peak KB':>10}")
+    for name, row in results["loops"].items():
+        print(f"{name:<12}{row['reads']:>9}{row['messages_per_s']:>12}{row['us_per_message']:>10.3f}"
+              f"{row['alloc_bytes_per_message']:>14.1f}{row['peak_traced_kb']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"[+] Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
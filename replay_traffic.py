@@ -0,0 +1,198 @@
+# ===============================
+# 🔁 HoneyTrap Traffic Replay
+# ===============================
+# Replays a capture recorded with `python server.py --capture FILE` against a
+# fresh loopback server seeded with the capture's starting state, at recorded
+# speed (1x), faster (e.g. 10x) or as fast as possible (max), and checks that
+# every honeypot/flagging decision matches the recording.
+#
+#   python replay_traffic.py traffic.ndjson --speed 10
+#   python replay_traffic.py traffic.ndjson --speed max --connections 4
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from client import HoneyTrapClient
+from load_benchmark import free_port, percentile
+from traffic_capture import load_capture
+
+# ----------------------
+# 🖥️ Replay Server
+# ----------------------
+def run_replay_server(data_dir, control_port, data_port, state, ready, stop):
+    """Server process: restore the captured state and serve in replay mode"""
+    os.chdir(data_dir)
+    sys.stdout = open(os.devnull, "w")
+
+    import firewall
+    from server import HoneyTrapServer
+
+    for file, content in state.items():
+        firewall.save_json(file, content)
+    firewall.initialize_files()
+
+    server = HoneyTrapServer(host="127.0.0.1", control_port=control_port, data_port=data_port,
+                             replay_mode=True)
+    if not server.start():
+        return
+    ready.set()
+    stop.wait()
+    server.stop()
+
+# ----------------------
+# 🔁 Replay
+# ----------------------
+class ReplayWorker(threading.Thread):
+    """Sends its share of the capture in order over one connection"""
+    def __init__(self, records, control_port, data_port, speed, origin, start_time):
+        super().__init__(daemon=True)
+        self.records = records
+        self.control_port = control_port
+        self.data_port = data_port
+        self.speed = speed
+        self.origin = origin
+        self.start_time = start_time
+        self.latencies = []
+        self.mismatches = []
+        self.matched = 0
+        self.errors = 0
+
+    def run(self):
+        client = HoneyTrapClient("127.0.0.1", self.control_port, self.data_port)
+        if not client.connect():
+            self.errors = len(self.records)
+            return
+        try:
+            for index, record in self.records:
+                if self.speed:
+                    # Keep the recorded spacing, compressed by the speed factor
+                    due = self.start_time + (record["t"] - self.origin) / self.speed
+                    delay = due - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                params = dict(record.get("params") or {}, replay_ip=record["ip"])
+                started = time.perf_counter()
+                response = client.send_request(record["command"], params)
+                self.latencies.append(time.perf_counter() - started)
+
+                if response is None:
+                    self.errors += 1
+                    continue
+                if response.get("status") == record.get("status"):
+                    self.matched += 1
+                else:
+                    self.mismatches.append({
+                        "index": index,
+                        "command": record["command"],
+                        "ip": record["ip"],
+                        "username": (record.get("params") or {}).get("username"),
+                        "recorded": record.get("status"),
+                        "replayed": response.get("status")
+                    })
+        finally:
+            client.disconnect()
+
+def partition(commands, connections):
+    """Pin each client IP to one connection so per-IP order is preserved"""
+    shares = [[] for _ in range(connections)]
+    owners = {}
+    for index, record in enumerate(commands):
+        owner = owners.setdefault(record["ip"], len(owners) % connections)
+        shares[owner].append((index, record))
+    return [share for share in shares if share]
+
+def replay(capture, speed, connections):
+    header, commands = load_capture(capture)
+    if not commands:
+        raise ValueError("Capture contains no commands")
+
+    control_port, data_port = free_port(), free_port()
+    data_dir = tempfile.mkdtemp(prefix="honeytrap-replay-")
+    ready = multiprocessing.Event()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=run_replay_server,
+        args=(data_dir, control_port, data_port, header.get("state", {}), ready, stop)
+    )  # not a daemon: the server starts its own password hashing processes
+    server.start()
+
+    try:
+        if not ready.wait(30):
+            raise RuntimeError("Replay server did not start")
+
+        origin = commands[0]["t"]
+        start_time = time.time()
+        workers = [
+            ReplayWorker(share, control_port, data_port, speed, origin, start_time)
+            for share in partition(commands, connections)
+        ]
+        started = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        server.join(10)
+        if server.is_alive():
+            server.terminate()
+            server.join()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    latencies = sorted(v for w in workers for v in w.latencies)
+    mismatches = sorted((m for w in workers for m in w.mismatches), key=lambda m: m["index"])
+    return {
+        "capture": capture,
+        "speed": speed or "max",
+        "connections": len(workers),
+        "commands": len(commands),
+        "recorded_duration_s": round(commands[-1]["t"] - origin, 3),
+        "elapsed_s": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "matched": sum(w.matched for w in workers),
+        "errors": sum(w.errors for w in workers),
+        "mismatches": mismatches
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured HoneyTrap traffic and verify decisions")
+    parser.add_argument("capture", help="capture file written by server.py --capture")
+    parser.add_argument("--speed", default="1", help="replay speed factor (1, 10, ...) or 'max'")
+    parser.add_argument("--connections", type=int, default=1,
+                        help="parallel connections (1 keeps the exact global order)")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    results = replay(args.capture, speed, max(1, args.connections))
+
+    rate = "max speed" if results["speed"] == "max" else f"{results['speed']}x"
+    print("=" * 60)
+    print(f"Replayed {results['commands']} commands at {rate} over {results['connections']} connection(s)")
+    print(f"Recorded {results['recorded_duration_s']}s, replayed in {results['elapsed_s']}s "
+          f"({results['throughput']} req/s, p50 {results['p50_ms']} ms, p99 {results['p99_ms']} ms)")
+    print(f"Decisions matched: {results['matched']}, mismatched: {len(results['mismatches'])}, errors: {results['errors']}")
+    for m in results["mismatches"][:20]:
+        print(f"  #{m['index']} {m['command']} {m['username']}@{m['ip']}: recorded {m['recorded']}, replayed {m['replayed']}")
+    print("=" * 60)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if results["mismatches"] or results["errors"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
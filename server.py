@@ -1,47 +1,159 @@
 # ===============================
 # 🛡️ HoneyTrap Server Implementation
 # ===============================
+import startup_timer
 import socket
 import threading
 import json
 import time
+import signal
+import argparse
+import sys
+import cluster
 import firewall
-from server_base import EnhancedSocketServer
+import server_base
+from server_base import EnhancedSocketServer, THREAD, PROCESS
 from protocol import MessageType
+from traffic_capture import TrafficRecorder, RECORDED_COMMANDS
 import port_stealth
+from metrics import start_prometheus_endpoint
+from profiler import ProfilingController
+import admission
+import event_log
+import passwords
+import session_tokens
+import storage
+
+startup_timer.mark("imports")
+
+# Upper bound on attacker events returned by one get_attackers request
+MAX_ATTACKER_RESULTS = 10000
+# Upper bound on IPs in one ban_ips request
+MAX_BULK_IPS = 10000
+
+# Per source IP limits (per second, burst) on top of the connection and IP limits
+LOGIN_RATE = (5, 10)
+SIGNUP_RATE = (1, 3)
+REPORT_RATE = (2, 10)
 
 class HoneyTrapServer:
-    def __init__(self, host='0.0.0.0', control_port=5000, data_port=5001, use_ssl=False):
-        """Initialize the HoneyTrap server"""
+    def __init__(self, host='0.0.0.0', control_port=5000, data_port=5001, use_ssl=False,
+                 capture_file=None, replay_mode=False, rate_limiting=True, reuse_port=False):
+        """
+        Initialize the HoneyTrap server.
+        capture_file: record detection-relevant commands for later replay.
+        replay_mode: trust a 'replay_ip' request parameter as the client IP
+        (only for loopback servers started by the replay harness).
+        rate_limiting: per-connection, per-IP and per-command token buckets
+        (always off in replay mode, where every request comes from loopback).
+        reuse_port: share the ports with other server processes (cluster.py).
+        """
+        if replay_mode and host not in ('127.0.0.1', 'localhost'):
+            raise ValueError("Replay mode is only allowed on a loopback server")
+        
         self.socket_server = EnhancedSocketServer(host, control_port, data_port, use_ssl)
+        self.socket_server.rate_limiting = rate_limiting and not replay_mode
+        self.socket_server.reuse_port = reuse_port
+        if replay_mode:
+            # Replayed clients all connect from loopback
+            self.socket_server.admission.max_per_ip = 0
+        self.socket_server.limited_response = self.rate_limited_response
+        # Port stealth runs here, or in the supervisor of a multi-process server
+        self.port_visibility = port_stealth.update_port_visibility
+        self.replay_mode = replay_mode
+        self.recorder = None
+        if capture_file:
+            self.recorder = TrafficRecorder(capture_file, snapshot_files=[
+                firewall.USER_DB, firewall.PORTS_DB, firewall.BANNED_IPS,
+                firewall.POTENTIAL_ATTACKERS, firewall.SESSIONS_DB
+            ])
+        
         self.register_message_handlers()
         self.inactivity_thread = None
+        
+        # Opt-in runtime profiling (admin command, or SIGUSR1 for stack sampling)
+        self.profiler = ProfilingController(self.socket_server)
+        
+        # Count every logged event per category as telemetry
+        event_log.subscribe(self.count_event)
+        metrics = self.socket_server.metrics
+        metrics.register_gauge("password_verifications", lambda: passwords.stats()["verifications"])
+        metrics.register_gauge("password_hashes", lambda: passwords.stats()["hashes"])
+        metrics.register_gauge("password_cache_hits", lambda: passwords.stats()["cache_hits"])
+        metrics.register_gauge("password_cache_entries", lambda: passwords.stats()["cache_entries"])
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self.profiling_signal_handler)
     
     def register_message_handlers(self):
-        """Register all message handlers"""
+        """
+        Register all message handlers.
+        Cheap, latency-sensitive commands (keep-alives, stats) run inline on the
+        connection thread; commands that load or rewrite whole tables run on the
+        thread pool with a bounded queue, so they never hold up the inline ones.
+        List fetches are streamed in frames when they arrive on the data channel;
+        the attacker, potential attacker and banned IP lists come from generators,
+        so their records are encoded and sent as they are read.
+        """
+        register = self.socket_server.register_handler
+        
         # Authentication handlers
-        self.socket_server.register_handler(MessageType.LOGIN, self.handle_login)
-        self.socket_server.register_handler(MessageType.SIGNUP, self.handle_signup)
-        self.socket_server.register_handler(MessageType.LOGOUT, self.handle_logout)
+        register(MessageType.LOGIN, self.handle_login, THREAD, queue_size=256, rate=LOGIN_RATE)
+        register(MessageType.SIGNUP, self.handle_signup, THREAD, queue_size=64, rate=SIGNUP_RATE)
+        register(MessageType.LOGOUT, self.handle_logout)
         
         # Activity handlers
-        self.socket_server.register_handler(MessageType.UPDATE_ACTIVITY, self.handle_update_activity)
+        register(MessageType.UPDATE_ACTIVITY, self.handle_update_activity)
+        register(MessageType.REPORT_HONEYPOT, self.handle_report_honeypot, rate=REPORT_RATE)
         
         # Admin handlers
-        self.socket_server.register_handler(MessageType.GET_ATTACKERS, self.handle_get_attackers)
-        self.socket_server.register_handler(MessageType.GET_POTENTIAL_ATTACKERS, self.handle_get_potential_attackers)
-        self.socket_server.register_handler(MessageType.BAN_IP, self.handle_ban_ip)
-        self.socket_server.register_handler(MessageType.UNBAN_IP, self.handle_unban_ip)
-        self.socket_server.register_handler(MessageType.GET_BANNED_IPS, self.handle_get_banned_ips)
-        self.socket_server.register_handler(MessageType.GET_ACTIVE_USERS, self.handle_get_active_users)
+        register(MessageType.GET_ATTACKERS, self.handle_get_attackers, THREAD, queue_size=16, stream=True)
+        register(MessageType.GET_POTENTIAL_ATTACKERS, self.handle_get_potential_attackers, THREAD, queue_size=16,
+                 stream=True)
+        register(MessageType.BAN_IP, self.handle_ban_ip, THREAD, queue_size=64)
+        register(MessageType.BAN_IPS, self.handle_ban_ips, THREAD, queue_size=16)
+        register(MessageType.UNBAN_IP, self.handle_unban_ip, THREAD, queue_size=64)
+        register(MessageType.GET_BANNED_IPS, self.handle_get_banned_ips, THREAD, queue_size=16, stream=True)
+        register(MessageType.GET_ACTIVE_USERS, self.handle_get_active_users, THREAD, queue_size=16, stream=True)
+        register(MessageType.GET_STATS, self.handle_get_stats)
         
         # Port management handlers
-        self.socket_server.register_handler(MessageType.GET_PORTS, self.handle_get_ports)
-        self.socket_server.register_handler(MessageType.UPDATE_PORT, self.handle_update_port)
+        register(MessageType.GET_PORTS, self.handle_get_ports)
+        register(MessageType.UPDATE_PORT, self.handle_update_port, THREAD, queue_size=16)
+        
+        # Diagnostics handlers
+        register(MessageType.GET_METRICS, self.handle_get_metrics)
+        register(MessageType.START_PROFILING, self.handle_start_profiling)
+        
+        # Capture and replay hook in around the registered handlers (process
+        # pool handlers must stay picklable module functions, so they are skipped)
+        if self.recorder or self.replay_mode:
+            for command, handler in list(self.socket_server.message_handlers.items()):
+                if self.socket_server.handler_execution.get(command) != PROCESS:
+                    self.socket_server.message_handlers[command] = self.wrap_handler(command, handler)
+    
+    def wrap_handler(self, command, handler):
+        """Wrap a handler with replay IP substitution and traffic capture"""
+        def wrapped(message, connection_info):
+            params = message.get('params', {})
+            if self.replay_mode and 'replay_ip' in params:
+                params = dict(params)
+                replay_ip = params.pop('replay_ip')
+                message = dict(message, params=params)
+                connection_info = dict(connection_info, address=(replay_ip, connection_info['address'][1]))
+            
+            response = handler(message, connection_info)
+            
+            if self.recorder and command in RECORDED_COMMANDS:
+                self.recorder.record(command, params, connection_info['address'][0], response)
+            return response
+        return wrapped
     
     def start(self):
         """Start the socket server and inactivity checker"""
         if self.socket_server.start():
+            # Spawn the hashing processes now rather than on the first login
+            passwords.start_pool()
+            
             # Start inactivity checker thread
             self.inactivity_thread = threading.Thread(target=self.check_inactivity_loop)
             self.inactivity_thread.daemon = True
@@ -49,27 +161,62 @@ class HoneyTrapServer:
             return True
         return False
     
+    def running(self):
+        return self.socket_server.active
+    
     def stop(self):
         """Stop the server"""
         self.socket_server.stop()
+        if self.recorder:
+            self.recorder.close()
+        event_log.unsubscribe(self.count_event)
+        event_log.EVENTS.close()
+        firewall.checkpoint_sessions()
+        storage.flush()
+        passwords.shutdown_pool()
+    
+    def rate_limited_response(self, command, message, connection_info):
+        """Over-limit traffic gets the honeypot's answers, without running any handler"""
+        if command == MessageType.LOGIN:
+            return {'status': 'fake'}
+        if command == MessageType.SIGNUP:
+            return {'status': 'success', 'message': 'User created successfully'}
+        return {'status': 'error', 'message': 'Server busy, try again'}
+    
+    def count_event(self, record):
+        """Event log subscriber: per-category event counters"""
+        self.socket_server.metrics.increment(f"events_{record['category']}_total")
+    
+    def profiling_signal_handler(self, sig, frame):
+        """SIGUSR1: sample all thread stacks for the default duration"""
+        output = self.profiler.start_sampling()
+        if output:
+            event_log.emit("ops", "profiling_started", f"[PROFILE] Sampling stacks to {output}",
+                           mode="sample", file=output, trigger="SIGUSR1")
     
     def check_inactivity_loop(self):
         """Thread function to periodically check for inactive users"""
+        interval = firewall.SESSION_CHECKPOINT_INTERVAL
         while self.socket_server.active:
-            # Check for inactive clients
-            self.socket_server.check_inactive_connections()
+            # Idle connections are shed by the socket server's own deadlines
             
             # Check for inactive users in the firewall system
             try:
                 firewall.check_inactivity()
             except Exception as e:
-                print(f"[-] Error checking inactivity: {e}")
+                event_log.emit("ops", "inactivity_check_error", f"[-] Error checking inactivity: {e}",
+                               level="error", error=str(e))
             
-            # Sleep for 5 minutes
-            for _ in range(30):  # Check every 10 seconds if server is still active
+            # Sleep for 5 minutes, checkpointing keep-alive times along the way
+            for _ in range(300 // interval):
                 if not self.socket_server.active:
                     break
-                time.sleep(10)
+                time.sleep(interval)
+                try:
+                    firewall.checkpoint_sessions()
+                except Exception as e:
+                    event_log.emit("ops", "session_checkpoint_error", f"[-] Error saving session activity: {e}",
+                                   level="error", error=str(e))
     
     #===================================
     # Message Handlers
@@ -88,10 +235,13 @@ class HoneyTrapServer:
         client_ip = connection_info['address'][0]
         
         # Use firewall to validate login
-        status, error_message = firewall.check_login(username, password, client_ip, port)
+        status, detail = firewall.check_login(username, password, client_ip, port)
         
-        if error_message:
-            return {'status': status, 'message': error_message}
+        if status == 'valid':
+            # Keep-alives and logout present this token instead of the bare username
+            return {'status': status, 'token': session_tokens.issue(username, sid=detail)}
+        if detail:
+            return {'status': status, 'message': detail}
         return {'status': status}
     
     def handle_signup(self, message, connection_info):
@@ -114,12 +264,27 @@ class HoneyTrapServer:
         else:
             return {'status': 'error', 'message': message}
     
+    def session_from(self, params):
+        """
+        (session id, username) from a session token.
+        Clients without a token send 'username' and get (None, username).
+        An invalid token gives (None, None).
+        """
+        if 'token' in params:
+            payload = session_tokens.verify(params['token'])
+            if not payload:
+                return None, None
+            return payload.get('sid'), payload['u']
+        return None, params.get('username')
+    
     def handle_logout(self, message, connection_info):
-        """Handle logout message"""
+        """Handle logout message (one session by token, or all of a user's sessions)"""
         params = message.get('params', {})
-        username = params.get('username')
+        session_id, username = self.session_from(params)
         
-        if username:
+        if session_id:
+            firewall.end_session(session_id)
+        elif username:
             firewall.logout_user(username)
         
         return {'status': 'success', 'message': 'Logged out successfully'}
@@ -127,23 +292,49 @@ class HoneyTrapServer:
     def handle_update_activity(self, message, connection_info):
         """Handle update activity message"""
         params = message.get('params', {})
-        username = params.get('username')
+        session_id, username = self.session_from(params)
+        
+        if session_id:
+            if firewall.touch_session(session_id):
+                return {'status': 'updated'}
+            return {'status': 'error', 'message': 'Session not found'}
         
         if not username:
+            if 'token' in params:
+                return {'status': 'error', 'message': 'Invalid session token'}
             return {'status': 'error', 'message': 'Username required'}
         
         if firewall.update_activity(username):
             return {'status': 'updated'}
         return {'status': 'error', 'message': 'User not found'}
     
+    def handle_report_honeypot(self, message, connection_info):
+        """Handle a fake portal reporting what it collected about its session"""
+        params = message.get('params', {})
+        details = params.get('details')
+        if details is not None and not isinstance(details, dict):
+            return {'status': 'error', 'message': 'Details must be an object'}
+        
+        # Record the connection's address, not anything the client claims
+        firewall.record_honeypot_report(connection_info['address'][0], params.get('port'), details)
+        return {'status': 'success'}
+    
     def handle_get_attackers(self, message, connection_info):
-        """Handle get attackers message"""
-        attackers = firewall.get_attackers()
+        """Handle get attackers message (optional since/until timestamps and limit)"""
+        params = message.get('params', {})
+        try:
+            since = float(params['since']) if params.get('since') is not None else None
+            until = float(params['until']) if params.get('until') is not None else None
+            limit = max(1, min(int(params.get('limit') or MAX_ATTACKER_RESULTS), MAX_ATTACKER_RESULTS))
+        except (TypeError, ValueError):
+            return {'status': 'error', 'message': 'since/until must be timestamps and limit a number'}
+        
+        attackers = firewall.iter_attackers(since, until, limit)
         return {'status': 'success', 'data': attackers}
     
     def handle_get_potential_attackers(self, message, connection_info):
         """Handle get potential attackers message"""
-        potential_attackers = firewall.get_potential_attackers()
+        potential_attackers = firewall.iter_potential_attackers()
         return {'status': 'success', 'data': potential_attackers}
     
     def handle_ban_ip(self, message, connection_info):
@@ -155,10 +346,28 @@ class HoneyTrapServer:
             return {'status': 'error', 'message': 'IP address required'}
         
         if firewall.ban_ip(ip_address):
-            print(f"[SERVER] IP {ip_address} has been banned by admin from {connection_info['address'][0]}")
+            admin_ip = connection_info['address'][0]
+            event_log.emit("ops", "ip_banned", f"[SERVER] IP {ip_address} has been banned by admin from {admin_ip}",
+                           ip=ip_address, admin_ip=admin_ip)
             return {'status': 'success', 'message': f'IP {ip_address} has been banned'}
         return {'status': 'error', 'message': 'Failed to ban IP'}
     
+    def handle_ban_ips(self, message, connection_info):
+        """Handle bulk ban message (a list of IPs, e.g. an imported blocklist)"""
+        params = message.get('params', {})
+        ips = params.get('ips')
+        
+        if not isinstance(ips, list) or not all(isinstance(ip, str) and ip for ip in ips):
+            return {'status': 'error', 'message': 'ips must be a list of IP addresses'}
+        if len(ips) > MAX_BULK_IPS:
+            return {'status': 'error', 'message': f'At most {MAX_BULK_IPS} IPs per request'}
+        
+        added = firewall.ban_ips(ips)
+        admin_ip = connection_info['address'][0]
+        event_log.emit("ops", "ips_banned", f"[SERVER] {added} IPs have been banned by admin from {admin_ip}",
+                       count=added, admin_ip=admin_ip)
+        return {'status': 'success', 'message': f'{added} IPs banned', 'added': added}
+    
     def handle_unban_ip(self, message, connection_info):
         """Handle unban IP message"""
         params = message.get('params', {})
@@ -168,20 +377,58 @@ class HoneyTrapServer:
             return {'status': 'error', 'message': 'IP address required'}
         
         if firewall.unban_ip(ip_address):
-            print(f"[SERVER] IP {ip_address} has been unbanned by admin from {connection_info['address'][0]}")
+            admin_ip = connection_info['address'][0]
+            event_log.emit("ops", "ip_unbanned", f"[SERVER] IP {ip_address} has been unbanned by admin from {admin_ip}",
+                           ip=ip_address, admin_ip=admin_ip)
             return {'status': 'success', 'message': f'IP {ip_address} has been unbanned'}
         return {'status': 'error', 'message': 'Failed to unban IP'}
     
     def handle_get_banned_ips(self, message, connection_info):
         """Handle get banned IPs message"""
-        banned_ips = firewall.get_banned_ips()
+        banned_ips = firewall.iter_banned_ips()
         return {'status': 'success', 'data': banned_ips}
     
     def handle_get_active_users(self, message, connection_info):
-        """Handle get active users message"""
-        active_users = firewall.get_active_users()
+        """Handle get active users message (optional username, ip and port filters)"""
+        params = message.get('params', {})
+        active_users = firewall.get_active_users(params.get('username'), params.get('ip'), params.get('port'))
         return {'status': 'success', 'data': active_users}
     
+    def handle_get_stats(self, message, connection_info):
+        """Handle get stats message (counts and rates, no table loads)"""
+        return {'status': 'success', 'data': firewall.get_stats()}
+    
+    def handle_get_metrics(self, message, connection_info):
+        """Handle get metrics message (per-command histograms, counters, gauges)"""
+        return {'status': 'success', 'data': self.socket_server.metrics.snapshot()}
+    
+    def handle_start_profiling(self, message, connection_info):
+        """Handle start profiling message (local admin only)"""
+        if connection_info['address'][0] not in ('127.0.0.1', '::1'):
+            return {'status': 'error', 'message': 'Profiling is only available from localhost'}
+        
+        params = message.get('params', {})
+        mode = params.get('mode', 'sample')
+        seconds = params.get('seconds', 10)
+        
+        if mode == 'sample':
+            output = self.profiler.start_sampling(seconds)
+        elif mode == 'handler':
+            try:
+                output = self.profiler.profile_handler(params.get('target'), seconds)
+            except (KeyError, ValueError) as e:
+                return {'status': 'error', 'message': str(e)}
+        else:
+            return {'status': 'error', 'message': f'Unknown profiling mode: {mode}'}
+        
+        if output is None:
+            return {'status': 'error', 'message': 'Profiling already in progress'}
+        admin_ip = connection_info['address'][0]
+        event_log.emit("ops", "profiling_started",
+                       f"[SERVER] Profiling ({mode}) started by admin from {admin_ip}, writing {output}",
+                       mode=mode, file=output, admin_ip=admin_ip)
+        return {'status': 'success', 'message': 'Profiling started', 'file': output}
+    
     def handle_get_ports(self, message, connection_info):
         """Handle get ports message"""
         ports = firewall.get_ports()
@@ -198,25 +445,82 @@ class HoneyTrapServer:
             return {'status': 'error', 'message': 'Port required'}
         
         if firewall.toggle_port_status(port, status, honeypot):
+            admin_ip = connection_info['address'][0]
+            
             # If port status was changed, update port stealth settings
             if status is not None:
                 try:
                     is_active = (status == "active")
-                    port_stealth.update_port_visibility(port, is_active)
-                    print(f"[SERVER] Port {port} status changed to {status} by admin from {connection_info['address'][0]}")
+                    self.port_visibility(port, is_active)
+                    event_log.emit("ops", "port_status_changed",
+                                   f"[SERVER] Port {port} status changed to {status} by admin from {admin_ip}",
+                                   port=port, status=status, admin_ip=admin_ip)
                 except Exception as e:
-                    print(f"[-] Error updating port visibility: {e}")
+                    event_log.emit("ops", "port_visibility_error", f"[-] Error updating port visibility: {e}",
+                                   level="error", port=port, error=str(e))
             
             # If honeypot status was changed
             if honeypot is not None:
                 honeypot_status = "enabled" if honeypot else "disabled"
-                print(f"[SERVER] Honeypot {honeypot_status} for port {port} by admin from {connection_info['address'][0]}")
+                event_log.emit("ops", "port_honeypot_changed",
+                               f"[SERVER] Honeypot {honeypot_status} for port {port} by admin from {admin_ip}",
+                               port=port, honeypot=bool(honeypot), admin_ip=admin_ip)
             
             return {'status': 'success', 'message': 'Port updated'}
         return {'status': 'error', 'message': 'Port not found'}
 
+def parse_args(argv=None):
+    """Command line options of the server"""
+    parser = argparse.ArgumentParser(description="HoneyTrap Firewall Server")
+    parser.add_argument("--capture", help="record login and admin traffic to this file for replay_traffic.py")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--durability", choices=storage.DURABILITY_LEVELS,
+                        help="data file durability: none, batch (group commit) or sync (default: batch)")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="disable per-connection, per-IP and per-command rate limits")
+    parser.add_argument("--backlog", type=int, help=f"listen backlog (default: {admission.BACKLOG})")
+    parser.add_argument("--max-connections", type=int,
+                        help=f"open connections allowed in total, 0 for no cap (default: {admission.MAX_CONNECTIONS})")
+    parser.add_argument("--max-connections-per-ip", type=int,
+                        help=f"open connections allowed per source IP, 0 for no cap (default: {admission.MAX_CONNECTIONS_PER_IP})")
+    parser.add_argument("--admission-policy", choices=admission.POLICIES,
+                        help="refused connections: reset them, or send the honeypot answer (default: reject)")
+    parser.add_argument("--idle-timeout", type=float,
+                        help=f"seconds a connection may go without a message (default: {server_base.IDLE_TIMEOUT:g})")
+    parser.add_argument("--read-timeout", type=float,
+                        help=f"seconds to receive the rest of a started message (default: {server_base.READ_TIMEOUT:g})")
+    parser.add_argument("--handshake-timeout", type=float,
+                        help=f"seconds allowed for the TLS handshake (default: {server_base.HANDSHAKE_TIMEOUT:g})")
+    parser.add_argument("--hash", choices=passwords.ALGORITHMS,
+                        help="password hash for new and upgraded passwords (default: scrypt)")
+    parser.add_argument("--hash-cost", type=int,
+                        help="scrypt N or PBKDF2 iterations (default: 16384 / 200000)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="server processes sharing the ports with SO_REUSEPORT (default: 1)")
+    args = parser.parse_args(argv)
+    if args.workers > 1:
+        if args.capture:
+            parser.error("--capture needs a single server process")
+        if not hasattr(socket, "SO_REUSEPORT"):
+            parser.error("--workers needs SO_REUSEPORT, which this platform lacks")
+    return args
+
+def apply_settings(args):
+    """Configure the modules from the command line options"""
+    if args.durability:
+        storage.configure(durability=args.durability)
+    admission.configure(backlog=args.backlog, max_connections=args.max_connections,
+                        max_per_ip=args.max_connections_per_ip, policy=args.admission_policy)
+    server_base.configure(handshake_timeout=args.handshake_timeout, read_timeout=args.read_timeout,
+                          idle_timeout=args.idle_timeout)
+    if args.hash or args.hash_cost:
+        passwords.configure(algorithm=args.hash, cost=args.hash_cost)
+
 # Main function to run the server
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+    apply_settings(args)
+    
     try:
         print("=" * 60)
         print("🛡️  HoneyTrap Firewall Server")
@@ -232,42 +536,62 @@ def main():
         except Exception as e:
             print(f"Error getting network info: {e}")
         
+        # Create any missing data files (importing firewall does not touch disk)
+        firewall.initialize_files()
+        startup_timer.mark("data files")
+        
         # Sync all ports with firewall rules for stealth
         try:
             port_stealth.sync_all_ports()
             print("[+] Port stealth feature initialized")
         except Exception as e:
             print(f"[-] Warning: Port stealth initialization error: {e}")
+        startup_timer.mark("port stealth")
         
         # Start the server with SSL disabled
         # To run on multiple PCs, use host='0.0.0.0' to listen on all network interfaces
-        server = HoneyTrapServer(host='0.0.0.0', control_port=5000, data_port=5001, use_ssl=False)
+        if args.workers > 1:
+            # Worker processes get the same options; the supervisor keeps port stealth
+            server = cluster.Supervisor(args.workers, host='0.0.0.0', control_port=5000, data_port=5001,
+                                        argv=sys.argv[1:] if argv is None else argv)
+        else:
+            server = HoneyTrapServer(host='0.0.0.0', control_port=5000, data_port=5001, use_ssl=False,
+                                     capture_file=args.capture, rate_limiting=not args.no_rate_limit)
+        if args.capture:
+            print(f"[+] Recording traffic to {args.capture}")
         
         if server.start():
+            if args.workers > 1:
+                print(f"[+] {args.workers} worker processes sharing ports 5000/5001")
+                if args.metrics_port:
+                    last = args.metrics_port + args.workers - 1
+                    print(f"[+] Prometheus metrics per worker on 127.0.0.1 ports {args.metrics_port}-{last}")
+            elif args.metrics_port:
+                start_prometheus_endpoint(server.socket_server.metrics, args.metrics_port)
+                print(f"[+] Prometheus metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+            startup_timer.mark("listening")
+            startup_timer.report("Server cold start")
             print("[+] HoneyTrap Server started successfully")
             print("[+] Ready to accept connections")
             print("=" * 60)
             
             try:
                 # Keep the main thread running
-                while server.socket_server.active:
+                while server.running():
                     time.sleep(1)
             except KeyboardInterrupt:
                 print("\n[*] Shutting down server...")
             finally:
                 server.stop()
                 print("[*] Server shutdown complete")
-                import sys
                 sys.exit(0)
         else:
             print("[-] Failed to start HoneyTrap Server")
-            import sys
             sys.exit(1)
     except Exception as e:
         print(f"CRITICAL ERROR: {e}")
         import traceback
         traceback.print_exc()
-        import sys
         sys.exit(1)
 
 # Add logout_user to firewall.py if it doesn't exist
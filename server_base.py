@@ -9,7 +9,78 @@ import select
 import signal
 import sys
 import ssl
+import os
+import itertools
+import multiprocessing
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from ssl_handler import SSLSocketWrapper
+from metrics import ServerMetrics
+from protocol import (MessageType, ReceiveBuffer, encode_message, encode_chunks, stream_frames,
+                      MAX_MESSAGE_SIZE)
+from timer_wheel import TimerWheel
+import admission
+import event_log
+import rate_limit
+import storage
+
+# Handler execution classes: on the connection's own thread, on a shared
+# thread pool, or on a process pool (CPU-bound, picklable module functions)
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+EXECUTION_CLASSES = (INLINE, THREAD, PROCESS)
+DEFAULT_QUEUE_SIZE = 64
+THREAD_WORKERS = 16
+PROCESS_WORKERS = os.cpu_count() or 2
+# Flow-controlled streams wait for credits on their own pool, so a reader that
+# stops crediting never holds a handler worker; each connection and IP may keep
+# only a few of them open
+STREAM = "stream"
+STREAM_WORKERS = 32
+MAX_STREAMS_PER_CONNECTION = 4
+MAX_STREAMS_PER_IP = 8
+
+# Seconds allowed for the TLS handshake, for a message once its first bytes
+# have arrived, and between messages
+HANDSHAKE_TIMEOUT = float(os.environ.get("HONEYTRAP_HANDSHAKE_TIMEOUT", 10))
+READ_TIMEOUT = float(os.environ.get("HONEYTRAP_READ_TIMEOUT", 10))
+IDLE_TIMEOUT = float(os.environ.get("HONEYTRAP_IDLE_TIMEOUT", 300))
+# Seconds a streamed response waits for the client's next credit, and the
+# most frames a client may let run ahead of it
+STREAM_TIMEOUT = 30
+MAX_STREAM_WINDOW = 64
+
+def configure(handshake_timeout=None, read_timeout=None, idle_timeout=None):
+    """Change the connection timeouts for servers created afterwards"""
+    global HANDSHAKE_TIMEOUT, READ_TIMEOUT, IDLE_TIMEOUT
+    if handshake_timeout is not None:
+        HANDSHAKE_TIMEOUT = handshake_timeout
+    if read_timeout is not None:
+        READ_TIMEOUT = read_timeout
+    if idle_timeout is not None:
+        IDLE_TIMEOUT = idle_timeout
+
+class StreamWindow:
+    """Frames a client is ready for on one streamed response (credit-based flow control)"""
+    def __init__(self, window):
+        self.credit = threading.Semaphore(window)
+        self.cancelled = False
+    
+    def grant(self, frames):
+        if frames > 0:
+            self.credit.release(frames)
+    
+    def cancel(self):
+        self.cancelled = True
+        self.credit.release()
+    
+    def wait(self, timeout):
+        """True once the next frame may be sent; False if cancelled or no credit came in time"""
+        return self.credit.acquire(timeout=timeout) and not self.cancelled
+
+class TornResponse(Exception):
+    """A response's data failed after part of its single message was already sent"""
 
 class EnhancedSocketServer:
     def __init__(self, host='0.0.0.0', control_port=5000, data_port=5001, use_ssl=False):
@@ -26,12 +97,80 @@ class EnhancedSocketServer:
         # SSL contexts
         self.ssl_context = None
         
-        # Connection lists
-        self.control_connections = []
-        self.data_connections = []
+        # Several processes may listen on the same ports (the kernel spreads
+        # connections between them); see cluster.py
+        self.reuse_port = False
+        
+        # Open connections by connection id
+        self.control_connections = {}
+        self.data_connections = {}
+        self.connection_ids = itertools.count(1)
         
-        # Message handlers
+        # Handshake, partial-message and idle deadlines of every connection;
+        # the reaper thread shuts down connections whose deadline passes
+        self.timers = TimerWheel()
+        self.handshake_timeout = HANDSHAKE_TIMEOUT
+        self.read_timeout = READ_TIMEOUT
+        self.idle_timeout = IDLE_TIMEOUT
+        self.stream_timeout = STREAM_TIMEOUT
+        
+        # Message handlers, their execution class and bounded queue of pending calls
         self.message_handlers = {}
+        self.handler_execution = {}
+        self.handler_queue_size = {}
+        self.handler_pending = {}
+        self.pending_lock = threading.Lock()
+        # Commands whose list responses go out in several frames on the data channel
+        self.streamed = set()
+        # Flow-control messages pace responses the client has already paid for:
+        # they spend no rate-limit tokens and are never answered
+        self.flow_control = {MessageType.STREAM_CREDIT}
+        self.message_handlers[MessageType.STREAM_CREDIT] = self.handle_stream_credit
+        self.handler_execution[MessageType.STREAM_CREDIT] = INLINE
+        self.pools = {}
+        self.pools_lock = threading.Lock()
+        # Open flow-controlled streams in total and by source IP
+        self.max_streams_per_connection = MAX_STREAMS_PER_CONNECTION
+        self.max_streams_per_ip = MAX_STREAMS_PER_IP
+        self.open_streams = 0
+        self.streams_by_ip = {}
+        self.streams_lock = threading.Lock()
+        
+        # Per-command histograms, counters and gauges
+        self.metrics = ServerMetrics()
+        self.in_flight = 0
+        self.in_flight_lock = threading.Lock()
+        self.metrics.register_gauge("control_connections", lambda: len(self.control_connections))
+        self.metrics.register_gauge("data_connections", lambda: len(self.data_connections))
+        self.metrics.register_gauge("handlers_in_flight", lambda: self.in_flight)
+        self.metrics.register_gauge("open_streams", lambda: self.open_streams)
+        self.metrics.register_gauge("threads", threading.active_count)
+        self.metrics.register_gauge("connection_deadlines", lambda: len(self.timers))
+        self.metrics.register_gauge("event_log_queued", lambda: event_log.EVENTS.stats()["queued"])
+        self.metrics.register_gauge("event_log_dropped", lambda: event_log.EVENTS.stats()["dropped"])
+        self.metrics.register_gauge("event_log_write_errors", lambda: event_log.EVENTS.stats()["write_errors"])
+        self.metrics.register_gauge("storage_pending_files", lambda: storage.stats()["pending_files"])
+        self.metrics.register_gauge("storage_commits", lambda: storage.stats()["commits"])
+        self.metrics.register_gauge("storage_fsyncs", lambda: storage.stats()["fsyncs"])
+        self.metrics.register_gauge("storage_errors", lambda: storage.stats()["errors"])
+        self.metrics.register_gauge("storage_failing_files", lambda: storage.stats()["failing_files"])
+        self.metrics.register_gauge("storage_last_commit_ms", lambda: storage.stats()["last_commit_ms"])
+        
+        # Token-bucket limits per connection, per source IP and per command;
+        # over-limit messages get limited_response() instead of their handler
+        self.rate_limiting = True
+        self.ip_limiter = rate_limit.RateLimiter(rate_limit.IP_RATE, rate_limit.IP_BURST)
+        self.command_limiters = {}
+        self.metrics.register_gauge("rate_limit_tracked_ips", lambda: len(self.ip_limiter))
+        
+        # Connection caps checked right after accept(), and the listen backlog
+        self.admission = admission.AdmissionControl()
+        self.backlog = admission.BACKLOG
+        self.metrics.register_gauge("connections_open", lambda: self.admission.open)
+        self.metrics.register_gauge("accept_queue_control", lambda: self.accept_queue_length(self.control_socket))
+        self.metrics.register_gauge("accept_queue_data", lambda: self.accept_queue_length(self.data_socket))
+        self.metrics.register_gauge("listen_overflows", lambda: admission.listen_overflows().get("ListenOverflows", 0))
+        self.metrics.register_gauge("listen_drops", lambda: admission.listen_overflows().get("ListenDrops", 0))
         
         # Active status (for graceful termination)
         self.active = False
@@ -55,22 +194,79 @@ class EnhancedSocketServer:
             self.data_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.data_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             
+            if self.reuse_port:
+                self.control_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                self.data_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            
             # Bind sockets
+            # The kernel silently caps the backlog at net.core.somaxconn
             self.control_socket.bind((self.host, self.control_port))
-            self.control_socket.listen(5)
+            self.control_socket.listen(self.backlog)
             
             self.data_socket.bind((self.host, self.data_port))
-            self.data_socket.listen(5)
+            self.data_socket.listen(self.backlog)
             
             return True
         
         except socket.error as e:
-            print(f"[-] Socket bind error: {e}")
+            event_log.emit("ops", "bind_error", f"[-] Socket bind error: {e}", level="error", error=str(e))
             return False
     
-    def register_handler(self, command, handler_function):
-        """Register a function to handle a specific command"""
+    def accept_queue_length(self, sock):
+        """Connections waiting in a listening socket's accept queue (0 if unknown)"""
+        queue = admission.accept_queue(sock)
+        return queue[0] if queue else 0
+    
+    def register_handler(self, command, handler_function, execution=INLINE, queue_size=DEFAULT_QUEUE_SIZE,
+                         rate=None, stream=False):
+        """
+        Register a function to handle a specific command.
+        execution: "inline" runs on the connection thread; "thread" and "process"
+        run on shared pools so the connection keeps reading (a keep-alive never
+        waits behind a slow ban). Process handlers must be module-level functions
+        and receive only the address and channel of the connection.
+        queue_size: calls of this command allowed to be pending on the pool;
+        further calls are rejected with a "Server busy" error.
+        rate: optional (per second, burst) limit on this command per source IP,
+        on top of the connection and IP limits.
+        stream: on the data channel, send a long 'data' list in partial frames
+        (protocol.stream_frames) instead of one message.
+        """
+        if execution not in EXECUTION_CLASSES:
+            raise ValueError(f"Unknown execution class: {execution}")
         self.message_handlers[command] = handler_function
+        self.handler_execution[command] = execution
+        if rate:
+            self.command_limiters[command] = rate_limit.RateLimiter(*rate)
+        if stream:
+            self.streamed.add(command)
+        if execution != INLINE:
+            self.handler_queue_size[command] = queue_size
+            with self.pending_lock:
+                self.handler_pending.setdefault(command, 0)
+            self.metrics.register_gauge(f"handler_queue_{command}", lambda: self.handler_pending.get(command, 0))
+            self.metrics.register_gauge(f"pool_{execution}_pending", lambda: self.pool_pending(execution))
+    
+    def pool_pending(self, execution):
+        """Calls queued or running on one pool"""
+        with self.pending_lock:
+            return sum(n for c, n in self.handler_pending.items() if self.handler_execution.get(c) == execution)
+    
+    def get_pool(self, execution):
+        """Create the handler thread pool, process pool or stream pool on first use"""
+        with self.pools_lock:
+            pool = self.pools.get(execution)
+            if pool is None:
+                if execution == THREAD:
+                    pool = ThreadPoolExecutor(max_workers=THREAD_WORKERS, thread_name_prefix="handler")
+                elif execution == STREAM:
+                    pool = ThreadPoolExecutor(max_workers=STREAM_WORKERS, thread_name_prefix="stream")
+                else:
+                    # spawn: forking a process that already runs threads can copy held locks
+                    pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS,
+                                               mp_context=multiprocessing.get_context("spawn"))
+                self.pools[execution] = pool
+            return pool
     
     def start(self):
         """Start the server with retry mechanism"""
@@ -87,24 +283,29 @@ class EnhancedSocketServer:
                 data_thread = threading.Thread(target=self.accept_connections, 
                                             args=(self.data_socket, self.data_connections, "data"))
                 
+                reaper_thread = threading.Thread(target=self.reap_connections)
+                
                 control_thread.daemon = True
                 data_thread.daemon = True
+                reaper_thread.daemon = True
                 
                 control_thread.start()
                 data_thread.start()
+                reaper_thread.start()
                 
                 return True
             
             # Failed to bind, wait and retry
             retry_count += 1
             backoff_time = 2 ** retry_count  # Exponential backoff
-            print(f"[-] Retry {retry_count}/{max_retries} in {backoff_time} seconds...")
+            event_log.emit("ops", "bind_retry", f"[-] Retry {retry_count}/{max_retries} in {backoff_time} seconds...",
+                           level="warning", retry=retry_count, backoff=backoff_time)
             time.sleep(backoff_time)
         
-        print("[-] Failed to start server after multiple retries")
+        event_log.emit("ops", "start_failed", "[-] Failed to start server after multiple retries", level="error")
         return False
     
-    def accept_connections(self, sock, connection_list, channel_type):
+    def accept_connections(self, sock, connections, channel_type):
         """Accept incoming connections on the specified socket"""
         while self.active:
             try:
@@ -113,33 +314,60 @@ class EnhancedSocketServer:
                 try:
                     client_socket, client_address = sock.accept()
                     
-                    # Wrap with SSL if needed
+                    # Admission before anything is allocated for the connection
+                    refused = self.admission.admit(client_address[0])
+                    if refused:
+                        self.admission.refuse(client_socket)
+                        self.metrics.increment("connections_rejected_total")
+                        self.metrics.increment(f"connections_rejected_{refused}_total")
+                        continue
+                    
+                    # Wrap with SSL if needed; the handshake itself runs on the
+                    # connection's thread, so a stalled one never holds up accept()
                     if self.use_ssl:
                         try:
-                            client_socket = self.ssl_context.wrap_socket(client_socket, server_side=True)
-                        except ssl.SSLError:
+                            client_socket = self.ssl_context.wrap_socket(client_socket, server_side=True,
+                                                                         do_handshake_on_connect=False)
+                        except OSError:
                             client_socket.close()
+                            self.admission.release(client_address[0])
                             continue
                 
                 except socket.timeout:
                     continue
                 except Exception:
                     if self.active:
-                        print("[-] Error accepting connection")
+                        event_log.emit("ops", "accept_error", "[-] Error accepting connection", level="error",
+                                       channel=channel_type)
                     continue
                 
                 sock.settimeout(None)
                 
-                print(f"[+] New {channel_type} connection from {client_address[0]}:{client_address[1]}")
+                event_log.emit("ops", "connection_opened",
+                               f"[+] New {channel_type} connection from {client_address[0]}:{client_address[1]}",
+                               channel=channel_type, ip=client_address[0], client_port=client_address[1])
                 
-                # Add to connection list
+                # Register the connection
                 connection_info = {
+                    'id': next(self.connection_ids),
                     'socket': client_socket,
                     'address': client_address,
                     'channel': channel_type,
-                    'last_activity': time.time()
+                    'last_activity': time.time(),
+                    # Pool workers and the connection thread may respond concurrently
+                    'send_lock': threading.Lock(),
+                    'rate_bucket': rate_limit.TokenBucket(rate_limit.CONNECTION_RATE, rate_limit.CONNECTION_BURST),
+                    # Counted by admission control until close_connection releases it
+                    'admitted': True,
+                    # Flow-controlled responses being streamed, by request id
+                    'streams': {}
                 }
-                connection_list.append(connection_info)
+                connections[connection_info['id']] = connection_info
+                self.metrics.increment("connections_accepted_total")
+                if self.use_ssl:
+                    self.set_deadline(connection_info, self.handshake_timeout, "handshake")
+                else:
+                    self.set_deadline(connection_info, self.idle_timeout, "idle")
                 
                 # Start a thread to handle client messages
                 client_thread = threading.Thread(target=self.handle_client_messages, 
@@ -161,7 +389,16 @@ class EnhancedSocketServer:
     def handle_client_messages(self, connection_info):
         """Handle messages from a client"""
         client_socket = connection_info['socket']
-        channel = connection_info['channel']
+        # Reused for every read; holds the bytes of a message still being received
+        receive = ReceiveBuffer()
+        
+        try:
+            if self.use_ssl:
+                client_socket.do_handshake()
+                self.set_deadline(connection_info, self.idle_timeout, "idle")
+        except (OSError, ValueError):
+            self.close_connection(connection_info)
+            return
         
         while self.active:
             try:
@@ -170,38 +407,33 @@ class EnhancedSocketServer:
                 
                 if ready[0]:
                     # Socket has data to read
-                    data = client_socket.recv(4096)
-                    
-                    if not data:
-                        # Client disconnected
+                    partial = len(receive) > 0
+                    if not receive.recv_into(client_socket):
+                        # Client disconnected (or the reaper shut the connection down)
                         self.close_connection(connection_info)
                         break
                     
-                    # Update last activity time
-                    connection_info['last_activity'] = time.time()
+                    messages = receive.messages()
+                    rest = len(receive)
+                    if rest > MAX_MESSAGE_SIZE:
+                        self.shed(connection_info, "oversized")
+                        self.close_connection(connection_info)
+                        break
                     
-                    # Try to parse JSON message
-                    try:
-                        message_str = data.decode('utf-8')
-                        
-                        message = json.loads(message_str)
-                        
-                        # Extract command and handle it
-                        command = message.get('command')
-                        
-                        if command in self.message_handlers:
-                            response = self.message_handlers[command](message, connection_info)
-                            if response:
-                                # Send response back to client
-                                self.send_message(client_socket, response)
-                        else:
-                            # Unknown command
-                            response = {'status': 'error', 'message': f"Unknown command: {command}"}
-                            self.send_message(client_socket, response)
+                    # Each message is parsed here, before the next read reuses the buffer
+                    received = False
+                    for message in messages:
+                        received = True
+                        self.dispatch(message, connection_info)
+                    if received:
+                        connection_info['last_activity'] = time.time()
                     
-                    except json.JSONDecodeError:
-                        response = {'status': 'error', 'message': "Invalid request format"}
-                        self.send_message(client_socket, response)
+                    # A message's deadline runs from its first bytes, so dribbling
+                    # one byte at a time does not keep a connection open
+                    if rest and (not partial or received):
+                        self.set_deadline(connection_info, self.read_timeout, "read")
+                    elif not rest and (partial or received):
+                        self.set_deadline(connection_info, self.idle_timeout, "idle")
             
             except ConnectionError:
                 self.close_connection(connection_info)
@@ -215,21 +447,355 @@ class EnhancedSocketServer:
                 self.close_connection(connection_info)
                 break
     
+    def dispatch(self, data, connection_info):
+        """Parse one message (bytes or a view of the receive buffer) and run its handler inline or on its pool"""
+        started = time.perf_counter()
+        
+        # Try to parse JSON message
+        try:
+            message = json.loads(str(data, 'utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            message = None
+        
+        command = message.get('command') if isinstance(message, dict) else None
+        if command in self.flow_control:
+            # Credits for an open stream are exempt from every limit, or a long stream would
+            # stall once the burst is spent. Any other credit pays like other messages.
+            if (self.open_stream(message, connection_info) is None and self.rate_limiting
+                    and (self.rate_limited(connection_info) is not None
+                         or self.command_limited(command, connection_info) is not None)):
+                # Never answered: an over-limit reply without an id would be misread
+                self.metrics.observe("rate_limited", time.perf_counter() - started, len(data), 0, True)
+                return
+            self.run_handler(command, self.message_handlers[command], message, connection_info,
+                             started, len(data))
+            return
+        
+        # Connection and IP tokens are spent next: garbage and unknown commands count too
+        limited = self.rate_limiting and self.rate_limited(connection_info) is not None
+        if not isinstance(message, dict):
+            if limited:
+                self.finish_limited(None, None, {}, connection_info, started, len(data))
+                return
+            response = {'status': 'error', 'message': "Invalid request format"}
+            self.finish(None, "invalid", response, connection_info, started, len(data), error=True)
+            return
+        
+        # Extract command and handle it
+        message_id = message.get('id')
+        handler = self.message_handlers.get(command)
+        if limited or (self.rate_limiting and handler is not None
+                       and self.command_limited(command, connection_info) is not None):
+            self.finish_limited(message_id, command, message, connection_info, started, len(data))
+            return
+        
+        if handler is None:
+            # Unknown and malformed commands share a label so clients can't create metrics
+            response = {'status': 'error', 'message': f"Unknown command: {command}"}
+            self.finish(message_id, "unknown", response, connection_info, started, len(data), error=True)
+            return
+        
+        execution = self.handler_execution.get(command, INLINE)
+        if execution == INLINE:
+            self.run_handler(command, handler, message, connection_info, started, len(data))
+            return
+        
+        # Bounded queue per command: reject instead of piling up work
+        with self.pending_lock:
+            if self.handler_pending[command] >= self.handler_queue_size[command]:
+                full = True
+            else:
+                full = False
+                self.handler_pending[command] += 1
+        if full:
+            self.metrics.increment("handler_rejected_total")
+            response = {'status': 'error', 'message': 'Server busy, try again'}
+            self.finish(message_id, command, response, connection_info, started, len(data), error=True)
+            return
+        
+        try:
+            pool = self.get_pool(execution)
+            if execution == THREAD:
+                future = pool.submit(self.run_handler, command, handler, message, connection_info,
+                                     started, len(data), True)
+            else:
+                peer = {'address': connection_info['address'], 'channel': connection_info['channel']}
+                future = pool.submit(handler, message, peer)
+                future.add_done_callback(lambda f: self.finish_process(
+                    f, command, message_id, connection_info, started, len(data)))
+            future.add_done_callback(lambda f: self.release(command))
+        except RuntimeError:
+            # Pool shut down while stopping
+            self.release(command)
+    
+    def rate_limited(self, connection_info):
+        """Spend a message's connection and IP tokens; returns the exceeded scope or None"""
+        now = time.monotonic()
+        ip = connection_info['address'][0]
+        result, scope = "ok", None
+        bucket = connection_info.get('rate_bucket')
+        if bucket is not None:
+            result, scope = rate_limit.check_bucket(bucket, now), "connection"
+        if result == "ok":
+            result, scope = self.ip_limiter.check(ip, now), "ip"
+        return self.count_limited(result, scope, ip)
+    
+    def command_limited(self, command, connection_info):
+        """Spend a token from the command's per-IP bucket, if it has one; returns "command" or None"""
+        limiter = self.command_limiters.get(command)
+        if limiter is None:
+            return None
+        ip = connection_info['address'][0]
+        return self.count_limited(limiter.check(ip, time.monotonic()), "command", ip, command)
+    
+    def count_limited(self, result, scope, ip, command=None):
+        if result == "ok":
+            return None
+        self.metrics.increment("rate_limited_total")
+        self.metrics.increment(f"rate_limited_{scope}_total")
+        if result == "limited":
+            # Once per burst of over-limit traffic, not per message
+            detail = f" ({command})" if command else ""
+            event_log.emit("attacker", "rate_limited", f"[-] {ip} exceeded the {scope} rate limit{detail}",
+                           level="warning", ip=ip, scope=scope, command=command)
+        return scope
+    
+    def finish_limited(self, message_id, command, message, connection_info, started, bytes_in):
+        """Answer an over-limit message without running any handler"""
+        response = self.limited_response(command, message, connection_info)
+        error = bool(response) and response.get('status') == 'error'
+        self.finish(message_id, "rate_limited", response, connection_info, started, bytes_in, error)
+    
+    def limited_response(self, command, message, connection_info):
+        """Response to a message over its rate limit (the application may replace this)"""
+        return {'status': 'error', 'message': 'Rate limit exceeded'}
+    
+    def release(self, command):
+        with self.pending_lock:
+            self.handler_pending[command] -= 1
+    
+    def run_handler(self, command, handler, message, connection_info, started, bytes_in, pooled=False):
+        """Run a handler on the current thread and send its response"""
+        response = None
+        with self.in_flight_lock:
+            self.in_flight += 1
+        try:
+            response = handler(message, connection_info)
+        except Exception as e:
+            if not pooled:
+                self.metrics.observe(command, time.perf_counter() - started, bytes_in, 0, True)
+                raise
+            # Nobody above a pool worker would close the connection: report it instead
+            event_log.emit("ops", "handler_error", f"[-] Error handling {command}: {e}",
+                           level="error", command=command, error=str(e))
+            response = {'status': 'error', 'message': 'Internal server error'}
+        finally:
+            with self.in_flight_lock:
+                self.in_flight -= 1
+        
+        error = bool(response) and response.get('status') == 'error'
+        self.finish(message.get('id'), command, response, connection_info, started, bytes_in, error,
+                    window=message.get('window'))
+    
+    def finish_process(self, future, command, message_id, connection_info, started, bytes_in):
+        """Send the result of a process pool handler"""
+        try:
+            response = future.result()
+        except Exception as e:
+            event_log.emit("ops", "handler_error", f"[-] Error handling {command}: {e}",
+                           level="error", command=command, error=str(e))
+            response = {'status': 'error', 'message': 'Internal server error'}
+        error = bool(response) and response.get('status') == 'error'
+        self.finish(message_id, command, response, connection_info, started, bytes_in, error)
+    
+    def finish(self, message_id, label, response, connection_info, started, bytes_in, error, window=None):
+        """
+        Send a response (echoing the request id) and record per-command metrics.
+        A 'data' iterator is encoded as it is consumed: in frames (paced by the
+        client's window, if it sent one) on the data channel, otherwise as one
+        message written in pieces. If the iterator raises, the response ends
+        with an error frame. A windowed stream is sent from the stream pool.
+        """
+        bytes_out = 0
+        if response:
+            if message_id is not None:
+                response = dict(response, id=message_id)
+            data = response.get('data')
+            framed = (label in self.streamed and connection_info['channel'] == 'data'
+                      and isinstance(data, (list, Iterator)))
+            if (framed and isinstance(message_id, (str, int)) and isinstance(window, int)
+                    and window > 0):
+                # Paced by credits on the stream pool, which records the metrics
+                self.start_stream(message_id, label, response, connection_info, started, bytes_in,
+                                  error, min(window, MAX_STREAM_WINDOW))
+                return
+            bytes_out, failed = self.send_response(message_id, label, response, connection_info, framed)
+            error = error or failed
+        self.metrics.observe(label, time.perf_counter() - started, bytes_in, bytes_out, error)
+    
+    def send_response(self, message_id, label, response, connection_info, framed, stream=None):
+        """Send a response in frames, in pieces or whole; returns (bytes sent, whether it failed)"""
+        data = response.get('data')
+        bytes_out = 0
+        try:
+            if framed:
+                bytes_out = self.respond_frames(connection_info, stream_frames(response), stream)
+            elif isinstance(data, Iterator):
+                bytes_out = self.respond_chunks(connection_info, encode_chunks(response))
+            else:
+                bytes_out = self.respond(connection_info, response)
+        except Exception as e:
+            # The handler returned, but reading its records failed part-way
+            event_log.emit("ops", "handler_error", f"[-] Error handling {label}: {e}",
+                           level="error", command=label, error=str(e))
+            if isinstance(e, TornResponse):
+                # Half a message is on the wire: only closing the connection tells the client
+                self.close_connection(connection_info)
+            else:
+                failure = {'status': 'error', 'message': 'Internal server error'}
+                if message_id is not None:
+                    failure['id'] = message_id
+                bytes_out += self.respond(connection_info, failure)
+            return bytes_out, True
+        return bytes_out, False
+    
+    def start_stream(self, message_id, label, response, connection_info, started, bytes_in, error, window):
+        """Hand a flow-controlled response to the stream pool, if its connection and IP have room"""
+        stream = self.open_window(connection_info, message_id, window)
+        if stream is None:
+            self.metrics.increment("streams_rejected_total")
+            busy = {'status': 'error', 'message': 'Too many open streams', 'id': message_id}
+            self.metrics.observe(label, time.perf_counter() - started, bytes_in,
+                                 self.respond(connection_info, busy), True)
+            return
+        try:
+            self.get_pool(STREAM).submit(self.send_stream, stream, message_id, label, response,
+                                         connection_info, started, bytes_in, error)
+        except RuntimeError:
+            # Pool shut down while stopping
+            self.close_window(connection_info, message_id)
+    
+    def send_stream(self, stream, message_id, label, response, connection_info, started, bytes_in, error):
+        """Send a flow-controlled response on a stream pool worker, then close its window"""
+        try:
+            bytes_out, failed = self.send_response(message_id, label, response, connection_info, True, stream)
+        finally:
+            self.close_window(connection_info, message_id)
+        self.metrics.observe(label, time.perf_counter() - started, bytes_in, bytes_out, error or failed)
+    
+    def open_window(self, connection_info, stream_id, window):
+        """Register a flow-controlled stream; None if its connection or IP has too many open"""
+        ip = connection_info['address'][0]
+        streams = connection_info['streams']
+        with self.streams_lock:
+            if (stream_id in streams or len(streams) >= self.max_streams_per_connection
+                    or self.streams_by_ip.get(ip, 0) >= self.max_streams_per_ip):
+                return None
+            stream = streams[stream_id] = StreamWindow(window)
+            self.streams_by_ip[ip] = self.streams_by_ip.get(ip, 0) + 1
+            self.open_streams += 1
+        return stream
+    
+    def close_window(self, connection_info, stream_id):
+        ip = connection_info['address'][0]
+        with self.streams_lock:
+            if connection_info['streams'].pop(stream_id, None) is None:
+                return
+            self.open_streams -= 1
+            if self.streams_by_ip[ip] > 1:
+                self.streams_by_ip[ip] -= 1
+            else:
+                del self.streams_by_ip[ip]
+    
+    def respond(self, connection_info, message):
+        """Send a message on a connection, serialized with other senders"""
+        lock = connection_info.get('send_lock')
+        if lock is None:
+            return self.send_message(connection_info['socket'], message)
+        with lock:
+            return self.send_message(connection_info['socket'], message)
+    
+    def respond_frames(self, connection_info, frames, stream=None):
+        """
+        Send a response frame by frame; other responses may go out in between.
+        With a stream window, each frame waits for the client's credit for it.
+        """
+        bytes_out = 0
+        for frame in frames:
+            if stream is not None and not stream.wait(self.stream_timeout):
+                self.metrics.increment("streams_cancelled_total" if stream.cancelled
+                                       else "streams_stalled_total")
+                break
+            sent = self.respond(connection_info, frame)
+            if not sent:
+                break
+            bytes_out += sent
+        return bytes_out
+    
+    def respond_chunks(self, connection_info, chunks):
+        """Send one message encoded in pieces, serialized with other senders"""
+        lock = connection_info.get('send_lock')
+        if lock is None:
+            return self.send_chunks(connection_info['socket'], chunks)
+        with lock:
+            return self.send_chunks(connection_info['socket'], chunks)
+    
+    def handle_stream_credit(self, message, connection_info):
+        """A client consumed frames of a streamed response (or wants no more)"""
+        stream = self.open_stream(message, connection_info)
+        if stream is not None:
+            params = message['params']
+            if params.get('cancel'):
+                stream.cancel()
+            else:
+                frames = params.get('frames', 1)
+                stream.grant(min(frames, MAX_STREAM_WINDOW) if isinstance(frames, int) else 1)
+        # No response: credits would otherwise double the traffic they pace
+        return None
+    
+    def open_stream(self, message, connection_info):
+        """The open stream a flow-control message names, or None"""
+        params = message.get('params')
+        stream_id = params.get('stream') if isinstance(params, dict) else None
+        if not isinstance(stream_id, (str, int)):
+            return None
+        return connection_info.get('streams', {}).get(stream_id)
+    
     def send_message(self, client_socket, message):
-        """Send a JSON message to a client"""
+        """Send a JSON message to a client; returns the number of bytes sent (0 on failure)"""
         try:
-            response_data = json.dumps(message).encode('utf-8')
+            response_data = encode_message(message)
             client_socket.sendall(response_data)
-            return True
+            return len(response_data)
         except Exception:
-            return False
+            return 0
+    
+    def send_chunks(self, client_socket, chunks):
+        """
+        Send a message encoded in pieces; returns the number of bytes sent (0 on failure).
+        An error producing a piece is raised (as TornResponse once a piece has been sent).
+        """
+        sent = 0
+        chunks = iter(chunks)
+        while True:
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return sent
+            except Exception as e:
+                if sent:
+                    raise TornResponse(str(e)) from e
+                raise
+            try:
+                client_socket.sendall(chunk)
+            except Exception:
+                return 0
+            sent += len(chunk)
     
     def broadcast_control_message(self, message):
         """Broadcast a message to all control channel clients"""
-        for conn in self.control_connections[:]:
-            try:
-                self.send_message(conn['socket'], message)
-            except:
+        for conn in list(self.control_connections.values()):
+            if not self.respond(conn, message):
                 # If failed, remove the connection
                 self.close_connection(conn)
     
@@ -240,27 +806,59 @@ class EnhancedSocketServer:
         except:
             pass
         
-        # Remove from the appropriate connection list
-        if connection_info['channel'] == 'control':
-            if connection_info in self.control_connections:
-                self.control_connections.remove(connection_info)
-        else:
-            if connection_info in self.data_connections:
-                self.data_connections.remove(connection_info)
-    
-    def check_inactive_connections(self, timeout=300):
-        """Check for and close inactive connections"""
-        current_time = time.time()
+        # pop() is atomic, so a connection closed from two threads is released once
+        if connection_info.pop('admitted', False):
+            self.admission.release(connection_info['address'][0])
         
-        # Check control connections
-        for conn in self.control_connections[:]:
-            if current_time - conn['last_activity'] > timeout:
-                self.close_connection(conn)
+        # Streams waiting for credit stop now instead of at their timeout
+        for stream in list(connection_info.get('streams', {}).values()):
+            stream.cancel()
         
-        # Check data connections
-        for conn in self.data_connections[:]:
-            if current_time - conn['last_activity'] > timeout:
-                self.close_connection(conn)
+        # Remove from the appropriate registry
+        connections = self.control_connections if connection_info['channel'] == 'control' else self.data_connections
+        self.timers.cancel(connection_info['id'])
+        if connections.pop(connection_info['id'], None) is not None:
+            self.metrics.increment("connections_closed_total")
+            address = connection_info['address']
+            event_log.emit("ops", "connection_closed", channel=connection_info['channel'],
+                           ip=address[0], client_port=address[1])
+    
+    # ----------------------
+    # ⏱️ Connection Deadlines
+    # ----------------------
+    def set_deadline(self, connection_info, seconds, reason):
+        """Replace a connection's deadline (0 seconds means none)"""
+        if seconds:
+            self.timers.schedule(connection_info['id'], time.monotonic() + seconds, reason)
+        else:
+            self.timers.cancel(connection_info['id'])
+    
+    def reap_connections(self):
+        """Shut down connections whose deadline has passed, once per wheel tick"""
+        while self.active:
+            time.sleep(self.timers.tick)
+            for connection_id, reason in self.timers.expire():
+                conn = self.control_connections.get(connection_id) or self.data_connections.get(connection_id)
+                if conn is not None:
+                    self.shed(conn, reason)
+    
+    def shed(self, connection_info, reason):
+        """Drop a slow, idle or misbehaving connection"""
+        ip, port = connection_info['address']
+        self.metrics.increment("connections_shed_total")
+        self.metrics.increment(f"connections_shed_{reason}_total")
+        if reason == "idle":
+            event_log.emit("ops", "connection_idle", channel=connection_info['channel'], ip=ip, client_port=port)
+        else:
+            # Stalled handshakes, messages that never complete, oversized messages
+            event_log.emit("attacker", "slow_client" if reason != "oversized" else "oversized_message",
+                           f"[-] Dropped {connection_info['channel']} connection from {ip}:{port} ({reason})",
+                           level="warning", ip=ip, client_port=port, reason=reason)
+        # Wakes the connection's thread, which closes it; safe to call more than once
+        try:
+            connection_info['socket'].shutdown(socket.SHUT_RDWR)
+        except (OSError, ValueError):
+            self.close_connection(connection_info)
     
     def signal_handler(self, sig, frame):
         """Handle termination signals for graceful shutdown"""
@@ -272,10 +870,10 @@ class EnhancedSocketServer:
         self.active = False
         
         # Close all client connections
-        for conn in self.control_connections[:]:
+        for conn in list(self.control_connections.values()):
             self.close_connection(conn)
         
-        for conn in self.data_connections[:]:
+        for conn in list(self.data_connections.values()):
             self.close_connection(conn)
         
         # Close server sockets
@@ -291,4 +889,11 @@ class EnhancedSocketServer:
             except:
                 pass
         
+        # Stop handler pools without waiting for queued work
+        with self.pools_lock:
+            pools = list(self.pools.values())
+            self.pools = {}
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+        
         print("[*] Server shutdown complete")
\ No newline at end of file
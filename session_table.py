@@ -0,0 +1,166 @@
+# ===============================
+# 🪪 HoneyTrap Session Table
+# ===============================
+# In-memory table of logged-in sessions, keyed by session id, with secondary
+# indexes by username, IP and port. One user can hold several sessions
+# (different hosts or ports). Lookups by id are O(1); per-user, per-IP and
+# per-port queries cost O(result) instead of a scan of every session.
+#
+# sessions.json is the table's checkpoint:
+#   {"<sid>": {"username": ..., "ip": ..., "port": ..., "login_time": ...,
+#              "last_activity_time": ...}}
+# Files from older versions ({"<username>": {...}}) are converted on load.
+
+import base64
+import os
+import threading
+import time
+
+def new_session_id():
+    return base64.urlsafe_b64encode(os.urandom(12)).decode("ascii")
+
+def _port_key(port):
+    return str(port)
+
+class Session:
+    """One login; slotted, since the table may hold many thousands"""
+    __slots__ = ("sid", "username", "ip", "port", "login_time", "last_seen")
+
+    def __init__(self, sid, username, ip, port, login_time, last_seen):
+        self.sid = sid
+        self.username = username
+        self.ip = ip
+        self.port = port
+        self.login_time = login_time
+        self.last_seen = last_seen
+
+    def to_json(self):
+        return {
+            "username": self.username,
+            "ip": self.ip,
+            "port": self.port,
+            "login_time": self.login_time,
+            "last_activity_time": self.last_seen
+        }
+
+class SessionTable:
+    """Sessions by id plus username/IP/port indexes, all kept in step"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_id = {}
+        self.by_user = {}
+        self.by_ip = {}
+        self.by_port = {}
+        # Keep-alives since the last checkpoint
+        self.activity_dirty = False
+
+    def __len__(self):
+        return len(self.by_id)
+
+    # ----------------------
+    # ✏️ Changes
+    # ----------------------
+    def _index(self, index, key, sid):
+        index.setdefault(key, set()).add(sid)
+
+    def _unindex(self, index, key, sid):
+        sids = index.get(key)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del index[key]
+
+    def add(self, username, ip, port, now=None, sid=None):
+        """Open a session; returns it"""
+        now = time.time() if now is None else now
+        session = Session(sid or new_session_id(), username, ip, port, now, now)
+        with self.lock:
+            self.by_id[session.sid] = session
+            self._index(self.by_user, username, session.sid)
+            self._index(self.by_ip, ip, session.sid)
+            self._index(self.by_port, _port_key(port), session.sid)
+        return session
+
+    def remove(self, sid):
+        """Close a session; returns it, or None if it doesn't exist"""
+        with self.lock:
+            session = self.by_id.pop(sid, None)
+            if session is not None:
+                self._unindex(self.by_user, session.username, sid)
+                self._unindex(self.by_ip, session.ip, sid)
+                self._unindex(self.by_port, _port_key(session.port), sid)
+            return session
+
+    def touch(self, sid, now=None):
+        """Record a keep-alive (O(1)); False if the session doesn't exist"""
+        session = self.by_id.get(sid)
+        if session is None:
+            return False
+        session.last_seen = time.time() if now is None else now
+        self.activity_dirty = True
+        return True
+
+    # ----------------------
+    # 🔎 Queries
+    # ----------------------
+    def get(self, sid):
+        return self.by_id.get(sid)
+
+    def _lookup(self, index, key):
+        with self.lock:
+            return [self.by_id[sid] for sid in index.get(key, ())]
+
+    def for_user(self, username):
+        return self._lookup(self.by_user, username)
+
+    def for_ip(self, ip):
+        return self._lookup(self.by_ip, ip)
+
+    def for_port(self, port):
+        return self._lookup(self.by_port, _port_key(port))
+
+    def all(self):
+        with self.lock:
+            return list(self.by_id.values())
+
+    # ----------------------
+    # 💾 Checkpoint
+    # ----------------------
+    def to_json(self):
+        with self.lock:
+            self.activity_dirty = False
+            return {sid: s.to_json() for sid, s in self.by_id.items()}
+
+    def load(self, data):
+        """Replace the contents from a sessions.json table; returns legacy entries converted"""
+        with self.lock:
+            self.by_id.clear()
+            self.by_user.clear()
+            self.by_ip.clear()
+            self.by_port.clear()
+        converted = 0
+        for key, record in (data or {}).items():
+            if "username" in record:
+                sid, username = key, record["username"]
+            else:
+                # Old format: keyed by username, one session per user
+                sid, username = None, key
+                converted += 1
+            session = self.add(username, record.get("ip"), record.get("port", "unknown"),
+                               now=record.get("login_time"), sid=sid)
+            session.last_seen = record.get("last_activity_time", session.login_time)
+        self.activity_dirty = False
+        return converted
+
+    def merge(self, data):
+        """Replace the contents from a table another process saved, keeping newer keep-alives seen here"""
+        with self.lock:
+            seen = {sid: s.last_seen for sid, s in self.by_id.items()}
+        dirty = self.activity_dirty
+        self.load(data)
+        for sid, last_seen in seen.items():
+            session = self.by_id.get(sid)
+            if session is not None and last_seen > session.last_seen:
+                session.last_seen = last_seen
+                dirty = True
+        self.activity_dirty = dirty
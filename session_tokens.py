@@ -0,0 +1,97 @@
+# ===============================
+# 🎟️ HoneyTrap Session Tokens
+# ===============================
+# Login hands the client an HMAC-signed token naming its session. The server
+# checks a token with one HMAC and no table lookup, so keep-alives never
+# touch the session file.
+#
+#   <base64url payload>.<base64url HMAC-SHA256>
+#
+# The signing key lives in the data directory (session_secret.key, created
+# on first use). Deleting it invalidates every outstanding token.
+#
+# Tokens carry no expiry: a token is honoured while the session it names is
+# in the session table, so logout and the inactivity timeout end it and a
+# long, active session is never cut off.
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+
+SECRET_FILE = os.environ.get("HONEYTRAP_SESSION_SECRET", "session_secret.key")
+SECRET_BYTES = 32
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+# ----------------------
+# 🔑 Signing Key
+# ----------------------
+# One key per absolute path, so benchmarks and replays that change the
+# working directory sign with their own data directory's key
+_SECRETS = {}
+_SECRETS_LOCK = threading.Lock()
+
+def _secret():
+    path = os.path.abspath(SECRET_FILE)
+    with _SECRETS_LOCK:
+        secret = _SECRETS.get(path)
+        if secret is None:
+            secret = _SECRETS[path] = _load_or_create(path)
+        return secret
+
+def load_secret():
+    """Load or create the signing key now (before starting processes that must share it)"""
+    _secret()
+
+def _load_or_create(path):
+    try:
+        with open(path, "rb") as f:
+            secret = f.read()
+        if len(secret) >= SECRET_BYTES:
+            return secret
+    except OSError:
+        pass
+    secret = os.urandom(SECRET_BYTES)
+    # Owner-only, written atomically so a concurrent reader never sees half a key
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(secret)
+    os.replace(tmp, path)
+    return secret
+
+# ----------------------
+# 🎟️ Tokens
+# ----------------------
+def _sign(body):
+    return hmac.new(_secret(), body.encode("ascii"), hashlib.sha256).digest()
+
+def issue(username, **claims):
+    """Signed token for a new session of username"""
+    payload = {"u": username, "iat": int(time.time()), "n": _b64encode(os.urandom(8))}
+    payload.update(claims)
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    return f"{body}.{_b64encode(_sign(body))}"
+
+def verify(token):
+    """Payload of a validly signed token, or None (the caller checks its session exists)"""
+    if not isinstance(token, str) or token.count(".") != 1:
+        return None
+    body, signature = token.split(".")
+    try:
+        if not hmac.compare_digest(_sign(body), _b64decode(signature)):
+            return None
+        payload = json.loads(_b64decode(body))
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get("u"), str):
+        return None
+    return payload
@@ -0,0 +1,41 @@
+# ===============================
+# ⏱️ HoneyTrap Startup Timer
+# ===============================
+# Records named startup phases so cold start cost can be measured.
+# Import this module first; set HONEYTRAP_STARTUP_TIMING=1 to print the report.
+
+import os
+import time
+
+# Reference point for all phases (module import time)
+_START = time.perf_counter()
+
+# Recorded (phase, seconds since start) pairs
+PHASES = []
+
+def enabled():
+    """Check whether startup timing output is requested"""
+    return os.environ.get("HONEYTRAP_STARTUP_TIMING", "") not in ("", "0")
+
+def mark(phase):
+    """Record the time elapsed since start for a named phase"""
+    elapsed = time.perf_counter() - _START
+    PHASES.append((phase, elapsed))
+    return elapsed
+
+def mark_once(phase):
+    """Record a phase only the first time it is reached"""
+    if any(name == phase for name, _ in PHASES):
+        return None
+    return mark(phase)
+
+def report(title="Startup"):
+    """Print the recorded phases if startup timing is enabled"""
+    if not enabled():
+        return
+
+    print(f"[TIMING] {title}")
+    previous = 0.0
+    for phase, elapsed in PHASES:
+        print(f"[TIMING]   {phase:<16} +{(elapsed - previous) * 1000:8.1f} ms  (total {elapsed * 1000:8.1f} ms)")
+        previous = elapsed
@@ -0,0 +1,340 @@
+# ===============================
+# 💾 HoneyTrap Storage
+# ===============================
+# Crash-safe JSON persistence for the data files. Every write goes to a
+# temporary file that is renamed over the target, so readers (other threads,
+# the port stealth code, other processes) see either the old or the new file,
+# never a truncated one.
+#
+# Durability levels (HONEYTRAP_DURABILITY or configure()):
+#   none  - rename immediately, no fsync (fastest; a power loss may lose
+#           recent writes)
+#   batch - writes are queued and a committer thread flushes them every
+#           COMMIT_WINDOW seconds, one fsync per file per window (default;
+#           a crash loses at most one window)
+#   sync  - the caller waits until its write is on disk; concurrent writers
+#           share one group commit
+#
+# A queued write that fails (disk full, permissions) stays queued and is
+# retried every RETRY_DELAY seconds; a caller waiting for it gets the OSError.
+#
+# Shared mode (configure(shared=True), used by multi-process servers): table
+# locks are also file locks on "<table>.lock", held across processes, and
+# every write is on disk before save_json() returns, so the next process to
+# take the lock reads it. Batch writes then wait like sync ones.
+
+import atexit
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DURABILITY_LEVELS = ("none", "batch", "sync")
+DURABILITY = os.environ.get("HONEYTRAP_DURABILITY", "batch")
+COMMIT_WINDOW = 0.05
+RETRY_DELAY = 1.0
+SHARED = False
+
+def default_for(file):
+    """Empty value of a data file (dict tables vs list tables)"""
+    return {} if "users" in file or "sessions" in file or "attempts" in file else []
+
+def _serialize(data):
+    return json.dumps(data, indent=4).encode("utf-8")
+
+def _write_atomic(path, payload, fsync):
+    """Write payload to a temporary file and rename it over path"""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def _fsync_dir(directory):
+    """Make renames in a directory durable (not supported on every platform)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+# ----------------------
+# 📦 Group Commit
+# ----------------------
+class GroupCommitter:
+    """Coalesces pending file writes and commits them from one thread"""
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pending = {}       # path -> serialized bytes, newest wins
+        self.writing = {}       # batch being committed, still visible to readers
+        self.failed = {}        # path -> OSError of its last commit, until one succeeds
+        self.enqueued = 0
+        self.committed = 0
+        self.waiters = 0
+        self.thread = None
+        self.commits = 0
+        self.files_written = 0
+        self.fsyncs = 0
+        self.errors = 0
+        self.last_commit_ms = 0.0
+
+    def submit(self, path, payload, wait):
+        with self.cond:
+            self.pending[path] = payload
+            self.enqueued += 1
+            target = self.enqueued
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="storage-commit", daemon=True)
+                self.thread.start()
+            self.cond.notify_all()
+            if wait:
+                self._wait(target)
+                error = self.failed.get(path)
+                if error is not None:
+                    raise OSError(error.errno, error.strerror, path)
+
+    def _wait(self, target, timeout=None):
+        """Block until everything submitted up to `target` is committed (lock held)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.waiters += 1
+        self.cond.notify_all()
+        try:
+            while self.committed < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            return True
+        finally:
+            self.waiters -= 1
+
+    def flush(self, timeout=None):
+        """Commit everything queued so far; False on timeout or if a write failed"""
+        with self.cond:
+            if self.thread is None or self.committed >= self.enqueued:
+                return not self.failed
+            return self._wait(self.enqueued, timeout) and not self.failed
+
+    def lookup(self, path):
+        """Serialized content not yet on disk, or None"""
+        with self.cond:
+            payload = self.pending.get(path)
+            if payload is None:
+                payload = self.writing.get(path)
+            return payload
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                # Let more writes join the batch, unless someone is waiting on it
+                deadline = time.monotonic() + COMMIT_WINDOW
+                while not self.waiters:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                batch = self.writing = self.pending
+                self.pending = {}
+                target = self.enqueued
+
+            failed = self._commit(batch)
+
+            with self.cond:
+                self.writing = {}
+                for path in batch:
+                    if path in failed:
+                        self.failed[path] = failed[path]
+                        # Retry it, unless a newer write of the file replaced it
+                        self.pending.setdefault(path, batch[path])
+                    else:
+                        self.failed.pop(path, None)
+                self.committed = target
+                self.cond.notify_all()
+                if failed:
+                    self.cond.wait(RETRY_DELAY)
+
+    def _commit(self, batch):
+        """Write a batch; returns path -> OSError for the files that could not be written"""
+        started = time.perf_counter()
+        fsync = DURABILITY != "none"
+        directories = set()
+        failed = {}
+        for path, payload in batch.items():
+            try:
+                _write_atomic(path, payload, fsync)
+                self.files_written += 1
+                directories.add(os.path.dirname(path))
+            except OSError as e:
+                self.errors += 1
+                failed[path] = e
+        if fsync:
+            self.fsyncs += len(batch) - len(failed)
+            for directory in directories:
+                _fsync_dir(directory)
+        self.commits += 1
+        self.last_commit_ms = round((time.perf_counter() - started) * 1000, 3)
+        return failed
+
+COMMITTER = GroupCommitter()
+atexit.register(lambda: COMMITTER.flush(timeout=5.0))
+
+# ----------------------
+# 🔒 Table Locks
+# ----------------------
+class TableLock:
+    """Reentrant lock for one data file; in shared mode also an flock() on <file>.lock"""
+    def __init__(self, file):
+        self.file = file
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+
+    def acquire(self):
+        self.lock.acquire()
+        self.depth += 1
+        if self.depth == 1 and SHARED and fcntl is not None:
+            try:
+                if self.fd is None:
+                    self.fd = os.open(os.path.abspath(self.file) + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            except OSError:
+                self.depth -= 1
+                self.lock.release()
+                raise
+
+    def release(self):
+        if self.depth == 1 and self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.depth -= 1
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+# ----------------------
+# 📁 Public API
+# ----------------------
+def configure(durability=None, window=None, shared=None):
+    """Change the durability level, group-commit window and/or shared mode"""
+    global DURABILITY, COMMIT_WINDOW, SHARED
+    if durability is not None:
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level: {durability}")
+        # Queued writes must not be overtaken by immediate ones
+        flush()
+        DURABILITY = durability
+    if window is not None:
+        COMMIT_WINDOW = max(0.0, float(window))
+    if shared is not None:
+        if shared and fcntl is None:
+            raise ValueError("Shared storage needs file locks (fcntl), which this platform lacks")
+        flush()
+        SHARED = bool(shared)
+
+def load_json(file):
+    """Load a data file, including writes that are still queued for commit"""
+    payload = COMMITTER.lookup(os.path.abspath(file))
+    try:
+        if payload is not None:
+            return json.loads(payload)
+        with open(file, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default_for(file)
+
+def iter_json(file):
+    """
+    The items of a list data file, decoded one at a time as they are consumed.
+    The file is read now (call under the table's lock); the Python list is
+    never built.
+    """
+    payload = COMMITTER.lookup(os.path.abspath(file))
+    try:
+        if payload is not None:
+            text = payload.decode("utf-8")
+        else:
+            with open(file, "r", encoding="utf-8") as f:
+                text = f.read()
+    except (FileNotFoundError, UnicodeDecodeError):
+        text = ""
+    return _iter_items(text)
+
+def _iter_items(text):
+    decoder = json.JSONDecoder()
+    position = _skip_space(text, 0)
+    if not text.startswith("[", position):
+        return
+    position += 1
+    while True:
+        position = _skip_space(text, position)
+        if text.startswith("]", position) or position >= len(text):
+            return
+        try:
+            item, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            return
+        yield item
+        position = _skip_space(text, position)
+        if text.startswith(",", position):
+            position += 1
+
+def _skip_space(text, position):
+    while position < len(text) and text[position].isspace():
+        position += 1
+    return position
+
+def save_json(file, data):
+    """Persist a data file at the configured durability level"""
+    payload = _serialize(data)
+    path = os.path.abspath(file)
+    if DURABILITY == "none":
+        _write_atomic(path, payload, fsync=False)
+    else:
+        # Other processes only see what is on disk
+        COMMITTER.submit(path, payload, wait=(DURABILITY == "sync" or SHARED))
+
+def flush(timeout=None):
+    """Write out every queued file now (before exit, copying or deleting data)"""
+    return COMMITTER.flush(timeout)
+
+def stats():
+    c = COMMITTER
+    with c.cond:
+        pending = len(c.pending) + len(c.writing)
+        failing = len(c.failed)
+    return {
+        "durability": DURABILITY,
+        "shared": SHARED,
+        "pending_files": pending,
+        "commits": c.commits,
+        "files_written": c.files_written,
+        "fsyncs": c.fsyncs,
+        "errors": c.errors,
+        "failing_files": failing,
+        "last_commit_ms": c.last_commit_ms
+    }
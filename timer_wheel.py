@@ -0,0 +1,76 @@
+# ===============================
+# ⏱️ HoneyTrap Timer Wheel
+# ===============================
+# Deadlines for many keys (open connections) without scanning them all. Time
+# is cut into ticks and each deadline sits in the slot of the tick it falls
+# in, slots reused round-robin:
+#
+#   schedule / cancel   O(1) - a deadline moves between two slot dicts
+#   expire(now)         visits only the slots of the ticks that have passed
+#
+# A deadline further out than one turn of the wheel stays in its slot and is
+# skipped until the turn it is due. Deadlines fire up to one tick late.
+
+import threading
+import time
+
+TICK = 0.5
+SLOTS = 1024
+
+class TimerWheel:
+    """Deadlines by key, each with a value handed back when it expires"""
+    def __init__(self, tick=TICK, slots=SLOTS, now=None):
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]
+        # key -> slot holding its deadline
+        self.slot_of = {}
+        self.lock = threading.Lock()
+        now = time.monotonic() if now is None else now
+        # Ticks up to this one have been fully processed by expire()
+        self.current = int(now / tick) - 1
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def schedule(self, key, deadline, value=None):
+        """Set (or move) key's deadline, on the time.monotonic() clock"""
+        # A deadline in an already processed tick goes in the next one
+        tick = max(int(deadline / self.tick), self.current + 1)
+        slot = self.slots[tick % len(self.slots)]
+        with self.lock:
+            old = self.slot_of.get(key)
+            if old is not None and old is not slot:
+                del old[key]
+            slot[key] = (deadline, value)
+            self.slot_of[key] = slot
+
+    def cancel(self, key):
+        with self.lock:
+            slot = self.slot_of.pop(key, None)
+            if slot is not None:
+                del slot[key]
+
+    def deadline(self, key):
+        """key's pending (deadline, value), or None"""
+        with self.lock:
+            slot = self.slot_of.get(key)
+            return None if slot is None else slot[key]
+
+    def expire(self, now=None):
+        """Remove and return the (key, value) pairs whose deadline has passed"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self.lock:
+            last = int(now / self.tick)
+            # After a long pause, one pass over every slot is enough
+            first = max(self.current + 1, last - len(self.slots) + 1)
+            for tick in range(first, last + 1):
+                slot = self.slots[tick % len(self.slots)]
+                for key, (deadline, value) in list(slot.items()):
+                    if deadline <= now:
+                        del slot[key]
+                        del self.slot_of[key]
+                        expired.append((key, value))
+            # The tick now is in may still get deadlines: visit it again next time
+            self.current = max(self.current, last - 1)
+        return expired
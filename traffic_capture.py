@@ -0,0 +1,91 @@
+# ===============================
+# 🎥 HoneyTrap Traffic Capture
+# ===============================
+# Records control-channel commands that drive detection decisions (logins,
+# signups, logouts, bans, port changes) with client IP, timing and the
+# server's decision, as newline-delimited JSON. The first line is a header
+# holding a snapshot of the data files, so a replay starts from the same state.
+#
+# Captures contain submitted passwords and user data: treat them as secrets.
+
+import json
+import os
+import threading
+import time
+
+import storage
+from protocol import MessageType
+
+CAPTURE_VERSION = 1
+
+# Commands whose effect on firewall state must be reproduced by a replay
+RECORDED_COMMANDS = (
+    MessageType.LOGIN,
+    MessageType.SIGNUP,
+    MessageType.LOGOUT,
+    MessageType.BAN_IP,
+    MessageType.BAN_IPS,
+    MessageType.UNBAN_IP,
+    MessageType.UPDATE_PORT
+)
+
+class TrafficRecorder:
+    """Thread-safe, append-only capture writer"""
+    def __init__(self, path, snapshot_files=()):
+        self.path = path
+        self.lock = threading.Lock()
+        self.records = 0
+        # One run per file: a second header would replay from the wrong snapshot
+        self.file = open(path, "w", buffering=1)
+
+        # Header with the starting state of the data files (queued writes included)
+        storage.flush()
+        state = {}
+        for file in snapshot_files:
+            try:
+                with open(file, "r") as f:
+                    state[os.path.basename(file)] = json.load(f)
+            except (OSError, ValueError):
+                pass
+        self._write({"type": "header", "version": CAPTURE_VERSION, "started": time.time(), "state": state})
+
+    def _write(self, record):
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.file.write(line)
+
+    def record(self, command, params, ip, response):
+        """Append one command with the server's decision"""
+        self._write({
+            "type": "command",
+            "t": time.time(),
+            "command": command,
+            "ip": ip,
+            "params": params,
+            "status": (response or {}).get("status")
+        })
+        self.records += 1
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def load_capture(path):
+    """
+    Read a capture file; returns (header, list of command records). Files
+    appended to by older versions hold several runs: the last one is used.
+    """
+    header = None
+    commands = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("type") == "header":
+                header = record
+                commands = []
+            elif record.get("type") == "command":
+                commands.append(record)
+    return header or {"state": {}}, commands
@@ -0,0 +1,141 @@
+# ===============================
+# 🌲 Keyed Treeview Sync
+# ===============================
+# Applies a dataset to a ttk.Treeview by row key, so a refresh only inserts,
+# updates or removes the rows that changed (and the selection survives).
+# In windowed mode only the rows that fit on screen exist as Treeview items;
+# the scrollbar and mouse wheel move the window over the full dataset.
+
+DEFAULT_WINDOW = 20
+
+class TreeviewSync:
+    def __init__(self, tree, key_func, values_func, scrollbar=None, windowed=False):
+        """
+        key_func(record) returns a stable key for a record, values_func(record)
+        returns the tuple of column values shown for it.
+        """
+        self.tree = tree
+        self.key_func = key_func
+        self.values_func = values_func
+        self.scrollbar = scrollbar
+        self.windowed = windowed
+
+        # Full dataset as (iid, values) and the rows currently in the tree
+        self.rows = []
+        self.rendered = {}
+        self.offset = 0
+        self.window_size = DEFAULT_WINDOW
+
+        if windowed:
+            # The scrollbar tracks the window position, not the tree's own view
+            tree.configure(yscrollcommand="")
+            if scrollbar is not None:
+                scrollbar.configure(command=self.yview)
+            tree.bind("<Configure>", self.on_resize, add="+")
+            tree.bind("<MouseWheel>", self.on_mousewheel, add="+")
+            tree.bind("<Button-4>", lambda e: self.scroll_by(-3), add="+")
+            tree.bind("<Button-5>", lambda e: self.scroll_by(3), add="+")
+
+    # ----------------------
+    # 🔄 Dataset Updates
+    # ----------------------
+    def update(self, records):
+        """Replace the dataset and apply only the differences to the tree"""
+        rows = []
+        seen = {}
+        for record in records:
+            iid = str(self.key_func(record))
+            # Keep iids unique if the data has duplicate keys
+            count = seen.get(iid, 0)
+            seen[iid] = count + 1
+            if count:
+                iid = f"{iid}#{count}"
+            rows.append((iid, tuple(self.values_func(record))))
+
+        self.rows = rows
+        self.render()
+
+    def render(self):
+        """Diff the visible rows against the tree and apply the changes"""
+        if self.windowed:
+            self.offset = max(0, min(self.offset, len(self.rows) - self.window_size))
+            visible = self.rows[self.offset:self.offset + self.window_size]
+        else:
+            visible = self.rows
+
+        desired = dict(visible)
+        removed = [iid for iid in self.rendered if iid not in desired]
+        if removed:
+            self.tree.delete(*removed)
+
+        for iid, values in visible:
+            current = self.rendered.get(iid)
+            if current is None:
+                self.tree.insert("", "end", iid=iid, values=values)
+            elif current != values:
+                self.tree.item(iid, values=values)
+
+        # Reorder with a single call, only when the order actually changed
+        order = [iid for iid, _ in visible]
+        if list(self.tree.get_children()) != order:
+            self.tree.set_children("", *order)
+
+        self.rendered = desired
+        self.update_scrollbar()
+
+    # ----------------------
+    # 🪟 Windowed Rendering
+    # ----------------------
+    def update_scrollbar(self):
+        if not self.windowed or self.scrollbar is None:
+            return
+        total = len(self.rows)
+        if total == 0:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        first = self.offset / total
+        last = min(1.0, (self.offset + self.window_size) / total)
+        self.scrollbar.set(first, last)
+
+    def yview(self, *args):
+        """Scrollbar command: move the window over the full dataset"""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            step = self.window_size if args[2] == "pages" else 1
+            self.scroll_by(int(args[1]) * step)
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.offset + rows)
+        return "break"
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.rows) - self.window_size))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    def on_mousewheel(self, event):
+        return self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def on_resize(self, event=None):
+        """Resize the window to the number of rows that fit on screen"""
+        rows = self.visible_rows()
+        if rows != self.window_size:
+            self.window_size = rows
+            self.render()
+            # Row height is only known once rows exist, so measure again
+            self.tree.after_idle(self.on_resize)
+
+    def visible_rows(self):
+        """Number of rows that fit in the tree, measured from a rendered row"""
+        children = self.tree.get_children()
+        if children:
+            bbox = self.tree.bbox(children[0])
+            if bbox:
+                _, y, _, height = bbox
+                if height > 0:
+                    return max(1, (self.tree.winfo_height() - y) // height)
+        return self.window_size
@@ -301,10 +301,16 @@ class FakePortal:
             tk.Button(self.main_frame, text="Close Connection", command=self.logout).pack(pady=20)
     
     def collect_info(self):
-        """Collect information about the system (simulated)"""
+        """Collect basic information about the session and report it to the server"""
         try:
             # Use socket adapter instead of HTTP
             UserHandler.update_activity("attacker")
+            UserHandler.report_honeypot(self.port, {
+                "hostname": socket.gethostname(),
+                "platform": sys.platform,
+                "user": os.environ.get("USER") or os.environ.get("USERNAME", "unknown"),
+                "screen": f"{self.root.winfo_screenwidth()}x{self.root.winfo_screenheight()}"
+            })
         except:
             # Silently fail if server is unreachable
             pass